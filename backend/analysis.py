@@ -1,16 +1,32 @@
 from collections import defaultdict
 from .osm_data import OSMDataFetcher, haversine
+from .services.batch import BBox, BatchAnalysis
+from .services.coverage import GreenCoverage
+from .services.distance import polyline_lengths
+from .services.feature_geometry import GeometryBuffer, attach_polylines
+from .services.isochrones import TransportCoverage
+from .services.osm_data import fetch_warnings
+from .services.osm_index import OSMIndex
+from .services.profiling import StageTimer
+from .services.road_graph import RoadGraph, RoadLoadEstimator
+from .services.spatial_index import SegmentGridIndex
 import logging
 import math
+import numpy as np
 from datetime import datetime, time
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterator, List, Tuple, Optional
 
 logger = logging.getLogger(__name__)
 
 
 class AreaAnalyzer:
+    VERSION = '1'
+
     def __init__(self):
         self.osm_fetcher = OSMDataFetcher()
+        self.load_estimator = RoadLoadEstimator.from_settings()
+        self.transport_coverage = TransportCoverage()
+        self.green_coverage = GreenCoverage.from_settings()
 
         self.building_factors = {
             'office': {'base': 2.2, 'capacity_multiplier': 0.1, 'peak_hours': [7, 8, 9, 17, 18, 19]},
@@ -57,44 +73,77 @@ class AreaAnalyzer:
             }
         }
 
-    def perform_analysis(self, nw_lat: float, nw_lng: float, se_lat: float, se_lng: float) -> dict:
+    def perform_analysis(self, nw_lat: float, nw_lng: float, se_lat: float, se_lng: float,
+                         timer: Optional[StageTimer] = None) -> dict:
+        timer = timer or StageTimer()
         north_bound = max(nw_lat, se_lat)
         south_bound = min(nw_lat, se_lat)
         east_bound = max(nw_lng, se_lng)
         west_bound = min(nw_lng, se_lng)
 
-        osm_data = self.osm_fetcher.get_area_data(north_bound, west_bound, south_bound, east_bound)
-        area_size = self._calculate_area_size(north_bound, west_bound, south_bound, east_bound)
-
-        roads, road_count, road_types = self._extract_road_data(osm_data)
-        intersections = self._analyze_intersections(roads, osm_data)
-        traffic_lights = self._count_traffic_infrastructure(osm_data)
-        parking_data = self._analyze_parking(osm_data)
-        buildings = self._extract_building_data(osm_data)
-        green_spaces, water_features = self._extract_green_and_water_data(osm_data)
-        public_transport = self._analyze_public_transport(osm_data)
-
-        area_type = self._determine_area_type(buildings, road_types)
-
-        base_congestion = self._calculate_base_congestion(road_types, roads, intersections, traffic_lights)
-        building_impact = self._calculate_advanced_building_impact(buildings, roads, osm_data)
-        parking_impact = self._calculate_parking_impact(parking_data, roads)
+        osm_data = timer.run("fetch", self.osm_fetcher.get_area_data,
+                             north_bound, west_bound, south_bound, east_bound)
+        return self.analyze_osm_data(osm_data, north_bound, west_bound, south_bound, east_bound, timer)
+
+    def analyze_osm_data(self, osm_data, north_bound: float, west_bound: float, south_bound: float,
+                         east_bound: float, timer: Optional[StageTimer] = None) -> dict:
+        # Аналіз уже отриманих даних - спільний для одиночного і пакетного аналізу
+        timer = timer or StageTimer()
+        osm_index = timer.run("index", OSMIndex.from_osm_data, osm_data)
+        timer.count("elements", osm_index.element_count)
+        area_size = timer.run("calculate_area_size", self._calculate_area_size,
+                              north_bound, west_bound, south_bound, east_bound)
+
+        roads, road_count, road_types = timer.run("extract_road_data", self._extract_road_data, osm_index)
+        intersections = timer.run("analyze_intersections", self._analyze_intersections, roads, osm_index)
+        road_graph = timer.run("build_road_graph", RoadGraph.from_roads, roads, osm_index)
+        network_load = timer.run("estimate_road_loads", self._estimate_road_loads, road_graph, roads)
+        traffic_lights = timer.run("count_traffic_infrastructure", self._count_traffic_infrastructure, osm_index)
+        parking_data = timer.run("analyze_parking", self._analyze_parking, osm_index)
+        buildings = timer.run("extract_building_data", self._extract_building_data, osm_index)
+        green_spaces, water_features = timer.run("extract_green_and_water_data",
+                                                 self._extract_green_and_water_data, osm_index)
+        green_coverage = timer.run("measure_green_coverage", self._measure_green_coverage, osm_index,
+                                   north_bound, west_bound, south_bound, east_bound)
+        public_transport = timer.run("analyze_public_transport", self._analyze_public_transport, osm_index)
+        transport_coverage = timer.run("analyze_transport_coverage", self._analyze_transport_coverage,
+                                       roads, buildings, osm_index)
+        timer.count("roads", len(roads))
+        timer.count("graph_edges", road_graph.edge_count)
+        timer.count("buildings", len(buildings))
+        timer.count("green_spaces", len(green_spaces))
+        timer.count("water_features", len(water_features))
+
+        area_type = timer.run("determine_area_type", self._determine_area_type, buildings, road_types)
+
+        base_congestion = timer.run("calculate_base_congestion", self._calculate_base_congestion,
+                                    road_types, roads, intersections, traffic_lights, network_load)
+        building_impact = timer.run("calculate_advanced_building_impact",
+                                    self._calculate_advanced_building_impact, buildings, roads, osm_index)
+        parking_impact = timer.run("calculate_parking_impact", self._calculate_parking_impact, parking_data, roads)
         transport_relief = self._calculate_transport_relief(public_transport)
 
         congestion_level = self._calculate_final_congestion(
             base_congestion, building_impact, parking_impact, transport_relief
         )
 
-        hourly_congestion = self._calculate_advanced_hourly_congestion(
+        hourly_congestion = timer.run(
+            "calculate_advanced_hourly_congestion", self._calculate_advanced_hourly_congestion,
             area_type, base_congestion, building_impact, buildings
         )
 
-        ecology_score = self._calculate_ecology_score(
-            green_spaces, water_features, area_size, roads, road_types,
+        ecology_score = timer.run(
+            "calculate_ecology_score", self._calculate_ecology_score,
+            green_spaces, green_coverage, area_size, roads, road_types,
             traffic_lights, parking_data, hourly_congestion
         )
 
+        timer.log(f"[{north_bound}, {west_bound}, {south_bound}, {east_bound}]")
+
+        warnings = fetch_warnings(osm_data)
         return {
+            "incomplete": bool(warnings),
+            "warnings": warnings,
             "bounds": [[north_bound, west_bound], [south_bound, east_bound]],
             "area": round(area_size, 2),
             "area_type": area_type,
@@ -107,13 +156,16 @@ class AreaAnalyzer:
             "congestion": congestion_level,
             "congestion_details": {
                 "base_road_congestion": round(base_congestion, 1),
+                "network_load": round(network_load, 1) if network_load is not None else None,
                 "building_impact": round(building_impact, 1),
                 "parking_impact": round(parking_impact, 1),
                 "transport_relief": round(-transport_relief, 1)
             },
             "ecology": ecology_score,
+            "green_coverage": green_coverage,
             "pedestrian_friendly": self._calculate_pedestrian_score(roads, road_types),
-            "public_transport": self._calculate_transport_score(public_transport),
+            "public_transport": self._calculate_transport_score(public_transport, transport_coverage),
+            "transport_coverage": transport_coverage,
             "hourly_congestion": hourly_congestion,
             "roads_data": roads,
             "green_spaces_data": green_spaces,
@@ -122,6 +174,9 @@ class AreaAnalyzer:
             "parking_data": parking_data
         }
 
+    def perform_batch_analysis(self, cells: List[BBox], workers: Optional[int] = None) -> Iterator[dict]:
+        return BatchAnalysis(self, workers=workers).run(cells)
+
     def _calculate_area_size(self, north: float, west: float, south: float, east: float) -> float:
         try:
             avg_latitude = (north + south) / 2
@@ -132,41 +187,38 @@ class AreaAnalyzer:
             logger.error(f"Помилка при обчисленні площі: {e}")
             return 1.0
 
-    def _extract_road_data(self, osm_data: dict) -> Tuple[List[dict], int, defaultdict]:
+    def _extract_road_data(self, osm_index: OSMIndex) -> Tuple[List[dict], int, defaultdict]:
+        osm_index = OSMIndex.ensure(osm_index)
         roads = []
         road_count = 0
         road_type_counts = defaultdict(int)
 
-        nodes = {
-            element["id"]: (element["lat"], element["lon"])
-            for element in osm_data.get("elements", [])
-            if element["type"] == "node"
-        }
-
-        for element in osm_data.get("elements", []):
-            if element["type"] == "way" and "highway" in element.get("tags", {}):
-                highway_type = element["tags"]["highway"]
-                tags = element.get("tags", {})
-
-                road_length = self._calculate_road_length(element, nodes)
-                lanes = self._extract_lane_count(tags)
-                max_speed = self._extract_max_speed(tags)
-
-                roads.append({
-                    "id": element["id"],
-                    "type": highway_type,
-                    "name": tags.get("name", "Unnamed road"),
-                    "length": round(road_length, 2),
-                    "lanes": lanes,
-                    "max_speed": max_speed,
-                    "nodes": element.get("nodes", []),
-                    "surface": tags.get("surface", "unknown"),
-                    "oneway": tags.get("oneway", "no") == "yes"
-                })
-
-                self._categorize_road_advanced(road_type_counts, highway_type, tags)
-                road_count += 1
+        road_lengths = self._calculate_road_lengths(osm_index.features["road"], osm_index)
 
+        for position, element in enumerate(osm_index.features["road"]):
+            tags = element["tags"]
+            highway_type = tags["highway"]
+
+            road_length = road_lengths[position]
+            lanes = self._extract_lane_count(tags)
+            max_speed = self._extract_max_speed(tags)
+
+            roads.append({
+                "id": element["id"],
+                "type": highway_type,
+                "name": tags.get("name", "Unnamed road"),
+                "length": round(float(road_length), 2),
+                "lanes": lanes,
+                "max_speed": max_speed,
+                "nodes": element.get("nodes", []),
+                "surface": tags.get("surface", "unknown"),
+                "oneway": tags.get("oneway", "no") == "yes"
+            })
+
+            self._categorize_road_advanced(road_type_counts, highway_type, tags)
+            road_count += 1
+
+        attach_polylines(roads, GeometryBuffer.from_ways(osm_index, osm_index.features["road"]))
         return roads, road_count, road_type_counts
 
     def _extract_max_speed(self, tags: dict) -> Optional[int]:
@@ -194,18 +246,18 @@ class AreaAnalyzer:
                 road_types[category] += 1
                 break
 
-    def _analyze_intersections(self, roads: List[dict], osm_data: dict) -> dict:
-        nodes = {
-            element["id"]: (element["lat"], element["lon"])
-            for element in osm_data.get("elements", [])
-            if element["type"] == "node"
-        }
+    def _analyze_intersections(self, roads: List[dict], osm_index: OSMIndex) -> dict:
+        osm_index = OSMIndex.ensure(osm_index)
+        refs = [node_id for road in roads for node_id in road.get("nodes", [])]
+        known = osm_index.node_coords.contains(refs).tolist()
 
         node_connections = defaultdict(list)
+        position = 0
         for road in roads:
             for node_id in road.get("nodes", []):
-                if node_id in nodes:
+                if known[position]:
                     node_connections[node_id].append(road)
+                position += 1
 
         intersections = {
             "simple": 0,
@@ -234,32 +286,28 @@ class AreaAnalyzer:
 
         return intersections
 
-    def _count_traffic_infrastructure(self, osm_data: dict) -> dict:
+    def _count_traffic_infrastructure(self, osm_index: OSMIndex) -> dict:
+        osm_index = OSMIndex.ensure(osm_index)
         infrastructure = {
             "traffic_lights": 0,
             "stop_signs": 0,
             "speed_cameras": 0,
-            "roundabouts": 0
+            "roundabouts": len(osm_index.features["roundabout"])
         }
 
-        for element in osm_data.get("elements", []):
-            if element["type"] == "node" and "tags" in element:
-                tags = element["tags"]
-
-                if tags.get("highway") == "traffic_signals":
-                    infrastructure["traffic_lights"] += 1
-                elif tags.get("highway") == "stop":
-                    infrastructure["stop_signs"] += 1
-                elif tags.get("highway") == "speed_camera":
-                    infrastructure["speed_cameras"] += 1
+        for element in osm_index.features["traffic_control"]:
+            highway_type = element["tags"].get("highway")
 
-            elif element["type"] == "way" and "tags" in element:
-                if element["tags"].get("junction") == "roundabout":
-                    infrastructure["roundabouts"] += 1
+            if highway_type == "traffic_signals":
+                infrastructure["traffic_lights"] += 1
+            elif highway_type == "stop":
+                infrastructure["stop_signs"] += 1
+            elif highway_type == "speed_camera":
+                infrastructure["speed_cameras"] += 1
 
         return infrastructure
 
-    def _analyze_parking(self, osm_data: dict) -> dict:
+    def _analyze_parking(self, osm_index: OSMIndex) -> dict:
         parking_data = {
             "total_spots": 0,
             "surface_parking": 0,
@@ -268,10 +316,7 @@ class AreaAnalyzer:
             "parking_lots": 0
         }
 
-        for element in osm_data.get("elements", []):
-            if "tags" not in element:
-                continue
-
+        for element in OSMIndex.ensure(osm_index).features["parking"]:
             tags = element["tags"]
 
             if tags.get("amenity") == "parking":
@@ -332,8 +377,18 @@ class AreaAnalyzer:
         else:
             return 'mixed'
 
+    def _estimate_road_loads(self, road_graph: RoadGraph, roads: List[dict]) -> Optional[float]:
+        # load - частка змодельованих маршрутів, що проходить дорогою (0..1)
+        if road_graph.edge_count == 0:
+            return None
+        loads, network_load = self.load_estimator.estimate(road_graph, len(roads))
+        for road, load in zip(roads, loads.tolist()):
+            road["load"] = round(load, 4)
+        return network_load
+
     def _calculate_base_congestion(self, road_types: defaultdict, roads: List[dict],
-                                   intersections: dict, traffic_lights: dict) -> float:
+                                   intersections: dict, traffic_lights: dict,
+                                   network_load: Optional[float] = None) -> float:
         total_roads = sum(road_types.values())
         if total_roads == 0:
             return 20.0
@@ -361,38 +416,36 @@ class AreaAnalyzer:
 
         traffic_light_factor = min(10, traffic_lights['traffic_lights'] / max(total_roads, 1) * 50)
 
-        return min(85, base_level + intersection_factor + traffic_light_factor)
+        congestion = base_level + intersection_factor + traffic_light_factor
+        if network_load is not None:
+            # Маршрути, зосереджені на вузьких дорогах, підвищують завантаженість
+            congestion = 0.8 * congestion + 0.2 * network_load
+        return min(85, congestion)
 
     def _calculate_advanced_building_impact(self, buildings: List[dict], roads: List[dict],
-                                            osm_data: dict) -> float:
+                                            osm_index: OSMIndex) -> float:
         if not buildings or not roads:
             return 0.0
 
-        node_coords = {
-            element["id"]: (element["lat"], element["lon"])
-            for element in osm_data.get("elements", [])
-            if element["type"] == "node"
-        }
+        osm_index = OSMIndex.ensure(osm_index)
+
+        centers = self._get_building_centers(buildings, osm_index)
+        road_distances = self._find_nearest_road_distances(centers, roads, osm_index)
 
         total_impact = 0.0
         building_count = 0
 
-        for building in buildings:
+        for building, nearest_road_distance in zip(buildings, road_distances):
             if not building.get('nodes'):
                 continue
 
-            building_center = self._get_building_center(building, node_coords)
-            if not building_center:
-                continue
-
-            nearest_road_distance = self._find_nearest_road_distance(building_center, roads, node_coords)
-            if nearest_road_distance == float('inf'):
+            if math.isnan(nearest_road_distance) or nearest_road_distance == float('inf'):
                 continue
 
             building_type = self._normalize_building_type(building['type'])
             factor_data = self.building_factors.get(building_type, self.building_factors['default'])
 
-            building_capacity = self._estimate_building_capacity(building, node_coords)
+            building_capacity = self._estimate_building_capacity(building)
 
             base_impact = factor_data['base']
             capacity_impact = building_capacity * factor_data['capacity_multiplier']
@@ -404,38 +457,27 @@ class AreaAnalyzer:
 
         return total_impact / max(building_count, 1)
 
-    def _get_building_center(self, building: dict, node_coords: dict) -> Optional[Tuple[float, float]]:
-        building_nodes = building.get('nodes', [])
-        if not building_nodes:
-            return None
-
-        valid_coords = []
-        for node_id in building_nodes:
-            if node_id in node_coords:
-                valid_coords.append(node_coords[node_id])
-
-        if not valid_coords:
-            return None
+    def _get_building_centers(self, buildings: List[dict], osm_index: OSMIndex) -> Tuple[np.ndarray, np.ndarray]:
+        lat, lon, offsets = osm_index.gather_way_coordinates(buildings)
+        counts = np.diff(offsets)
+        way_ids = np.repeat(np.arange(len(buildings)), counts)
 
-        avg_lat = sum(coord[0] for coord in valid_coords) / len(valid_coords)
-        avg_lon = sum(coord[1] for coord in valid_coords) / len(valid_coords)
-        return (avg_lat, avg_lon)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            center_lat = np.bincount(way_ids, weights=lat, minlength=len(buildings)) / counts
+            center_lon = np.bincount(way_ids, weights=lon, minlength=len(buildings)) / counts
+        return center_lat, center_lon
 
-    def _find_nearest_road_distance(self, building_center: Tuple[float, float],
-                                    roads: List[dict], node_coords: dict) -> float:
-        min_distance = float('inf')
+    def _find_nearest_road_distances(self, centers: Tuple[np.ndarray, np.ndarray],
+                                     roads: List[dict], osm_index: OSMIndex) -> np.ndarray:
+        center_lat, center_lon = centers
+        distances = np.full(len(center_lat), np.nan)
+        has_center = ~np.isnan(center_lat)
 
-        for road in roads:
-            for node_id in road.get('nodes', []):
-                if node_id in node_coords:
-                    road_coords = node_coords[node_id]
-                    distance = haversine(
-                        building_center[1], building_center[0],
-                        road_coords[1], road_coords[0]
-                    )
-                    min_distance = min(min_distance, distance)
+        road_lat, road_lon, road_offsets = osm_index.gather_way_coordinates(roads)
+        road_index = SegmentGridIndex.from_polylines(road_lat, road_lon, road_offsets)
 
-        return min_distance
+        distances[has_center] = road_index.nearest_distance(center_lat[has_center], center_lon[has_center])
+        return distances
 
     def _normalize_building_type(self, building_type: str) -> str:
         building_type = building_type.lower()
@@ -458,7 +500,7 @@ class AreaAnalyzer:
 
         return 'default'
 
-    def _estimate_building_capacity(self, building: dict, node_coords: dict) -> float:
+    def _estimate_building_capacity(self, building: dict) -> float:
         tags = building.get('tags', {})
 
         levels = 1
@@ -492,7 +534,7 @@ class AreaAnalyzer:
 
         return min(20, deficit_impact + street_parking_impact)
 
-    def _analyze_public_transport(self, osm_data: dict) -> dict:
+    def _analyze_public_transport(self, osm_index: OSMIndex) -> dict:
         transport_data = {
             'bus_stops': 0,
             'tram_stops': 0,
@@ -501,19 +543,18 @@ class AreaAnalyzer:
             'total_stops': 0
         }
 
-        for element in osm_data.get("elements", []):
-            if element["type"] == "node" and "tags" in element:
-                tags = element["tags"]
+        for element in OSMIndex.ensure(osm_index).features["transport"]:
+            tags = element["tags"]
 
-                if tags.get("highway") == "bus_stop" or tags.get("public_transport") == "stop_position":
-                    transport_data['bus_stops'] += 1
-                elif tags.get("railway") == "tram_stop":
-                    transport_data['tram_stops'] += 1
-                elif tags.get("railway") == "station":
-                    if tags.get("station") == "subway":
-                        transport_data['metro_stations'] += 1
-                    else:
-                        transport_data['train_stations'] += 1
+            if tags.get("highway") == "bus_stop" or tags.get("public_transport") == "stop_position":
+                transport_data['bus_stops'] += 1
+            elif tags.get("railway") == "tram_stop":
+                transport_data['tram_stops'] += 1
+            elif tags.get("railway") == "station":
+                if tags.get("station") == "subway":
+                    transport_data['metro_stations'] += 1
+                else:
+                    transport_data['train_stations'] += 1
 
         transport_data['total_stops'] = sum([
             transport_data['bus_stops'],
@@ -524,6 +565,26 @@ class AreaAnalyzer:
 
         return transport_data
 
+    def _analyze_transport_coverage(self, roads: List[dict], buildings: List[dict], osm_index: OSMIndex) -> dict:
+        # Частка будинків у межах 300/500 м пішки від зупинки мережею доріг;
+        # кожен будинок отримує час до найближчої зупинки (хв) для відображення
+        osm_index = OSMIndex.ensure(osm_index)
+        stops = [element for element in osm_index.features["transport"] if "lat" in element and "lon" in element]
+        access = np.full(len(buildings), np.inf)
+
+        if stops and buildings:
+            walk_graph = RoadGraph.from_roads(roads, osm_index, mode="walk")
+            building_lat, building_lon = self._get_building_centers(buildings, osm_index)
+            access = self.transport_coverage.access_distances(
+                walk_graph,
+                np.array([stop["lat"] for stop in stops]), np.array([stop["lon"] for stop in stops]),
+                building_lat, building_lon
+            )
+
+        for building, distance in zip(buildings, access.tolist()):
+            building["transport_walk_min"] = self.transport_coverage.walk_minutes(distance)
+        return self.transport_coverage.summarize(access)
+
     def _calculate_transport_relief(self, transport_data: dict) -> float:
         relief_factors = {
             'bus_stops': 0.8,
@@ -618,116 +679,93 @@ class AreaAnalyzer:
             else:
                 return 1
 
-    def _calculate_road_length(self, road_element: dict, nodes: dict) -> float:
-        length = 0.0
-        road_nodes = road_element.get("nodes", [])
-
-        if len(road_nodes) > 1:
-            for i in range(len(road_nodes) - 1):
-                node1, node2 = road_nodes[i], road_nodes[i + 1]
-                if node1 in nodes and node2 in nodes:
-                    lat1, lon1 = nodes[node1]
-                    lat2, lon2 = nodes[node2]
-                    segment_length = haversine(lon1, lat1, lon2, lat2)
-                    length += segment_length
-        return length
-
-    def _extract_green_and_water_data(self, osm_data: dict) -> Tuple[List[dict], List[dict]]:
+    def _calculate_road_lengths(self, road_elements: List[dict], osm_index: OSMIndex) -> np.ndarray:
+        lat, lon, offsets = osm_index.gather_way_coordinates(road_elements, keep_missing=True)
+        return polyline_lengths(lat, lon, offsets)
+
+    def _extract_green_and_water_data(self, osm_index: OSMIndex) -> Tuple[List[dict], List[dict]]:
+        osm_index = OSMIndex.ensure(osm_index)
         green_spaces = []
         water_features = []
+        water_elements = []
 
-        for element in osm_data.get("elements", []):
-            if element["type"] not in ["way", "relation"] or "tags" not in element:
-                continue
-
+        for element in osm_index.features["green"]:
+            tags = element["tags"]
+            green_spaces.append({
+                "id": element["id"],
+                "type": tags.get("leisure") or tags.get("natural") or tags.get("landuse"),
+                "name": tags.get("name", "Unnamed green space"),
+                "area": self._estimate_polygon_area(element, osm_index)
+            })
+
+        for element in osm_index.features["water"]:
             tags = element["tags"]
-
-            if (tags.get("leisure") in ["park", "garden", "nature_reserve"] or
-                    tags.get("natural") in ["wood", "forest", "scrub"] or
-                    tags.get("landuse") in ["forest", "meadow", "grass", "recreation_ground"]):
-                green_spaces.append({
-                    "id": element["id"],
-                    "type": tags.get("leisure") or tags.get("natural") or tags.get("landuse"),
-                    "name": tags.get("name", "Unnamed green space"),
-                    "area": self._estimate_polygon_area(element, osm_data)
-                })
-
             if (tags.get("natural") in ["water", "coastline"] or
                     tags.get("waterway") in ["river", "stream", "canal"]):
                 water_features.append({
                     "id": element["id"],
                     "type": tags.get("waterway") or tags.get("natural"),
                     "name": tags.get("name", "Unnamed water feature"),
-                    "area": self._estimate_polygon_area(element, osm_data)
+                    "area": self._estimate_polygon_area(element, osm_index)
                 })
+                water_elements.append(element)
 
+        attach_polylines(green_spaces, GeometryBuffer.from_ways(osm_index, osm_index.features["green"]))
+        attach_polylines(water_features, GeometryBuffer.from_ways(osm_index, water_elements))
         return green_spaces, water_features
 
-    def _extract_building_data(self, osm_data: dict) -> List[dict]:
+    def _extract_building_data(self, osm_index: OSMIndex) -> List[dict]:
+        osm_index = OSMIndex.ensure(osm_index)
         buildings = []
 
-        for element in osm_data.get("elements", []):
-            if element["type"] not in ["way", "relation"] or "tags" not in element:
-                continue
-
+        for element in osm_index.features["building"]:
             tags = element["tags"]
 
-            if "building" in tags:
-                building_type = (
-                        tags.get("amenity") or
-                        tags.get("building:use") or
-                        tags.get("shop") or
-                        tags.get("office") or
-                        tags.get("building") or
-                        "unknown"
-                )
+            building_type = (
+                    tags.get("amenity") or
+                    tags.get("building:use") or
+                    tags.get("shop") or
+                    tags.get("office") or
+                    tags.get("building") or
+                    "unknown"
+            )
 
-                building_data = {
-                    "id": element["id"],
-                    "type": building_type,
-                    "name": tags.get("name", "Unnamed building"),
-                    "nodes": element.get("nodes", []),
-                    "levels": tags.get("building:levels"),
-                    "height": tags.get("height"),
-                    "capacity": tags.get("capacity"),
-                    "area": self._estimate_polygon_area(element, osm_data)
-                }
+            building_data = {
+                "id": element["id"],
+                "type": building_type,
+                "name": tags.get("name", "Unnamed building"),
+                "nodes": element.get("nodes", []),
+                "levels": tags.get("building:levels"),
+                "height": tags.get("height"),
+                "capacity": tags.get("capacity"),
+                "area": self._estimate_polygon_area(element, osm_index)
+            }
 
-                buildings.append(building_data)
+            buildings.append(building_data)
 
+        attach_polylines(buildings, GeometryBuffer.from_ways(osm_index, osm_index.features["building"]))
         return buildings
 
-    def _estimate_polygon_area(self, element: dict, osm_data: dict) -> Optional[float]:
+    def _measure_green_coverage(self, osm_index: OSMIndex, north: float, west: float,
+                                south: float, east: float) -> dict:
+        # Покриття рахується по об'єднанню полігонів на растрі bbox, тож
+        # газон усередині парку не додається вдруге. Лінійні водотоки
+        # (річка як осьова лінія) площі не мають і сюди не входять
+        water_areas = [
+            element for element in osm_index.features["water"]
+            if element["tags"].get("natural") == "water" or element["tags"].get("waterway") == "riverbank"
+        ]
+        return self.green_coverage.measure(osm_index, osm_index.features["green"], water_areas,
+                                           north, west, south, east)
+
+    def _estimate_polygon_area(self, element: dict, osm_index: OSMIndex) -> Optional[float]:
+        if element["type"] == "relation":
+            multipolygon = osm_index.multipolygons().get(element["id"])
+            return multipolygon.area if multipolygon is not None else None
         if element["type"] != "way":
             return None
 
-        nodes = {
-            e["id"]: (e["lat"], e["lon"])
-            for e in osm_data.get("elements", [])
-            if e["type"] == "node"
-        }
-
-        element_nodes = element.get("nodes", [])
-        if len(element_nodes) < 3:
-            return None
-
-        coords = []
-        for node_id in element_nodes:
-            if node_id in nodes:
-                coords.append(nodes[node_id])
-
-        if len(coords) < 3:
-            return None
-
-        area = 0.0
-        for i in range(len(coords)):
-            j = (i + 1) % len(coords)
-            area += coords[i][0] * coords[j][1]
-            area -= coords[j][0] * coords[i][1]
-
-        area = abs(area) / 2.0
-        area_km2 = area * 111.32 * 111.32 * 0.001
-        return area_km2
+        return osm_index.way_areas().get(element["id"])
 
     def _find_longest_road(self, roads: List[dict]) -> dict:
         if not roads:
@@ -747,21 +785,21 @@ class AreaAnalyzer:
             "lanes": longest.get("lanes", 1)
         }
 
-    def _calculate_ecology_score(self, green_spaces: List[dict], water_features: List[dict],
+    def _calculate_ecology_score(self, green_spaces: List[dict], green_coverage: dict,
                                  area: float, roads: List[dict], road_types: defaultdict,
                                  traffic_lights: dict, parking_data: dict,
                                  hourly_congestion: List[int]) -> dict:
         if area <= 0:
             area = 1.0
 
-        green_score = self._calculate_green_coverage_score(green_spaces, water_features, area)
+        green_score = self._calculate_green_coverage_score(green_spaces, green_coverage)
 
         transport_impact = self._calculate_transport_environmental_impact(
             roads, road_types, traffic_lights, parking_data, hourly_congestion, area
         )
 
         air_quality_score = self._calculate_air_quality_score(
-            road_types, hourly_congestion, green_spaces, area
+            road_types, hourly_congestion, green_coverage
         )
 
         noise_score = self._calculate_noise_pollution_score(
@@ -779,19 +817,8 @@ class AreaAnalyzer:
 
         return final_score
 
-    def _calculate_green_coverage_score(self, green_spaces: List[dict],
-                                        water_features: List[dict], area: float) -> float:
-        green_area = sum(space.get('area', 0) for space in green_spaces if space.get('area'))
-        water_area = sum(feature.get('area', 0) for feature in water_features if feature.get('area'))
-
-        if green_area == 0 and green_spaces:
-            green_area = len(green_spaces) * 0.01
-
-        if water_area == 0 and water_features:
-            water_area = len(water_features) * 0.005
-
-        total_green_area = green_area + water_area * 1.2
-        coverage_percent = (total_green_area / area) * 100
+    def _calculate_green_coverage_score(self, green_spaces: List[dict], green_coverage: dict) -> float:
+        coverage_percent = green_coverage["green_percent"] + green_coverage["water_percent"] * 1.2
 
         green_types = set()
         for space in green_spaces:
@@ -868,17 +895,12 @@ class AreaAnalyzer:
         return min(95, max(5, total_impact))
 
     def _calculate_air_quality_score(self, road_types: defaultdict, hourly_congestion: List[int],
-                                     green_spaces: List[dict], area: float) -> float:
+                                     green_coverage: dict) -> float:
 
         avg_congestion = sum(hourly_congestion) / len(hourly_congestion) if hourly_congestion else 30
         base_air_quality = max(20, 100 - avg_congestion * 1.2)
 
-        green_area = sum(space.get('area', 0) for space in green_spaces if space.get('area'))
-        if green_area == 0 and green_spaces:
-            green_area = len(green_spaces) * 0.01
-
-        green_coverage = (green_area / area) * 100 if area > 0 else 0
-        green_bonus = min(20, green_coverage * 0.6)
+        green_bonus = min(20, green_coverage["green_percent"] * 0.6)
 
         major_roads = road_types.get("Автомагістралі", 0) + road_types.get("Головні", 0)
         total_roads = sum(road_types.values())
@@ -958,18 +980,8 @@ class AreaAnalyzer:
             'total_parking_spots': parking_data.get('total_spots', 0)
         }
 
-    def _get_green_coverage_percent(self, green_spaces: List[dict],
-                                    water_features: List[dict], area: float) -> float:
-        green_area = sum(space.get('area', 0) for space in green_spaces if space.get('area'))
-        water_area = sum(feature.get('area', 0) for feature in water_features if feature.get('area'))
-
-        if green_area == 0 and green_spaces:
-            green_area = len(green_spaces) * 0.01
-        if water_area == 0 and water_features:
-            water_area = len(water_features) * 0.005
-
-        total_green = green_area + water_area
-        return round((total_green / area) * 100, 2) if area > 0 else 0
+    def _get_green_coverage_percent(self, green_coverage: dict) -> float:
+        return round(green_coverage["green_percent"] + green_coverage["water_percent"], 2)
 
     def _get_road_category(self, highway_type: str) -> str:
         mapping = {
@@ -1002,7 +1014,7 @@ class AreaAnalyzer:
 
         return min(95, max(10, int(score)))
 
-    def _calculate_transport_score(self, transport_data: dict) -> int:
+    def _calculate_transport_score(self, transport_data: dict, coverage: Optional[dict] = None) -> int:
         weights = {
             'bus_stops': 1.0,
             'tram_stops': 1.5,
@@ -1016,4 +1028,8 @@ class AreaAnalyzer:
                 weighted_score += count * weights[transport_type]
 
         score = min(95, max(10, int(weighted_score * 5)))
+
+        if coverage and coverage.get("buildings"):
+            coverage_score = 100 * (0.4 * coverage["within_300m"] + 0.6 * coverage["within_500m"])
+            score = min(95, max(10, int(0.5 * score + 0.5 * coverage_score)))
         return score
\ No newline at end of file
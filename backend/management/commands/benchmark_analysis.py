@@ -0,0 +1,51 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from backend.services.benchmark import AnalysisBenchmark
+from backend.services.synthetic_osm import LAYOUTS
+
+ANALYZERS = {
+    'full': 'backend.analysis.AreaAnalyzer',
+    'simple': 'backend.services.analysis.AreaAnalyzer'
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark AreaAnalyzer on seeded synthetic OSM data and print JSON results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000',
+                            help='Comma-separated element counts, e.g. 1000,10000,1000000')
+        parser.add_argument('--layout', choices=LAYOUTS, default='grid')
+        parser.add_argument('--analyzer', choices=sorted(ANALYZERS), default='full')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--columnar', action='store_true',
+                            help='Feed the analyzer a ColumnarOSMData instead of element dicts')
+        parser.add_argument('--no-memory', action='store_true', help='Skip the tracemalloc peak memory run')
+        parser.add_argument('--output', help='Also write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        except ValueError:
+            raise CommandError('--sizes must be a comma-separated list of integers')
+        if not sizes or min(sizes) <= 0 or options['repeat'] <= 0:
+            raise CommandError('--sizes and --repeat must be positive')
+
+        benchmark = AnalysisBenchmark(
+            import_string(ANALYZERS[options['analyzer']]),
+            seed=options['seed'],
+            layout=options['layout'],
+            repeat=options['repeat'],
+            trace_memory=not options['no_memory'],
+            columnar=options['columnar']
+        )
+        report = json.dumps(benchmark.run(sizes), indent=2, ensure_ascii=False)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(report)
+        self.stdout.write(report)
@@ -0,0 +1,43 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from backend.services.osm_data import matches_feature_filters
+from backend.services.osm_local import LocalOSMStore, iter_osm_extract, relation_member_ways
+
+
+class Command(BaseCommand):
+    help = 'Import a local .osm / .osm.bz2 / .osm.pbf extract into the SQLite store used when OSM_DATA_SOURCE = "local"'
+
+    def add_arguments(self, parser):
+        parser.add_argument('extract', help='Path to the OSM extract')
+        parser.add_argument('--db', help='Target SQLite file (defaults to OSM_LOCAL_DB)')
+        parser.add_argument('--replace', action='store_true', help='Delete the existing database first')
+
+    def handle(self, *args, **options):
+        extract = options['extract']
+        db_path = options['db'] or getattr(settings, 'OSM_LOCAL_DB', None)
+        if not db_path:
+            raise CommandError('Pass --db or set OSM_LOCAL_DB')
+        if not os.path.exists(extract):
+            raise CommandError(f'Extract not found: {extract}')
+
+        if options['replace'] and os.path.exists(db_path):
+            os.remove(db_path)
+
+        started = time.perf_counter()
+        try:
+            # Перший прохід - лише відношення, щоб зберегти їхні лінії-члени без тегів
+            member_ways = relation_member_ways(iter_osm_extract(extract, relations_only=True),
+                                               matches_feature_filters)
+            counts = LocalOSMStore(db_path).import_records(iter_osm_extract(extract), matches_feature_filters,
+                                                           member_ways)
+        except ImportError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {counts['ways']} ways, {counts['relations']} relations and {counts['nodes']} nodes "
+            f"({counts['kept_nodes']} kept) into {db_path} in {time.perf_counter() - started:.1f}s"
+        ))
@@ -1,29 +1,81 @@
 from collections import defaultdict
+from typing import Dict, Iterator, List, Optional
 from math import radians, cos, sin, asin, sqrt
-from .osm_data import OSMDataFetcher, haversine
+from .osm_data import OSMDataFetcher, fetch_warnings, haversine
+from .analysis_grid import AnalysisGrid, GridMembership
+from .batch import BBox, BatchAnalysis
+from .distance import polyline_lengths
+from .feature_geometry import GeometryBuffer
+from .osm_index import OSMIndex
+from .profiling import StageTimer
 import logging
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
+ROAD_CATEGORIES = {
+    "Головні": ["motorway", "trunk", "primary"],
+    "Другорядні": ["secondary", "tertiary"],
+    "Місцеві": ["residential", "service", "unclassified"],
+    "Пішохідні": ["pedestrian", "footway", "path", "steps"],
+    "Велосипедні": ["cycleway"]
+}
+
+TRANSPORT_STOP_TAGS = [
+    ("public_transport", ["stop_position", "platform"]),
+    ("highway", ["bus_stop"]),
+    ("railway", ["station", "halt", "tram_stop"])
+]
+
 
 class AreaAnalyzer:
+    VERSION = '1'
+
     def __init__(self):
         self.osm_fetcher = OSMDataFetcher()
 
-    def perform_analysis(self, nw_lat: float, nw_lng: float, se_lat: float, se_lng: float) -> dict:
+    def perform_analysis(self, nw_lat: float, nw_lng: float, se_lat: float, se_lng: float,
+                         timer: Optional[StageTimer] = None) -> dict:
+        timer = timer or StageTimer()
         north_bound = max(nw_lat, se_lat)
         south_bound = min(nw_lat, se_lat)
         east_bound = max(nw_lng, se_lng)
         west_bound = min(nw_lng, se_lng)
 
-        osm_data = self.osm_fetcher.get_area_data(north_bound, west_bound, south_bound, east_bound)
-        area_size = self._calculate_area_size(north_bound, west_bound, south_bound, east_bound)
+        osm_data = timer.run("fetch", self.osm_fetcher.get_area_data,
+                             north_bound, west_bound, south_bound, east_bound)
+        return self.analyze_osm_data(osm_data, north_bound, west_bound, south_bound, east_bound, timer)
 
-        roads, road_count, road_types = self._extract_road_data(osm_data)
-        green_spaces, water_features = self._extract_green_and_water_data(osm_data)
-        hourly_congestion = self._estimate_hourly_congestion(road_types)
+    def analyze_osm_data(self, osm_data, north_bound: float, west_bound: float, south_bound: float,
+                         east_bound: float, timer: Optional[StageTimer] = None) -> dict:
+        # Аналіз уже отриманих даних - спільний для одиночного і пакетного аналізу
+        timer = timer or StageTimer()
+        osm_index = timer.run("index", OSMIndex.from_osm_data, osm_data)
+        timer.count("elements", osm_index.element_count)
+        area_size = self._calculate_area_size(north_bound, west_bound, south_bound, east_bound)
 
+        roads, road_count, road_types = timer.run("extract_road_data", self._extract_road_data, osm_index)
+        green_spaces, water_features = timer.run("extract_green_and_water_data",
+                                                 self._extract_green_and_water_data, osm_index)
+        transport_stops = self._count_transport_stops(osm_index)
+        timer.count("roads", road_count)
+        timer.count("green_spaces", len(green_spaces))
+        timer.count("water_features", len(water_features))
+
+        result = self._compose_result((north_bound, west_bound, south_bound, east_bound), area_size,
+                                      roads, road_count, road_types, green_spaces, water_features,
+                                      transport_stops, fetch_warnings(osm_data))
+        timer.log(f"[{north_bound}, {west_bound}, {south_bound}, {east_bound}]")
+        return result
+
+    def _compose_result(self, bounds: BBox, area_size: float, roads: list, road_count: int, road_types: dict,
+                        green_spaces: list, water_features: list, transport_stops: int,
+                        warnings: Optional[List[str]] = None) -> dict:
+        # Оцінки з уже зібраних агрегатів - спільне для повного і інкрементного аналізу
+        north_bound, west_bound, south_bound, east_bound = bounds
         return {
+            "incomplete": bool(warnings),
+            "warnings": list(warnings or []),
             "bounds": [[north_bound, west_bound], [south_bound, east_bound]],
             "area": round(area_size, 2),
             "road_count": road_count,
@@ -32,13 +84,73 @@ class AreaAnalyzer:
             "congestion": self._calculate_congestion_level(road_types),
             "ecology": self._calculate_ecology_score(green_spaces, water_features, area_size),
             "pedestrian_friendly": self._calculate_pedestrian_score(roads, road_types),
-            "public_transport": self._calculate_transport_score(osm_data),
-            "hourly_congestion": hourly_congestion,
+            "public_transport": self._score_transport_stops(transport_stops),
+            "hourly_congestion": self._estimate_hourly_congestion(road_types),
             "roads_data": roads,
             "green_spaces_data": green_spaces,
             "water_features_data": water_features
         }
 
+    def perform_batch_analysis(self, cells: List[BBox], workers: Optional[int] = None) -> Iterator[dict]:
+        return BatchAnalysis(self, workers=workers).run(cells)
+
+    def perform_grid_analysis(self, nw_lat: float, nw_lng: float, se_lat: float, se_lng: float,
+                              cell_size_m: Optional[float] = None, timer: Optional[StageTimer] = None) -> dict:
+        # Теплова карта: ті самі оцінки, що й perform_analysis, для кожної
+        # клітинки сітки - з одного запиту і одного індексу на весь регіон
+        timer = timer or StageTimer()
+        grid = AnalysisGrid.from_corners(nw_lat, nw_lng, se_lat, se_lng, cell_size_m)
+        osm_data = timer.run("fetch", self.osm_fetcher.get_area_data, *grid.bounds)
+        osm_index = timer.run("index", OSMIndex.from_osm_data, osm_data)
+        timer.count("elements", osm_index.element_count)
+        timer.count("cells", grid.size)
+
+        layers = timer.run("grid_layers", self._calculate_grid_layers, osm_index, grid)
+        timer.log(f"grid {grid.rows}x{grid.columns} {list(grid.bounds)}")
+        warnings = fetch_warnings(osm_data)
+        return {
+            **grid.to_dict(),
+            "incomplete": bool(warnings),
+            "warnings": warnings,
+            "layers": {name: layer.tolist() for name, layer in layers.items()}
+        }
+
+    def _calculate_grid_layers(self, osm_index: OSMIndex, grid: AnalysisGrid) -> Dict[str, np.ndarray]:
+        membership = GridMembership(osm_index, grid)
+
+        roads = osm_index.features["road"]
+        categories = [self._road_category(element["tags"]["highway"], element["tags"]) for element in roads]
+        road_type_counts = {
+            category: membership.count([road for road, road_category in zip(roads, categories)
+                                        if road_category == category])
+            for category in ROAD_CATEGORIES
+        }
+        total_roads = sum(road_type_counts.values())
+
+        green_spaces = membership.count([element for element in osm_index.features["green"]
+                                         if self._is_counted_green_space(element["tags"])])
+        water_features = membership.count([element for element in osm_index.features["water"]
+                                           if self._is_counted_water_feature(element["tags"])])
+        transport_stops = membership.count([element for element in osm_index.features["transport"]
+                                            if self._is_transport_stop(element["tags"])])
+
+        # Площа клітинки залежить лише від рядка
+        areas = np.array([
+            self._calculate_area_size(*grid.cell_bounds(row, 0)) for row in range(grid.rows)
+        ])[:, np.newaxis]
+        green_score = self._calculate_score_array(green_spaces, areas, 10)
+        water_score = self._calculate_score_array(water_features, areas, 15)
+
+        return {
+            "congestion": np.where(total_roads == 0, 50, self._calculate_score_array(
+                road_type_counts["Головні"], total_roads, 150)).astype(np.uint8),
+            "ecology": (0.7 * green_score + 0.3 * water_score).astype(np.uint8),
+            "pedestrian_friendly": np.where(total_roads == 0, 50, self._calculate_score_array(
+                road_type_counts["Пішохідні"], total_roads, 300)).astype(np.uint8),
+            "public_transport": self._calculate_score_array(transport_stops, 1, 5).astype(np.uint8),
+            "road_count": membership.count(roads).astype(np.int32)
+        }
+
     def _calculate_area_size(self, north: float, west: float, south: float, east: float) -> float:
         try:
             avg_latitude = (north + south) / 2
@@ -49,91 +161,99 @@ class AreaAnalyzer:
             logger.error(f"Помилка при обчисленні площі: {e}")
             return 1.0
 
-    def _extract_road_data(self, osm_data: dict) -> tuple:
+    def _extract_road_data(self, osm_index: OSMIndex) -> tuple:
+        osm_index = OSMIndex.ensure(osm_index)
         roads = []
         road_count = 0
         road_type_counts = defaultdict(int)
 
-        nodes = {
-            element["id"]: (element["lat"], element["lon"])
-            for element in osm_data.get("elements", [])
-            if element["type"] == "node"
-        }
-
-        for element in osm_data.get("elements", []):
-            if element["type"] == "way" and "highway" in element.get("tags", {}):
-                highway_type = element["tags"]["highway"]
-                road_length = self._calculate_road_length(element, nodes)
+        road_lengths = self._calculate_road_lengths(osm_index.features["road"], osm_index)
+        road_polylines = GeometryBuffer.from_ways(osm_index, osm_index.features["road"]).polylines()
 
-                roads.append({
-                    "id": element["id"],
-                    "type": highway_type,
-                    "name": element["tags"].get("name", "Unnamed road"),
-                    "length": round(road_length, 2)
-                })
-
-                self._categorize_road(road_type_counts, highway_type, element.get("tags", {}))
-                road_count += 1
+        for position, element in enumerate(osm_index.features["road"]):
+            roads.append(self._road_entry(element, road_lengths[position], road_polylines[position]))
+            self._categorize_road(road_type_counts, element["tags"]["highway"], element["tags"])
+            road_count += 1
 
         return roads, road_count, road_type_counts
 
-    def _calculate_road_length(self, road_element: dict, nodes: dict) -> float:
-        length = 0.0
-        road_nodes = road_element.get("nodes", [])
+    def _road_entry(self, element: dict, road_length: float, polyline: str = "") -> dict:
+        return {
+            "id": element["id"],
+            "type": element["tags"]["highway"],
+            "name": element["tags"].get("name", "Unnamed road"),
+            "length": round(float(road_length), 2),
+            "polyline": polyline
+        }
 
-        if len(road_nodes) > 1:
-            for i in range(len(road_nodes) - 1):
-                node1, node2 = road_nodes[i], road_nodes[i + 1]
-                if node1 in nodes and node2 in nodes:
-                    lat1, lon1 = nodes[node1]
-                    lat2, lon2 = nodes[node2]
-                    length += haversine(lon1, lat1, lon2, lat2)
-        return length
+    def _calculate_road_lengths(self, road_elements: list, osm_index: OSMIndex):
+        lat, lon, offsets = osm_index.gather_way_coordinates(road_elements, keep_missing=True)
+        return polyline_lengths(lat, lon, offsets)
 
     def _categorize_road(self, road_types: dict, highway_type: str, tags: dict):
-        mapping = {
-            "Головні": ["motorway", "trunk", "primary"],
-            "Другорядні": ["secondary", "tertiary"],
-            "Місцеві": ["residential", "service", "unclassified"],
-            "Пішохідні": ["pedestrian", "footway", "path", "steps"],
-            "Велосипедні": ["cycleway"]
-        }
-        for category, types in mapping.items():
+        category = self._road_category(highway_type, tags)
+        if category is not None:
+            road_types[category] += 1
+
+    def _road_category(self, highway_type: str, tags: dict) -> Optional[str]:
+        for category, types in ROAD_CATEGORIES.items():
             if highway_type in types or (category == "Велосипедні" and tags.get("bicycle") == "designated"):
-                road_types[category] += 1
-                break
-
-    def _extract_green_and_water_data(self, osm_data: dict) -> tuple:
-        green_spaces = []
-        water_features = []
-
-        for element in osm_data.get("elements", []):
-            if element["type"] not in ["way", "relation"] or "tags" not in element:
-                continue
-
-            tags = element["tags"]
-
-            if (tags.get("leisure") == "park"
-                    or tags.get("natural") == "wood"
-                    or tags.get("landuse") in ["forest", "meadow", "grass"]):
-                green_spaces.append({
-                    "id": element["id"],
-                    "type": tags.get("leisure") or tags.get("natural") or tags.get("landuse"),
-                    "name": tags.get("name", "Unnamed green space")
-                })
-
-            if tags.get("natural") == "water" or "waterway" in tags:
-                water_features.append({
-                    "id": element["id"],
-                    "type": tags.get("waterway") or tags.get("natural"),
-                    "name": tags.get("name", "Unnamed water feature")
-                })
+                return category
+        return None
+
+    def _extract_green_and_water_data(self, osm_index: OSMIndex) -> tuple:
+        osm_index = OSMIndex.ensure(osm_index)
+        green_elements = [element for element in osm_index.features["green"]
+                          if self._is_counted_green_space(element["tags"])]
+        water_elements = [element for element in osm_index.features["water"]
+                          if self._is_counted_water_feature(element["tags"])]
+
+        green_polylines = GeometryBuffer.from_ways(osm_index, green_elements).polylines()
+        water_polylines = GeometryBuffer.from_ways(osm_index, water_elements).polylines()
+        green_spaces = [self._green_space_entry(element, polyline)
+                        for element, polyline in zip(green_elements, green_polylines)]
+        water_features = [self._water_feature_entry(element, polyline)
+                          for element, polyline in zip(water_elements, water_polylines)]
 
         return green_spaces, water_features
 
+    def _green_space_entry(self, element: dict, polyline: str = "") -> dict:
+        tags = element["tags"]
+        return {
+            "id": element["id"],
+            "type": tags.get("leisure") or tags.get("natural") or tags.get("landuse"),
+            "name": tags.get("name", "Unnamed green space"),
+            "polyline": polyline
+        }
+
+    def _water_feature_entry(self, element: dict, polyline: str = "") -> dict:
+        tags = element["tags"]
+        return {
+            "id": element["id"],
+            "type": tags.get("waterway") or tags.get("natural"),
+            "name": tags.get("name", "Unnamed water feature"),
+            "polyline": polyline
+        }
+
+    def _is_counted_green_space(self, tags: dict) -> bool:
+        return (tags.get("leisure") == "park"
+                or tags.get("natural") == "wood"
+                or tags.get("landuse") in ["forest", "meadow", "grass"])
+
+    def _is_counted_water_feature(self, tags: dict) -> bool:
+        return tags.get("natural") == "water" or "waterway" in tags
+
+    def _is_transport_stop(self, tags: dict) -> bool:
+        return any(tags.get(key) in values for key, values in TRANSPORT_STOP_TAGS)
+
     def _calculate_score(self, value: float, max_value: float, weight: float = 1) -> int:
         return min(95, max(10, int(value * weight / max(max_value, 0.1))))
 
+    def _calculate_score_array(self, values, max_values, weight: float = 1) -> np.ndarray:
+        # Векторний варіант _calculate_score для шарів сітки
+        scores = np.asarray(values, dtype=np.float64) * weight / np.maximum(max_values, 0.1)
+        return np.clip(np.trunc(scores), 10, 95)
+
     def _calculate_ecology_score(self, green_spaces: list, water_features: list, area: float) -> int:
         green_score = self._calculate_score(len(green_spaces), area, 10)
         water_score = self._calculate_score(len(water_features), area, 15)
@@ -145,17 +265,16 @@ class AreaAnalyzer:
             return 50
         return self._calculate_score(road_types.get("Пішохідні", 0), total_roads, 300)
 
-    def _calculate_transport_score(self, osm_data: dict) -> int:
-        keywords = [
-            ("public_transport", ["stop_position", "platform"]),
-            ("highway", ["bus_stop"]),
-            ("railway", ["station", "halt", "tram_stop"])
-        ]
+    def _calculate_transport_score(self, osm_index: OSMIndex) -> int:
+        return self._score_transport_stops(self._count_transport_stops(osm_index))
 
-        transport_stops = sum(
-            1 for e in osm_data.get("elements", []) if e["type"] == "node" and "tags" in e and
-            any(e["tags"].get(k) in v for k, v in keywords)
+    def _count_transport_stops(self, osm_index: OSMIndex) -> int:
+        return sum(
+            1 for e in OSMIndex.ensure(osm_index).features["transport"]
+            if self._is_transport_stop(e["tags"])
         )
+
+    def _score_transport_stops(self, transport_stops: int) -> int:
         return self._calculate_score(transport_stops, 1, 5)
 
     def _calculate_congestion_level(self, road_types: dict) -> int:
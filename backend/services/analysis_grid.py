@@ -0,0 +1,211 @@
+from itertools import chain
+from typing import Dict, List, Optional, Tuple
+import logging
+import math
+
+import numpy as np
+
+from .geometry import EARTH_RADIUS_KM
+from .osm_data import _setting
+from .osm_index import OSMIndex
+
+logger = logging.getLogger(__name__)
+
+# (north, west, south, east)
+BBox = Tuple[float, float, float, float]
+
+METERS_PER_DEGREE = EARTH_RADIUS_KM * 1000.0 * math.pi / 180.0
+
+
+class AnalysisGrid:
+    # Сітка з майже квадратних клітинок ~cell_size_m, яка рівно покриває bbox.
+    # Клітинки нумеруються по рядках з півночі на південь, у рядку - із заходу на схід
+    def __init__(self, north: float, west: float, south: float, east: float, cell_size_m: float = 250.0):
+        if cell_size_m <= 0:
+            raise ValueError("Cell size must be positive")
+        self.north, self.west, self.south, self.east = north, west, south, east
+        self.cell_size_m = cell_size_m
+
+        lat_step = cell_size_m / METERS_PER_DEGREE
+        lon_step = lat_step / max(math.cos(math.radians((north + south) / 2)), 0.01)
+        self.rows = max(1, round((north - south) / lat_step))
+        self.columns = max(1, round((east - west) / lon_step))
+        self.lat_step = (north - south) / self.rows
+        self.lon_step = (east - west) / self.columns
+
+    @classmethod
+    def from_corners(cls, nw_lat: float, nw_lng: float, se_lat: float, se_lng: float,
+                     cell_size_m: Optional[float] = None, max_cells: Optional[int] = None) -> 'AnalysisGrid':
+        cell_size_m = cell_size_m if cell_size_m is not None else _setting('ANALYSIS_GRID_CELL_M', 250)
+        max_cells = max_cells if max_cells is not None else _setting('ANALYSIS_GRID_MAX_CELLS', 10000)
+        grid = cls(max(nw_lat, se_lat), min(nw_lng, se_lng), min(nw_lat, se_lat), max(nw_lng, se_lng),
+                   float(cell_size_m))
+        if grid.size > max_cells:
+            raise ValueError(f"Too many grid cells: {grid.rows}x{grid.columns} (max {max_cells})")
+        return grid
+
+    @property
+    def bounds(self) -> BBox:
+        return self.north, self.west, self.south, self.east
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.rows, self.columns
+
+    @property
+    def size(self) -> int:
+        return self.rows * self.columns
+
+    def cell_bounds(self, row: int, column: int) -> BBox:
+        return (
+            self.north - row * self.lat_step,
+            self.west + column * self.lon_step,
+            self.north - (row + 1) * self.lat_step,
+            self.west + (column + 1) * self.lon_step
+        )
+
+    def locate(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        # Номер клітинки для кожної точки, -1 - поза сіткою або без координат.
+        # Точка на спільній межі належить одній клітинці (північній/західній)
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        inside = (lat >= self.south) & (lat <= self.north) & (lon >= self.west) & (lon <= self.east)
+        with np.errstate(invalid="ignore"):
+            rows = np.minimum(np.floor((self.north - lat) / self.lat_step), self.rows - 1)
+            columns = np.minimum(np.floor((lon - self.west) / self.lon_step), self.columns - 1)
+        return np.where(inside, rows * self.columns + columns, -1).astype(np.int64)
+
+    def to_dict(self) -> dict:
+        return {
+            "bounds": [[self.north, self.west], [self.south, self.east]],
+            "rows": self.rows,
+            "columns": self.columns,
+            "cell_size_m": self.cell_size_m,
+            "cell_degrees": [self.lat_step, self.lon_step]
+        }
+
+
+class GridMembership:
+    # Які клітинки сітки "бачать" кожен елемент - за тими ж правилами, що й
+    # запит Overpass на одну клітинку (clip_elements): лінія - якщо в клітинці
+    # хоча б один її вузол, відношення - якщо в клітинці хоча б одна його лінія,
+    # вузол з тегами - за власними координатами і разом з лініями й відношеннями,
+    # до яких він входить. Розбиття ліній рахується один раз для всієї сітки
+    def __init__(self, osm_index: OSMIndex, grid: AnalysisGrid):
+        self.osm_index = osm_index
+        self.grid = grid
+
+        ways = list(osm_index.ways.values())
+        self._way_positions = {way["id"]: position for position, way in enumerate(ways)}
+        lengths = np.fromiter((len(way.get("nodes", [])) for way in ways), dtype=np.int64, count=len(ways))
+        self._refs = np.fromiter(chain.from_iterable(way.get("nodes", []) for way in ways),
+                                 dtype=np.int64, count=int(lengths.sum()))
+        self._ref_ways = np.repeat(np.arange(len(ways)), lengths)
+
+        lat, lon, _ = osm_index.gather_way_coordinates(ways, keep_missing=True)
+        ref_cells = grid.locate(lat, lon)
+        located = ref_cells >= 0
+        pairs = np.unique(self._ref_ways[located] * grid.size + ref_cells[located])
+        self._cell_ways = pairs // grid.size
+        self._way_cells = pairs % grid.size
+        self._way_offsets = np.searchsorted(self._cell_ways, np.arange(len(ways) + 1))
+
+        self._relation_cells: Dict[int, np.ndarray] = {}
+        self._node_relations: Optional[Dict[int, List[dict]]] = None
+
+    def _expand(self, way_positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Клітинки для списку ліній: (номер у списку, клітинка)
+        way_positions = np.asarray(way_positions, dtype=np.int64)
+        starts = self._way_offsets[way_positions]
+        counts = self._way_offsets[way_positions + 1] - starts
+        total = int(counts.sum())
+        slots = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(total)
+        return np.repeat(np.arange(len(way_positions)), counts), self._way_cells[slots]
+
+    def relation_cells(self, relation: dict) -> np.ndarray:
+        cells = self._relation_cells.get(relation["id"])
+        if cells is None:
+            positions = [
+                self._way_positions[member.get("ref")] for member in relation.get("members", [])
+                if member.get("type") == "way" and member.get("ref") in self._way_positions
+            ]
+            cells = np.unique(self._expand(positions)[1]) if positions else np.zeros(0, dtype=np.int64)
+            self._relation_cells[relation["id"]] = cells
+        return cells
+
+    def _relations_with_node(self, node_id: int) -> List[dict]:
+        if self._node_relations is None:
+            self._node_relations = {}
+            for relation in self.osm_index.relations.values():
+                for member in relation.get("members", []):
+                    if member.get("type") == "node":
+                        self._node_relations.setdefault(member.get("ref"), []).append(relation)
+        return self._node_relations.get(node_id, [])
+
+    def element_cells(self, elements: List[dict]) -> Tuple[np.ndarray, np.ndarray]:
+        # Унікальні пари (номер елемента у списку, клітинка)
+        owners = []
+        cells = []
+
+        way_owners, way_positions = [], []
+        node_owners, node_ids, node_lat, node_lon = [], [], [], []
+        for position, element in enumerate(elements):
+            element_type = element["type"]
+            if element_type == "way":
+                way_position = self._way_positions.get(element["id"])
+                if way_position is not None:
+                    way_owners.append(position)
+                    way_positions.append(way_position)
+            elif element_type == "relation":
+                relation_cells = self.relation_cells(element)
+                owners.append(np.full(len(relation_cells), position, dtype=np.int64))
+                cells.append(relation_cells)
+            elif element_type == "node":
+                node_owners.append(position)
+                node_ids.append(element["id"])
+                node_lat.append(element.get("lat", np.nan))
+                node_lon.append(element.get("lon", np.nan))
+                for relation in self._relations_with_node(element["id"]):
+                    relation_cells = self.relation_cells(relation)
+                    owners.append(np.full(len(relation_cells), position, dtype=np.int64))
+                    cells.append(relation_cells)
+
+        if way_positions:
+            slots, way_cells = self._expand(way_positions)
+            owners.append(np.asarray(way_owners, dtype=np.int64)[slots])
+            cells.append(way_cells)
+
+        if node_ids:
+            node_owners = np.asarray(node_owners, dtype=np.int64)
+            own_cells = self.grid.locate(node_lat, node_lon)
+            owners.append(node_owners[own_cells >= 0])
+            cells.append(own_cells[own_cells >= 0])
+
+            # Вузол приходить у клітинку разом з кожною лінією, до якої входить
+            node_ids = np.asarray(node_ids, dtype=np.int64)
+            order = np.argsort(node_ids, kind="stable")
+            sorted_ids = node_ids[order]
+            member = np.isin(self._refs, sorted_ids)
+            if member.any():
+                refs = self._refs[member]
+                containing = self._ref_ways[member]
+                first = np.searchsorted(sorted_ids, refs, "left")
+                last = np.searchsorted(sorted_ids, refs, "right")
+                # Той самий вузол може бути в списку кількох ознак
+                repeats = last - first
+                ref_slots = np.repeat(np.arange(len(refs)), repeats)
+                node_slots = order[np.repeat(first - (np.cumsum(repeats) - repeats), repeats)
+                                   + np.arange(int(repeats.sum()))]
+                slots, way_cells = self._expand(containing[ref_slots])
+                owners.append(node_owners[node_slots][slots])
+                cells.append(way_cells)
+
+        if not owners:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        pairs = np.unique(np.concatenate(owners) * self.grid.size + np.concatenate(cells))
+        return pairs // self.grid.size, pairs % self.grid.size
+
+    def count(self, elements: List[dict]) -> np.ndarray:
+        # Скільки елементів списку потрапляє в кожну клітинку, масив rows x columns
+        _, cells = self.element_cells(elements)
+        return np.bincount(cells, minlength=self.grid.size).reshape(self.grid.shape)
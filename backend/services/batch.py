@@ -0,0 +1,248 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from importlib import import_module
+from itertools import chain
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import logging
+import multiprocessing
+import threading
+import time
+
+import numpy as np
+
+from .osm_cache import way_geometry_nodes
+from .osm_data import _setting, fetch_warnings
+
+logger = logging.getLogger(__name__)
+
+# (north, west, south, east)
+BBox = Tuple[float, float, float, float]
+
+
+def union_bbox(cells: Sequence[BBox]) -> BBox:
+    return (
+        max(cell[0] for cell in cells),
+        min(cell[1] for cell in cells),
+        min(cell[2] for cell in cells),
+        max(cell[3] for cell in cells)
+    )
+
+
+def partition_elements(elements: List[dict], cells: Sequence[BBox]) -> List[List[dict]]:
+    # Ділить одну відповідь Overpass на клітинки за тими ж правилами, що й
+    # окремий запит: лінія потрапляє в клітинку, якщо хоча б один її вузол
+    # усередині, і приходить разом з усіма своїми вузлами
+    nodes: Dict[int, dict] = {}
+    ways = []
+    relations = []
+    for element in elements:
+        element_type = element["type"]
+        if element_type == "node":
+            if element["id"] not in nodes or "tags" in element:
+                nodes[element["id"]] = element
+        elif element_type == "way":
+            ways.append(element)
+        elif element_type == "relation":
+            relations.append(element)
+
+    located = [node for node in nodes.values() if "lat" in node and "lon" in node]
+    # Лінії з "out geom" дають координати своїх вузлів без окремих елементів
+    inline = [point for way in ways for point in way_geometry_nodes(way)]
+    node_ids = np.array([node["id"] for node in located] + [point[0] for point in inline], dtype=np.int64)
+    node_lat = np.array([node["lat"] for node in located] + [point[1] for point in inline], dtype=np.float64)
+    node_lon = np.array([node["lon"] for node in located] + [point[2] for point in inline], dtype=np.float64)
+    order = np.argsort(node_ids)
+    node_ids, node_lat, node_lon = node_ids[order], node_lat[order], node_lon[order]
+
+    lengths = np.fromiter((len(way.get("nodes", [])) for way in ways), dtype=np.int64, count=len(ways))
+    offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+    refs = np.fromiter(chain.from_iterable(way.get("nodes", []) for way in ways),
+                       dtype=np.int64, count=int(lengths.sum()))
+    owners = np.repeat(np.arange(len(ways)), lengths)
+
+    # Точки ліній з відомими координатами, відсортовані за широтою: клітинка
+    # бере смугу через searchsorted і фільтрує її за довготою
+    if len(node_ids):
+        positions = np.minimum(np.searchsorted(node_ids, refs), len(node_ids) - 1)
+        found = node_ids[positions] == refs
+    else:
+        positions = np.zeros(len(refs), dtype=np.int64)
+        found = np.zeros(len(refs), dtype=bool)
+    ref_owner = owners[found]
+    ref_lat = node_lat[positions[found]]
+    ref_lon = node_lon[positions[found]]
+    by_lat = np.argsort(ref_lat, kind="stable")
+    ref_owner, ref_lat, ref_lon = ref_owner[by_lat], ref_lat[by_lat], ref_lon[by_lat]
+
+    tagged = [node for node in located if node.get("tags")]
+    tagged_lat = np.array([node["lat"] for node in tagged], dtype=np.float64)
+    tagged_lon = np.array([node["lon"] for node in tagged], dtype=np.float64)
+    tagged_order = np.argsort(tagged_lat, kind="stable")
+    tagged_lat, tagged_lon = tagged_lat[tagged_order], tagged_lon[tagged_order]
+
+    way_positions_by_id = {way["id"]: position for position, way in enumerate(ways)}
+    relation_ways = [
+        {member.get("ref") for member in relation.get("members", []) if member.get("type") == "way"}
+        for relation in relations
+    ]
+
+    parts = []
+    for north, west, south, east in cells:
+        start, end = np.searchsorted(ref_lat, south, "left"), np.searchsorted(ref_lat, north, "right")
+        band = slice(start, end)
+        inside = (ref_lon[band] >= west) & (ref_lon[band] <= east)
+        way_positions = np.unique(ref_owner[band][inside]).tolist()
+
+        part = {}
+        for position in way_positions:
+            way = ways[position]
+            part[("way", way["id"])] = way
+            for node_id in refs[offsets[position]:offsets[position + 1]].tolist():
+                node = nodes.get(node_id)
+                if node is not None:
+                    part[("node", node_id)] = node
+
+        start, end = np.searchsorted(tagged_lat, south, "left"), np.searchsorted(tagged_lat, north, "right")
+        band = slice(start, end)
+        inside = (tagged_lon[band] >= west) & (tagged_lon[band] <= east)
+        for position in tagged_order[band][inside].tolist():
+            node = tagged[position]
+            part[("node", node["id"])] = node
+
+        way_ids = {way_id for element_type, way_id in part if element_type == "way"}
+        for relation, members in zip(relations, relation_ways):
+            if members & way_ids:
+                part[("relation", relation["id"])] = relation
+                for member in relation.get("members", []):
+                    if member.get("type") == "node" and member.get("ref") in nodes:
+                        part.setdefault(("node", member["ref"]), nodes[member["ref"]])
+                # Усі лінії-члени, як у відповіді Overpass на окрему клітинку
+                for way_id in members - way_ids:
+                    position = way_positions_by_id.get(way_id)
+                    if position is None:
+                        continue
+                    part[("way", way_id)] = ways[position]
+                    for node_id in refs[offsets[position]:offsets[position + 1]].tolist():
+                        node = nodes.get(node_id)
+                        if node is not None:
+                            part.setdefault(("node", node_id), node)
+
+        parts.append(list(part.values()))
+    return parts
+
+
+_worker_analyzer = None
+
+
+def _init_worker(analyzer_path: str):
+    # Процес запускається через spawn, тож Django і аналізатор готуються заново
+    global _worker_analyzer
+    try:
+        import django
+        django.setup()
+    except Exception as e:
+        logger.warning(f"Batch worker runs without Django settings: {e}")
+    module_name, class_name = analyzer_path.rsplit(".", 1)
+    _worker_analyzer = getattr(import_module(module_name), class_name)()
+
+
+def _analyze_cell(cell: BBox, elements: List[dict]) -> dict:
+    return _worker_analyzer.analyze_osm_data({"elements": elements}, *cell)
+
+
+_batch_pools: Dict[Tuple[str, int], ProcessPoolExecutor] = {}
+_batch_pools_lock = threading.Lock()
+
+
+def get_batch_pool(analyzer_path: str, workers: int) -> ProcessPoolExecutor:
+    # Пул живе весь процес: spawn і django.setup() у воркерах оплачуються
+    # один раз, а не на кожен пакет
+    key = (analyzer_path, workers)
+    with _batch_pools_lock:
+        pool = _batch_pools.get(key)
+        if pool is None:
+            pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=_init_worker, initargs=(analyzer_path,))
+            _batch_pools[key] = pool
+        return pool
+
+
+def discard_batch_pool(pool: ProcessPoolExecutor):
+    # Пул із загиблим воркером більше не приймає задач - наступний пакет створить новий
+    with _batch_pools_lock:
+        for key, existing in list(_batch_pools.items()):
+            if existing is pool:
+                del _batch_pools[key]
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+class BatchAnalysis:
+    # Пакетний аналіз сітки клітинок: один запит до Overpass на об'єднаний
+    # bbox, розбиття елементів за клітинками і аналіз клітинок у пулі процесів.
+    # Результати віддаються в порядку готовності
+    def __init__(self, analyzer, workers: Optional[int] = None, max_cells: Optional[int] = None,
+                 parallel_min_cells: Optional[int] = None):
+        self.analyzer = analyzer
+        self.workers = workers if workers is not None else _setting('ANALYSIS_BATCH_WORKERS', 1)
+        self.max_cells = max_cells if max_cells is not None else _setting('ANALYSIS_BATCH_MAX_CELLS', 500)
+        # Малий пакет швидше порахувати в цьому процесі, ніж передавати клітинки воркерам
+        self.parallel_min_cells = (parallel_min_cells if parallel_min_cells is not None
+                                   else _setting('ANALYSIS_BATCH_PARALLEL_MIN_CELLS', 8))
+
+    def run(self, cells: Sequence[BBox]) -> Iterator[dict]:
+        cells = [self._normalize(cell) for cell in cells]
+        if not cells:
+            raise ValueError("At least one cell is required")
+        if len(cells) > self.max_cells:
+            raise ValueError(f"Too many cells: {len(cells)} (max {self.max_cells})")
+        return self._run(cells)
+
+    def _run(self, cells: List[BBox]) -> Iterator[dict]:
+        started = time.perf_counter()
+        osm_data = self.analyzer.osm_fetcher.get_area_data(*union_bbox(cells))
+        parts = partition_elements(list(osm_data.get("elements", [])), cells)
+        # Невідомо, яких клітинок стосуються втрачені тайли, тож позначаються всі
+        warnings = fetch_warnings(osm_data)
+        logger.info(f"Batch of {len(cells)} cells: fetched and partitioned in {time.perf_counter() - started:.2f}s")
+
+        if self.workers > 1 and len(cells) > 1 and len(cells) >= self.parallel_min_cells:
+            analyzer_class = type(self.analyzer)
+            pool = get_batch_pool(f"{analyzer_class.__module__}.{analyzer_class.__qualname__}", self.workers)
+            try:
+                futures = {pool.submit(_analyze_cell, cell, part): index
+                           for index, (cell, part) in enumerate(zip(cells, parts))}
+            except BrokenProcessPool:
+                discard_batch_pool(pool)
+                raise
+            broken = False
+            try:
+                for future in as_completed(futures):
+                    index = futures[future]
+                    broken = broken or isinstance(future.exception(), BrokenProcessPool)
+                    yield self._outcome(index, cells[index], future.result, warnings)
+            finally:
+                # Клієнт міг перестати читати потік - решта клітинок не займає спільний пул
+                for future in futures:
+                    future.cancel()
+            if broken:
+                discard_batch_pool(pool)
+        else:
+            for index, (cell, part) in enumerate(zip(cells, parts)):
+                yield self._outcome(index, cell, lambda: self.analyzer.analyze_osm_data({"elements": part}, *cell),
+                                    warnings)
+
+    def _outcome(self, index: int, cell: BBox, compute, warnings: List[str]) -> dict:
+        try:
+            results = compute()
+            if warnings:
+                results["incomplete"] = True
+                results["warnings"] = results.get("warnings", []) + warnings
+            return {"index": index, "bbox": list(cell), "status": "success", "results": results}
+        except Exception as e:
+            logger.error(f"Batch cell {index} {cell} failed: {e}")
+            return {"index": index, "bbox": list(cell), "status": "error", "message": str(e)}
+
+    @staticmethod
+    def _normalize(cell) -> BBox:
+        north, west, south, east = (float(value) for value in cell)
+        return max(north, south), min(west, east), min(north, south), max(west, east)
@@ -0,0 +1,132 @@
+from collections import defaultdict
+from statistics import median
+from typing import Dict, List, Optional, Sequence
+import gc
+import logging
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+
+from .osm_columnar import ColumnarOSMData
+from .profiling import StageTimer
+from .synthetic_osm import SyntheticOSMGenerator
+
+logger = logging.getLogger(__name__)
+
+
+class StaticOSMFetcher:
+    # Підміна OSMDataFetcher, яка завжди повертає заздалегідь згенеровані дані
+    def __init__(self, osm_data: dict):
+        self.osm_data = osm_data
+
+    def get_area_data(self, north: float, west: float, south: float, east: float) -> dict:
+        return self.osm_data
+
+
+class AnalysisBenchmark:
+    def __init__(self, analyzer_class, seed: int = 0, layout: str = "grid", repeat: int = 3,
+                 trace_memory: bool = True, columnar: bool = False):
+        self.analyzer_class = analyzer_class
+        self.seed = seed
+        self.layout = layout
+        self.repeat = repeat
+        self.trace_memory = trace_memory
+        self.columnar = columnar
+        self.generator = SyntheticOSMGenerator(seed=seed)
+
+    def run(self, sizes: Sequence[int]) -> dict:
+        return {
+            "meta": self._meta(),
+            "runs": [self.run_size(size) for size in sizes]
+        }
+
+    def run_size(self, size: int) -> dict:
+        started = time.perf_counter()
+        osm_data = self.generator.generate(size, self.layout)
+        generate_seconds = time.perf_counter() - started
+        bounds = self.generator.bounds(size)
+        element_count = len(osm_data["elements"])
+        if self.columnar:
+            osm_data = ColumnarOSMData.from_osm_data(osm_data)
+
+        totals = []
+        stage_samples: Dict[str, List[float]] = defaultdict(list)
+        for _ in range(self.repeat):
+            total, stages = self._timed_run(osm_data, bounds)
+            totals.append(total)
+            for name, seconds in stages.items():
+                stage_samples[name].append(seconds)
+
+        total_seconds = median(totals)
+        stages = {name: round(median(samples), 6) for name, samples in stage_samples.items()}
+        stages["other"] = round(max(total_seconds - sum(stages.values()), 0.0), 6)
+
+        result = {
+            "requested_elements": size,
+            "elements": element_count,
+            "generate_seconds": round(generate_seconds, 6),
+            "total_seconds": round(total_seconds, 6),
+            "min_seconds": round(min(totals), 6),
+            "throughput_elements_per_second": round(element_count / total_seconds) if total_seconds else None,
+            "stages": dict(sorted(stages.items(), key=lambda item: -item[1]))
+        }
+        if self.trace_memory:
+            peak, stage_peaks = self._peak_memory(osm_data, bounds)
+            result["peak_memory_mb"] = round(peak / 1024 / 1024, 2)
+            result["stage_peak_kb"] = stage_peaks
+
+        logger.info(f"Benchmark {self.layout} {element_count} elements: {total_seconds:.3f}s")
+        return result
+
+    def _make_analyzer(self, osm_data: dict):
+        analyzer = self.analyzer_class()
+        analyzer.osm_fetcher = StaticOSMFetcher(osm_data)
+        return analyzer
+
+    def _timed_run(self, osm_data: dict, bounds: tuple):
+        analyzer = self._make_analyzer(osm_data)
+        timer = StageTimer()
+
+        gc.collect()
+        started = time.perf_counter()
+        analyzer.perform_analysis(*bounds, timer=timer)
+        total = time.perf_counter() - started
+        return total, {name: stage["wall_ms"] / 1000 for name, stage in timer.stages.items()}
+
+    def _peak_memory(self, osm_data: dict, bounds: tuple):
+        analyzer = self._make_analyzer(osm_data)
+        timer = StageTimer(trace_memory=True)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            analyzer.perform_analysis(*bounds, timer=timer)
+            peak = max(timer.peak_memory, tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+        return peak, {name: round(stage["peak_kb"], 1) for name, stage in timer.stages.items()}
+
+    def _meta(self) -> dict:
+        return {
+            "analyzer": f"{self.analyzer_class.__module__}.{self.analyzer_class.__name__}",
+            "analyzer_version": getattr(self.analyzer_class, "VERSION", None),
+            "seed": self.seed,
+            "layout": self.layout,
+            "repeat": self.repeat,
+            "columnar": self.columnar,
+            "commit": self._git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine()
+        }
+
+    def _git_commit(self) -> Optional[str]:
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True, text=True, timeout=5, check=True
+            ).stdout.strip() or None
+        except Exception:
+            return None
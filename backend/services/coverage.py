@@ -0,0 +1,173 @@
+from typing import List, Tuple
+import logging
+import math
+
+import numpy as np
+
+from .analysis_grid import METERS_PER_DEGREE
+from .osm_index import OSMIndex
+
+logger = logging.getLogger(__name__)
+
+
+class PolygonSet:
+    # Кільця набору полігонів у спільних масивах: точки кільця i -
+    # lat/lon[offsets[i]:offsets[i + 1]], owners[i] - номер полігону.
+    # Внутрішні кільця мультиполігону належать тому ж полігону, що й зовнішні
+    def __init__(self, lat: np.ndarray, lon: np.ndarray, offsets: np.ndarray, owners: np.ndarray,
+                 missing: int = 0):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.owners = np.asarray(owners, dtype=np.int64)
+        self.missing = missing
+
+    @classmethod
+    def from_elements(cls, osm_index: OSMIndex, elements: List[dict]) -> 'PolygonSet':
+        # Лінії з трьох і більше точок вважаються замкненими (як у way_areas),
+        # відношення - за зібраними кільцями; решта рахується як missing
+        ways = [element for element in elements if element["type"] == "way"]
+        lat, lon, offsets = osm_index.gather_way_coordinates(ways)
+        sizes = np.diff(offsets)
+        valid = sizes >= 3
+
+        lat_parts = [lat[np.repeat(valid, sizes)]]
+        lon_parts = [lon[np.repeat(valid, sizes)]]
+        ring_sizes = [sizes[valid]]
+        owners = [np.arange(int(valid.sum()))]
+        missing = len(ways) - int(valid.sum())
+
+        multipolygons = osm_index.multipolygons()
+        next_owner = int(valid.sum())
+        for element in elements:
+            if element["type"] != "relation":
+                continue
+            multipolygon = multipolygons.get(element["id"])
+            if multipolygon is None or not multipolygon.outer:
+                missing += 1
+                continue
+            for ring_lat, ring_lon in multipolygon.rings:
+                lat_parts.append(ring_lat)
+                lon_parts.append(ring_lon)
+                ring_sizes.append([len(ring_lat)])
+                owners.append([next_owner])
+            next_owner += 1
+
+        ring_sizes = np.concatenate(ring_sizes).astype(np.int64)
+        return cls(np.concatenate(lat_parts), np.concatenate(lon_parts),
+                   np.concatenate(([0], np.cumsum(ring_sizes))), np.concatenate(owners), missing)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+
+class CoverageRaster:
+    # Растр bbox з клітинок ~resolution_m. Полігони заливаються векторним
+    # scanline-алгоритмом за правилом парності: для кожного рядка растра
+    # перетини ребер з лінією через центри клітинок сортуються і з'єднуються
+    # попарно в відрізки. Відрізки всіх полігонів додаються в один масив
+    # різниць, тож перекриття (газон усередині парку) рахується один раз.
+    # Розмір растра обмежений max_cells - за потреби клітинки збільшуються
+    def __init__(self, north: float, west: float, south: float, east: float,
+                 resolution_m: float = 10.0, max_cells: int = 4000000):
+        if resolution_m <= 0:
+            raise ValueError("Raster resolution must be positive")
+        self.north, self.west, self.south, self.east = north, west, south, east
+
+        height_m = max(north - south, 0.0) * METERS_PER_DEGREE
+        width_m = max(east - west, 0.0) * METERS_PER_DEGREE * max(math.cos(math.radians((north + south) / 2)), 0.01)
+        cells = (height_m / resolution_m) * (width_m / resolution_m)
+        if cells > max_cells:
+            resolution_m *= math.sqrt(cells / max_cells)
+        self.resolution_m = resolution_m
+        self.rows = max(1, math.ceil(height_m / resolution_m))
+        self.columns = max(1, math.ceil(width_m / resolution_m))
+        self.lat_step = (north - south) / self.rows if north > south else 1.0
+        self.lon_step = (east - west) / self.columns if east > west else 1.0
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.rows, self.columns
+
+    def fill(self, polygons: PolygonSet) -> np.ndarray:
+        # Маска rows x columns: True - центр клітинки всередині хоча б одного полігону
+        coverage = np.zeros((self.rows, self.columns + 1), dtype=np.int32)
+        if len(polygons) == 0 or len(polygons.lat) == 0:
+            return coverage[:, :-1] > 0
+
+        # Координати в одиницях растра: y - рядки з півночі, x - стовпці із заходу
+        y = (self.north - polygons.lat) / self.lat_step
+        x = (polygons.lon - self.west) / self.lon_step
+
+        # Ребро з'єднує точку з наступною, остання точка кільця - з першою
+        sizes = np.diff(polygons.offsets)
+        following = np.arange(1, len(y) + 1)
+        non_empty = sizes > 0
+        following[polygons.offsets[1:][non_empty] - 1] = polygons.offsets[:-1][non_empty]
+        edge_owners = np.repeat(polygons.owners, sizes)
+
+        y0, y1, x0, x1 = y, y[following], x, x[following]
+        low, high = np.minimum(y0, y1), np.maximum(y0, y1)
+        # Центр рядка r - y = r + 0.5; ребро перетинає рядки з центром у [low, high)
+        first_row = np.maximum(np.ceil(low - 0.5), 0).astype(np.int64)
+        last_row = np.minimum(np.ceil(high - 0.5), self.rows).astype(np.int64)
+        counts = np.maximum(last_row - first_row, 0)
+        crossing = counts > 0
+        if not crossing.any():
+            return coverage[:, :-1] > 0
+
+        counts = counts[crossing]
+        total = int(counts.sum())
+        edges = np.repeat(np.flatnonzero(crossing), counts)
+        rows = (np.repeat(first_row[crossing] - (np.cumsum(counts) - counts), counts)
+                + np.arange(total))
+        centers = rows + 0.5
+        xs = x0[edges] + (centers - y0[edges]) * (x1[edges] - x0[edges]) / (y1[edges] - y0[edges])
+
+        # Рядок кожного полігону перетинається парну кількість разів: після
+        # сортування сусідні пари перетинів - відрізки всередині полігону
+        order = np.lexsort((xs, rows, edge_owners[edges]))
+        rows, xs = rows[order], xs[order]
+        starts = np.clip(np.ceil(xs[0::2] - 0.5), 0, self.columns).astype(np.int64)
+        ends = np.clip(np.ceil(xs[1::2] - 0.5), 0, self.columns).astype(np.int64)
+        span_rows = rows[0::2]
+
+        flat = coverage.reshape(-1)
+        width = self.columns + 1
+        np.add.at(flat, span_rows * width + starts, 1)
+        np.add.at(flat, span_rows * width + ends, -1)
+        return np.cumsum(coverage, axis=1)[:, :-1] > 0
+
+
+class GreenCoverage:
+    # Частки bbox під зеленими зонами і під водою (без уже зелених клітинок)
+    def __init__(self, resolution_m: float = 10.0, max_cells: int = 4000000):
+        self.resolution_m = resolution_m
+        self.max_cells = max_cells
+
+    @classmethod
+    def from_settings(cls) -> 'GreenCoverage':
+        try:
+            from django.conf import settings
+            return cls(
+                resolution_m=getattr(settings, 'GREEN_COVERAGE_RESOLUTION_M', 10.0),
+                max_cells=getattr(settings, 'GREEN_COVERAGE_MAX_CELLS', 4000000)
+            )
+        except Exception as e:
+            logger.warning(f"Using default green coverage settings: {e}")
+            return cls()
+
+    def measure(self, osm_index: OSMIndex, green: List[dict], water: List[dict],
+                north: float, west: float, south: float, east: float) -> dict:
+        raster = CoverageRaster(north, west, south, east, self.resolution_m, self.max_cells)
+        green_polygons = PolygonSet.from_elements(osm_index, green)
+        water_polygons = PolygonSet.from_elements(osm_index, water)
+        green_mask = raster.fill(green_polygons)
+        water_mask = raster.fill(water_polygons) & ~green_mask
+
+        return {
+            "green_percent": round(float(green_mask.mean()) * 100, 2),
+            "water_percent": round(float(water_mask.mean()) * 100, 2),
+            "resolution_m": round(raster.resolution_m, 2),
+            "missing_geometry": green_polygons.missing + water_polygons.missing
+        }
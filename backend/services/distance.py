@@ -0,0 +1,34 @@
+import numpy as np
+
+from .geometry import EARTH_RADIUS_KM, ring_ids
+
+
+def haversine_array(lon1, lat1, lon2, lat2) -> np.ndarray:
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lon1, lat1, lon2, lat2))
+
+    dlon = lon2 - lon1
+    dlat = lat2 - lat1
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def segment_lengths(lat: np.ndarray, lon: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    # Довжини відрізків між сусідніми точками; відрізки через межу двох ліній
+    # і відрізки з невідомою точкою (NaN) мають довжину 0
+    if len(lat) < 2:
+        return np.zeros(max(len(lat) - 1, 0))
+
+    lengths = haversine_array(lon[:-1], lat[:-1], lon[1:], lat[1:])
+    owners = ring_ids(np.asarray(offsets, dtype=np.int64))
+    lengths[owners[:-1] != owners[1:]] = 0.0
+    return np.nan_to_num(lengths, nan=0.0)
+
+
+def polyline_lengths(lat: np.ndarray, lon: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    offsets = np.asarray(offsets, dtype=np.int64)
+    count = len(offsets) - 1
+    if len(lat) < 2:
+        return np.zeros(count)
+
+    owners = ring_ids(offsets)
+    return np.bincount(owners[:-1], weights=segment_lengths(lat, lon, offsets), minlength=count)
@@ -0,0 +1,177 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+from .multipolygon import Multipolygon
+from .osm_index import OSMIndex
+
+logger = logging.getLogger(__name__)
+
+POLYLINE_PRECISION = 5
+# 6 груп по 5 біт вистачає для приросту до 360 градусів з точністю 1e-5
+_MAX_CHUNKS = 7
+
+
+def _empty_offsets(count: int) -> np.ndarray:
+    return np.zeros(count + 1, dtype=np.int64)
+
+
+def encode_polylines(lat: np.ndarray, lon: np.ndarray, offsets: np.ndarray,
+                     precision: int = POLYLINE_PRECISION) -> List[str]:
+    # Encoded Polyline (формат Google) для кожної лінії CSR-масиву одним
+    # векторним проходом: різниці, zigzag, групи по 5 біт, символи з кодом +63
+    offsets = np.asarray(offsets, dtype=np.int64)
+    count = len(offsets) - 1
+    if len(lat) == 0:
+        return [""] * count
+
+    factor = 10 ** precision
+    points = np.stack((np.round(np.asarray(lat, dtype=np.float64) * factor),
+                       np.round(np.asarray(lon, dtype=np.float64) * factor)), axis=1).astype(np.int64)
+    deltas = np.diff(points, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+    starts = offsets[:-1][offsets[:-1] < offsets[1:]]
+    deltas[starts] = points[starts]
+
+    values = deltas.ravel()
+    zigzag = np.where(values < 0, ~(values << 1), values << 1)
+    shifts = 5 * np.arange(_MAX_CHUNKS)
+    groups = (zigzag[:, np.newaxis] >> shifts) & 31
+    chunk_counts = 1 + np.count_nonzero((zigzag[:, np.newaxis] >> shifts[1:]) > 0, axis=1)
+
+    used = np.arange(_MAX_CHUNKS) < chunk_counts[:, np.newaxis]
+    more = np.arange(_MAX_CHUNKS) < chunk_counts[:, np.newaxis] - 1
+    codes = (groups | np.where(more, 0x20, 0)) + 63
+    text = codes[used].astype(np.uint8).tobytes().decode("ascii")
+
+    point_chars = chunk_counts[0::2] + chunk_counts[1::2]
+    char_offsets = np.concatenate(([0], np.cumsum(point_chars)))[offsets].tolist()
+    return [text[char_offsets[i]:char_offsets[i + 1]] for i in range(count)]
+
+
+def encode_polyline(coordinates: Iterable[Iterable[float]], precision: int = POLYLINE_PRECISION) -> str:
+    points = np.asarray([tuple(point)[:2] for point in coordinates if len(point) >= 2],
+                        dtype=np.float64).reshape(-1, 2)
+    return encode_polylines(points[:, 0], points[:, 1], np.array([0, len(points)]), precision)[0]
+
+
+def decode_polylines(encoded: List[str], precision: int = POLYLINE_PRECISION) -> Tuple[np.ndarray, np.ndarray,
+                                                                                           np.ndarray]:
+    # Зворотне перетворення для набору рядків: (lat, lon, offsets)
+    text = "".join(encoded).encode("ascii")
+    if not text:
+        return np.zeros(0), np.zeros(0), _empty_offsets(len(encoded))
+
+    codes = np.frombuffer(text, dtype=np.uint8).astype(np.int64) - 63
+    ends = (codes & 0x20) == 0
+    value_ids = np.concatenate(([0], np.cumsum(ends)[:-1]))
+    value_starts = np.flatnonzero(np.concatenate(([True], ends[:-1])))
+    shifts = 5 * (np.arange(len(codes)) - value_starts[value_ids])
+    zigzag = np.zeros(int(ends.sum()), dtype=np.int64)
+    np.add.at(zigzag, value_ids, (codes & 31) << shifts)
+    deltas = np.where(zigzag & 1, ~(zigzag >> 1), zigzag >> 1).reshape(-1, 2)
+
+    # Кількість точок у кожному рядку - половина завершених значень
+    char_offsets = np.concatenate(([0], np.cumsum([len(item) for item in encoded])))
+    ends_before = np.concatenate(([0], np.cumsum(ends)))[char_offsets]
+    offsets = (ends_before // 2).astype(np.int64)
+
+    totals = np.cumsum(deltas, axis=0)
+    owners = np.repeat(np.arange(len(encoded)), np.diff(offsets))
+    base = np.vstack((np.zeros((1, 2), dtype=np.int64), totals))[offsets[:-1]]
+    points = (totals - base[owners]) / 10 ** precision
+    return points[:, 0], points[:, 1], offsets
+
+
+def decode_polyline(encoded: str, precision: int = POLYLINE_PRECISION) -> List[List[float]]:
+    lat, lon, _ = decode_polylines([encoded], precision)
+    return np.stack((lat, lon), axis=1).tolist()
+
+
+class GeometryBuffer:
+    # Геометрія набору об'єктів у спільних масивах float32: точки об'єкта i -
+    # lat/lon[offsets[i]:offsets[i + 1]]. Списки [lat, lng] створюються лише
+    # на вимогу для окремого об'єкта
+    def __init__(self, lat: np.ndarray, lon: np.ndarray, offsets: np.ndarray):
+        self.lat = np.asarray(lat, dtype=np.float32)
+        self.lon = np.asarray(lon, dtype=np.float32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    @classmethod
+    def from_ways(cls, osm_index: OSMIndex, elements: List[dict],
+                  multipolygons: Optional[Dict[int, Multipolygon]] = None) -> 'GeometryBuffer':
+        # Лінії беруть координати вузлів, мультиполігони - найбільше зовнішнє
+        # кільце; у вузлів і незібраних відношень геометрії немає
+        ways = [element if element.get("type", "way") == "way" else {"nodes": []} for element in elements]
+        lat, lon, offsets = osm_index.gather_way_coordinates(ways)
+
+        relations = [position for position, element in enumerate(elements) if element.get("type") == "relation"]
+        if not relations:
+            return cls(lat, lon, offsets)
+
+        multipolygons = osm_index.multipolygons() if multipolygons is None else multipolygons
+        lat_parts = np.split(lat, offsets[1:-1])
+        lon_parts = np.split(lon, offsets[1:-1])
+        for position in relations:
+            multipolygon = multipolygons.get(elements[position]["id"])
+            outline = multipolygon.outline() if multipolygon is not None else None
+            if outline is not None:
+                lat_parts[position], lon_parts[position] = outline
+        counts = [len(part) for part in lat_parts]
+        return cls(np.concatenate(lat_parts) if lat_parts else lat, np.concatenate(lon_parts) if lon_parts else lon,
+                   np.concatenate(([0], np.cumsum(counts))).astype(np.int64))
+
+    @classmethod
+    def from_features(cls, features: List[dict]) -> 'GeometryBuffer':
+        # Зворотний шлях для споживачів результату: з polyline (або coordinates) ознак
+        encoded = []
+        for feature in features:
+            if feature.get("polyline") is None and feature.get("coordinates"):
+                encoded.append(encode_polyline(feature["coordinates"]))
+            else:
+                encoded.append(feature.get("polyline") or "")
+        return cls(*decode_polylines(encoded))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.lat.nbytes + self.lon.nbytes + self.offsets.nbytes)
+
+    def point_counts(self) -> np.ndarray:
+        return np.diff(self.offsets)
+
+    def coordinates(self, position: int) -> List[List[float]]:
+        start, end = self.offsets[position], self.offsets[position + 1]
+        return np.stack((self.lat[start:end], self.lon[start:end]), axis=1).astype(np.float64).tolist()
+
+    def polylines(self, precision: int = POLYLINE_PRECISION) -> List[str]:
+        return encode_polylines(self.lat, self.lon, self.offsets, precision)
+
+    def bounds(self) -> np.ndarray:
+        # (min_lat, max_lat, min_lon, max_lon) кожного об'єкта, NaN - без точок
+        result = np.full((len(self), 4), np.nan)
+        present = np.flatnonzero(self.point_counts() > 0)
+        if len(present):
+            starts = self.offsets[present]
+            result[present, 0] = np.minimum.reduceat(self.lat, starts)
+            result[present, 1] = np.maximum.reduceat(self.lat, starts)
+            result[present, 2] = np.minimum.reduceat(self.lon, starts)
+            result[present, 3] = np.maximum.reduceat(self.lon, starts)
+        return result
+
+
+def feature_coordinates(feature: dict) -> List[List[float]]:
+    # Координати об'єкта результату аналізу: явний список або розкодований polyline
+    coordinates = feature.get("coordinates")
+    if coordinates is not None:
+        return coordinates
+    polyline = feature.get("polyline")
+    return decode_polyline(polyline) if polyline else []
+
+
+def attach_polylines(entries: List[dict], geometry: Optional[GeometryBuffer]):
+    polylines = geometry.polylines() if geometry is not None else [""] * len(entries)
+    for entry, polyline in zip(entries, polylines):
+        entry["polyline"] = polyline
@@ -0,0 +1,53 @@
+from typing import Tuple
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def lambert_azimuthal_equal_area(lat: np.ndarray, lon: np.ndarray,
+                                 lat0: float, lon0: float) -> Tuple[np.ndarray, np.ndarray]:
+    phi = np.radians(lat)
+    dlam = np.radians(lon) - np.radians(lon0)
+    phi0 = np.radians(lat0)
+
+    cos_phi = np.cos(phi)
+    cos_dlam = np.cos(dlam)
+    denominator = 1 + np.sin(phi0) * np.sin(phi) + np.cos(phi0) * cos_phi * cos_dlam
+    k = np.sqrt(2 / np.maximum(denominator, 1e-12))
+
+    x = EARTH_RADIUS_KM * k * cos_phi * np.sin(dlam)
+    y = EARTH_RADIUS_KM * k * (np.cos(phi0) * np.sin(phi) - np.sin(phi0) * cos_phi * cos_dlam)
+    return x, y
+
+
+def ring_ids(offsets: np.ndarray) -> np.ndarray:
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+
+def polygon_areas(x: np.ndarray, y: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    # Формула шнурівки для всіх кілець одразу: кожна точка з'єднується з
+    # наступною, а остання точка кільця - з першою
+    count = len(offsets) - 1
+    if len(x) == 0:
+        return np.zeros(count)
+
+    next_index = np.arange(1, len(x) + 1)
+    sizes = np.diff(offsets)
+    non_empty = sizes > 0
+    next_index[offsets[1:][non_empty] - 1] = offsets[:-1][non_empty]
+
+    cross = x * y[next_index] - x[next_index] * y
+    return np.abs(np.bincount(ring_ids(offsets), weights=cross, minlength=count)) / 2.0
+
+
+def polygon_areas_km2(lat: np.ndarray, lon: np.ndarray, offsets: np.ndarray,
+                      min_points: int = 3) -> np.ndarray:
+    offsets = np.asarray(offsets, dtype=np.int64)
+    areas = np.full(len(offsets) - 1, np.nan)
+    if len(lat) == 0:
+        return areas
+
+    x, y = lambert_azimuthal_equal_area(lat, lon, float(np.mean(lat)), float(np.mean(lon)))
+    valid = np.diff(offsets) >= min_points
+    areas[valid] = polygon_areas(x, y, offsets)[valid]
+    return areas
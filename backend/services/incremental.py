@@ -0,0 +1,384 @@
+from collections import OrderedDict, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import logging
+import math
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from .feature_geometry import GeometryBuffer
+from .multipolygon import is_multipolygon
+from .osm_data import fetch_warnings
+from .osm_index import OSMIndex
+from .profiling import StageTimer
+
+logger = logging.getLogger(__name__)
+
+# (north, west, south, east)
+BBox = Tuple[float, float, float, float]
+
+
+def bbox_overlaps(first: BBox, second: BBox) -> bool:
+    return first[2] < second[0] and second[2] < first[0] and first[1] < second[3] and second[1] < first[3]
+
+
+def subtract_bbox(box: BBox, hole: BBox) -> List[BBox]:
+    # Частина box поза hole: до чотирьох смуг (північна і південна на всю
+    # ширину, західна і східна - між ними)
+    if not bbox_overlaps(box, hole):
+        return [box]
+    north, west, south, east = box
+    hole_north, hole_west, hole_south, hole_east = hole
+    pieces = []
+    if hole_north < north:
+        pieces.append((north, west, hole_north, east))
+    if hole_south > south:
+        pieces.append((hole_south, west, south, east))
+    inner_north, inner_south = min(north, hole_north), max(south, hole_south)
+    if hole_west > west:
+        pieces.append((inner_north, west, inner_south, hole_west))
+    if hole_east < east:
+        pieces.append((inner_north, hole_east, inner_south, east))
+    return pieces
+
+
+def bbox_difference(box: BBox, holes: Iterable[BBox]) -> List[BBox]:
+    pieces = [box]
+    for hole in holes:
+        pieces = [piece for part in pieces for piece in subtract_bbox(part, hole)]
+    return pieces
+
+
+def _bbox_area(box: BBox) -> float:
+    return (box[0] - box[2]) * (box[3] - box[1])
+
+
+class IncrementalAnalysisSession:
+    # Сесія інтерактивного вибору області: елементи всіх уже завантажених
+    # ділянок лишаються в індексі, для нового bbox довантажуються лише смуги,
+    # яких ще немає, а агрегати (дороги за категоріями, зелені зони, водойми,
+    # зупинки) оновлюються додаванням і вилученням внесків тих елементів,
+    # чия належність до області змінилась. Належність - як у запиту Overpass
+    # (clip_elements), тож результат збігається з повним analyze_osm_data
+    def __init__(self, analyzer, bucket_degrees: float = 0.002, max_fetched_ratio: float = 4.0):
+        self.analyzer = analyzer
+        self.bucket_degrees = bucket_degrees
+        self.max_fetched_ratio = max_fetched_ratio
+        self.id = uuid.uuid4().hex
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.bbox: Optional[BBox] = None
+        self.covered: List[BBox] = []
+        self.fetched_area = 0.0
+        self.index = OSMIndex()
+
+        self._way_lat: Dict[int, np.ndarray] = {}
+        self._way_lon: Dict[int, np.ndarray] = {}
+        self._way_buckets: Dict[Tuple[int, int], Set[int]] = defaultdict(set)
+        self._road_entries: Dict[int, dict] = {}
+        self._polylines: Dict[int, str] = {}
+        self._relation_ways: Dict[int, Set[int]] = {}
+        self._way_relations: Dict[int, Set[int]] = defaultdict(set)
+
+        self._stop_coords: Dict[int, Tuple[float, float]] = {}
+        self._stop_buckets: Dict[Tuple[int, int], Set[int]] = defaultdict(set)
+        self._stop_ways: Dict[int, Set[int]] = defaultdict(set)
+        self._way_stops: Dict[int, Set[int]] = defaultdict(set)
+        self._stop_relations: Dict[int, Set[int]] = defaultdict(set)
+        self._relation_stops: Dict[int, Set[int]] = defaultdict(set)
+
+        self.active_ways: Set[int] = set()
+        self.active_relations: Set[int] = set()
+        self.active_stops: Set[int] = set()
+
+        self.roads: Dict[int, dict] = {}
+        self.road_types: Dict[str, int] = defaultdict(int)
+        self.green_spaces: Dict[Tuple[str, int], dict] = {}
+        self.water_features: Dict[Tuple[str, int], dict] = {}
+
+    def update(self, nw_lat: float, nw_lng: float, se_lat: float, se_lng: float,
+               timer: Optional[StageTimer] = None) -> dict:
+        timer = timer or StageTimer()
+        bbox = (max(nw_lat, se_lat), min(nw_lng, se_lng), min(nw_lat, se_lat), max(nw_lng, se_lng))
+
+        strips = bbox_difference(bbox, self.covered)
+        fetched_area = self.fetched_area + sum(_bbox_area(strip) for strip in strips)
+        # Далекий стрибок або надто велика накопичена площа - починаємо з нуля
+        if (self.bbox is None or not bbox_overlaps(bbox, self.bbox)
+                or fetched_area > self.max_fetched_ratio * _bbox_area(bbox)):
+            self.reset()
+            strips = [bbox]
+            fetched_area = _bbox_area(bbox)
+
+        # Завантаженою вважається лише смуга без помилок; смуга з неповними
+        # даними лишається непокритою і буде запитана знову наступного разу
+        elements = []
+        warnings = []
+        failed_strips = []
+        for strip in strips:
+            osm_data = timer.run("fetch", self.analyzer.osm_fetcher.get_area_data, *strip)
+            elements.extend(osm_data.get("elements", []))
+            strip_warnings = fetch_warnings(osm_data)
+            if strip_warnings:
+                warnings.extend(strip_warnings)
+                failed_strips.append(strip)
+        if failed_strips:
+            self.covered.extend(strip for strip in strips if strip not in failed_strips)
+        else:
+            self.covered.append(bbox)
+        self.fetched_area = fetched_area
+
+        new_ways, new_relations, new_stops = timer.run("merge", self._merge, elements)
+        changed = timer.run("update_membership", self._update_membership,
+                            self.bbox, bbox, new_ways, new_relations, new_stops)
+        self.bbox = bbox
+        timer.count("fetched_strips", len(strips))
+        timer.count("fetched_elements", len(elements))
+        timer.count("changed_elements", changed)
+
+        area_size = self.analyzer._calculate_area_size(*bbox)
+        road_types = {category: count for category, count in self.road_types.items() if count}
+        result = self.analyzer._compose_result(bbox, area_size, list(self.roads.values()), len(self.roads),
+                                               road_types, list(self.green_spaces.values()),
+                                               list(self.water_features.values()), len(self.active_stops),
+                                               warnings)
+        timer.log(f"session {self.id[:8]} {list(bbox)}")
+        return result
+
+    def _bucket(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self.bucket_degrees), math.floor(lon / self.bucket_degrees)
+
+    def _merge(self, elements: List[dict]) -> Tuple[List[int], List[int], List[int]]:
+        # Вузли першими: до появи лінії її зупинки вже мають бути відомі
+        new_stops = []
+        for element in elements:
+            if element["type"] != "node":
+                continue
+            tags = element.get("tags")
+            if tags and element["id"] in self.index.tagged_nodes:
+                continue
+            self.index.add(element)
+            if tags and "lat" in element and "lon" in element and self.analyzer._is_transport_stop(tags):
+                self._stop_coords[element["id"]] = (element["lat"], element["lon"])
+                self._stop_buckets[self._bucket(element["lat"], element["lon"])].add(element["id"])
+                new_stops.append(element["id"])
+
+        ways = []
+        relations = []
+        for element in elements:
+            if element["type"] == "way" and element["id"] not in self.index.ways:
+                self.index.add(element)
+                ways.append(element)
+            elif element["type"] == "relation" and element["id"] not in self.index.relations:
+                self.index.add(element)
+                relations.append(element)
+
+        lat, lon, offsets = self.index.gather_way_coordinates(ways)
+        for position, way in enumerate(ways):
+            way_id = way["id"]
+            self._way_lat[way_id] = way_lat = lat[offsets[position]:offsets[position + 1]]
+            self._way_lon[way_id] = way_lon = lon[offsets[position]:offsets[position + 1]]
+            buckets = zip(np.floor(way_lat / self.bucket_degrees).astype(np.int64).tolist(),
+                          np.floor(way_lon / self.bucket_degrees).astype(np.int64).tolist())
+            for bucket in set(buckets):
+                self._way_buckets[bucket].add(way_id)
+            for node_id in way.get("nodes", []):
+                if node_id in self._stop_coords:
+                    self._stop_ways[node_id].add(way_id)
+                    self._way_stops[way_id].add(node_id)
+
+        # Геометрія потрібна лише лініям, що потрапляють у списки результату
+        described = [way for way in ways if way.get("tags") and (
+            way["tags"].get("highway") or self.analyzer._is_counted_green_space(way["tags"])
+            or self.analyzer._is_counted_water_feature(way["tags"]))]
+        for way, polyline in zip(described, GeometryBuffer.from_ways(self.index, described).polylines()):
+            self._polylines[way["id"]] = polyline
+
+        roads = [way for way in ways if (way.get("tags") or {}).get("highway")]
+        if roads:
+            road_lengths = self.analyzer._calculate_road_lengths(roads, self.index)
+            for position, road in enumerate(roads):
+                self._road_entries[road["id"]] = self.analyzer._road_entry(road, road_lengths[position],
+                                                                           self._polylines[road["id"]])
+
+        for relation in relations:
+            relation_id = relation["id"]
+            self._relation_ways[relation_id] = set()
+            for member in relation.get("members", []):
+                if member.get("type") == "way":
+                    self._relation_ways[relation_id].add(member.get("ref"))
+                    self._way_relations[member.get("ref")].add(relation_id)
+                elif member.get("type") == "node" and member.get("ref") in self._stop_coords:
+                    self._relation_stops[relation_id].add(member.get("ref"))
+                    self._stop_relations[member.get("ref")].add(relation_id)
+
+        return [way["id"] for way in ways], [relation["id"] for relation in relations], new_stops
+
+    def _query(self, buckets: Dict[Tuple[int, int], Set[int]], boxes: List[BBox]) -> Set[int]:
+        found = set()
+        for north, west, south, east in boxes:
+            south_bucket, west_bucket = self._bucket(south, west)
+            north_bucket, east_bucket = self._bucket(north, east)
+            for row in range(south_bucket, north_bucket + 1):
+                for column in range(west_bucket, east_bucket + 1):
+                    found.update(buckets.get((row, column), ()))
+        return found
+
+    def _update_membership(self, previous: Optional[BBox], bbox: BBox, new_ways: List[int],
+                           new_relations: List[int], new_stops: List[int]) -> int:
+        # Належність могла змінитись лише в елементів з точками в симетричній
+        # різниці старого і нового bbox, а також у щойно завантажених
+        if previous is None:
+            changed_area = []
+        else:
+            changed_area = bbox_difference(previous, [bbox]) + bbox_difference(bbox, [previous])
+        north, west, south, east = bbox
+
+        toggled_ways = []
+        way_candidates = list(self._query(self._way_buckets, changed_area).union(new_ways))
+        lengths = np.fromiter((len(self._way_lat[way_id]) for way_id in way_candidates),
+                              dtype=np.int64, count=len(way_candidates))
+        lat = np.concatenate([self._way_lat[way_id] for way_id in way_candidates] or [np.zeros(0)])
+        lon = np.concatenate([self._way_lon[way_id] for way_id in way_candidates] or [np.zeros(0)])
+        points_inside = (lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)
+        ways_inside = np.bincount(np.repeat(np.arange(len(way_candidates)), lengths),
+                                  weights=points_inside, minlength=len(way_candidates)) > 0
+        for way_id, inside in zip(way_candidates, ways_inside.tolist()):
+            if inside != (way_id in self.active_ways):
+                self._toggle_way(way_id, inside)
+                toggled_ways.append(way_id)
+
+        relation_candidates = set(new_relations)
+        for way_id in toggled_ways:
+            relation_candidates.update(self._way_relations.get(way_id, ()))
+        toggled_relations = []
+        for relation_id in relation_candidates:
+            if relation_id not in self.index.relations:
+                continue
+            inside = any(way_id in self.active_ways for way_id in self._relation_ways[relation_id])
+            if inside != (relation_id in self.active_relations):
+                self._toggle_relation(relation_id, inside)
+                toggled_relations.append(relation_id)
+
+        stop_candidates = self._query(self._stop_buckets, changed_area).union(new_stops)
+        for way_id in toggled_ways:
+            stop_candidates.update(self._way_stops.get(way_id, ()))
+        for relation_id in toggled_relations:
+            stop_candidates.update(self._relation_stops.get(relation_id, ()))
+        toggled_stops = 0
+        for stop_id in stop_candidates:
+            lat, lon = self._stop_coords[stop_id]
+            inside = (south <= lat <= north and west <= lon <= east
+                      or any(way_id in self.active_ways for way_id in self._stop_ways.get(stop_id, ()))
+                      or any(relation_id in self.active_relations
+                             for relation_id in self._stop_relations.get(stop_id, ())))
+            if inside != (stop_id in self.active_stops):
+                if inside:
+                    self.active_stops.add(stop_id)
+                else:
+                    self.active_stops.discard(stop_id)
+                toggled_stops += 1
+
+        return len(toggled_ways) + len(toggled_relations) + toggled_stops
+
+    def _toggle_way(self, way_id: int, inside: bool):
+        if inside:
+            self.active_ways.add(way_id)
+        else:
+            self.active_ways.discard(way_id)
+
+        road = self._road_entries.get(way_id)
+        if road is not None:
+            tags = self.index.ways[way_id]["tags"]
+            category = self.analyzer._road_category(tags["highway"], tags)
+            if inside:
+                self.roads[way_id] = road
+            else:
+                del self.roads[way_id]
+            if category is not None:
+                self.road_types[category] += 1 if inside else -1
+
+        self._toggle_area_feature("way", self.index.ways[way_id], inside)
+
+    def _toggle_relation(self, relation_id: int, inside: bool):
+        if inside:
+            self.active_relations.add(relation_id)
+        else:
+            self.active_relations.discard(relation_id)
+        self._toggle_area_feature("relation", self.index.relations[relation_id], inside)
+
+    def _toggle_area_feature(self, element_type: str, element: dict, inside: bool):
+        tags = element.get("tags")
+        if not tags:
+            return
+        key = (element_type, element["id"])
+        if element_type == "way":
+            polyline = self._polylines.get(element["id"], "")
+        elif inside and is_multipolygon(element):
+            # Мультиполігон збирається заново: до індексу сесії додаються нові лінії
+            polyline = GeometryBuffer.from_ways(self.index, [element],
+                                                self.index.assemble_multipolygons([element])).polylines()[0]
+        else:
+            polyline = ""
+        if self.analyzer._is_counted_green_space(tags):
+            if inside:
+                self.green_spaces[key] = self.analyzer._green_space_entry(element, polyline)
+            else:
+                self.green_spaces.pop(key, None)
+        if self.analyzer._is_counted_water_feature(tags):
+            if inside:
+                self.water_features[key] = self.analyzer._water_feature_entry(element, polyline)
+            else:
+                self.water_features.pop(key, None)
+
+
+class AnalysisSessionStore:
+    # Сесії живуть у пам'яті процесу: витіснення LRU + TTL, як у AnalysisResultStore
+    def __init__(self, max_sessions: int = 32, ttl: int = 15 * 60):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, analyzer) -> IncrementalAnalysisSession:
+        session = IncrementalAnalysisSession(analyzer)
+        with self._lock:
+            self._sessions[session.id] = (time.time(), session)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id: str) -> Optional[IncrementalAnalysisSession]:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+
+            touched_at, session = entry
+            if time.time() - touched_at > self.ttl:
+                del self._sessions[session_id]
+                return None
+
+            self._sessions[session_id] = (time.time(), session)
+            self._sessions.move_to_end(session_id)
+            return session
+
+
+_session_store = None
+_session_store_lock = threading.Lock()
+
+
+def get_session_store() -> AnalysisSessionStore:
+    global _session_store
+    with _session_store_lock:
+        if _session_store is None:
+            from django.conf import settings
+            _session_store = AnalysisSessionStore(
+                max_sessions=getattr(settings, 'ANALYSIS_SESSION_MAX', 32),
+                ttl=getattr(settings, 'ANALYSIS_SESSION_TTL', 15 * 60)
+            )
+        return _session_store
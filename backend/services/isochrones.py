@@ -0,0 +1,89 @@
+from typing import Optional, Sequence
+import logging
+
+import numpy as np
+
+from .road_graph import RoadGraph
+
+logger = logging.getLogger(__name__)
+
+WALK_SPEED_KMH = 4.8
+
+
+def multi_source_distances(graph: RoadGraph, sources: np.ndarray, initial: Optional[np.ndarray] = None,
+                           limit: float = np.inf) -> np.ndarray:
+    # Відстань від найближчого з джерел до кожної вершини. Замість черги з
+    # пріоритетами - хвильова релаксація: на кожному кроці всі ребра з вершин,
+    # відстань до яких щойно зменшилась, обробляються одним векторним проходом
+    distance = np.full(graph.vertex_count, np.inf)
+    sources = np.asarray(sources, dtype=np.int64)
+    initial = np.zeros(len(sources)) if initial is None else np.asarray(initial, dtype=np.float64)
+    reachable = initial <= limit
+    np.minimum.at(distance, sources[reachable], initial[reachable])
+
+    frontier = np.unique(sources[reachable])
+    while len(frontier):
+        starts = graph.indptr[frontier]
+        counts = graph.indptr[frontier + 1] - starts
+        total = int(counts.sum())
+        if total == 0:
+            break
+
+        edges = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(total)
+        heads = graph.targets[edges]
+        candidate = distance[np.repeat(frontier, counts)] + graph.lengths[edges]
+
+        improved = (candidate < distance[heads]) & (candidate <= limit)
+        heads = heads[improved]
+        np.minimum.at(distance, heads, candidate[improved])
+        frontier = np.unique(heads)
+
+    return distance
+
+
+class TransportCoverage:
+    # Пішохідна доступність зупинок: будинок і зупинка прив'язуються до
+    # найближчих точок пішохідного графа, далі - відстань мережею від усіх
+    # зупинок одразу (мультиджерельний пошук)
+    def __init__(self, thresholds: Sequence[int] = (300, 500), max_walk_m: float = 2000.0,
+                 max_snap_m: float = 250.0, walk_speed_kmh: float = WALK_SPEED_KMH):
+        self.thresholds = tuple(thresholds)
+        self.max_walk_m = max_walk_m
+        self.max_snap_m = max_snap_m
+        self.walk_speed_kmh = walk_speed_kmh
+
+    def access_distances(self, graph: RoadGraph, stop_lat: np.ndarray, stop_lon: np.ndarray,
+                         building_lat: np.ndarray, building_lon: np.ndarray) -> np.ndarray:
+        access = np.full(len(building_lat), np.inf)
+        if graph.vertex_count == 0 or len(stop_lat) == 0 or len(building_lat) == 0:
+            return access
+
+        stop_vertices, stop_snap = graph.nearest_vertices(stop_lat, stop_lon)
+        near_graph = stop_snap <= self.max_snap_m
+        if not near_graph.any():
+            return access
+
+        distance = multi_source_distances(graph, stop_vertices[near_graph], stop_snap[near_graph],
+                                          limit=self.max_walk_m)
+
+        known = ~(np.isnan(building_lat) | np.isnan(building_lon))
+        building_vertices, building_snap = graph.nearest_vertices(building_lat[known], building_lon[known])
+        walk = np.where(building_snap <= self.max_snap_m, building_snap + distance[building_vertices], np.inf)
+        access[known] = np.where(walk <= self.max_walk_m, walk, np.inf)
+        return access
+
+    def summarize(self, access: np.ndarray) -> dict:
+        count = len(access)
+        summary = {"buildings": count}
+        for threshold in self.thresholds:
+            covered = int(np.count_nonzero(access <= threshold))
+            summary[f"within_{threshold}m"] = round(covered / count, 3) if count else 0.0
+
+        reachable = access[np.isfinite(access)]
+        summary["median_walk_m"] = round(float(np.median(reachable))) if len(reachable) else None
+        return summary
+
+    def walk_minutes(self, distance_m: float) -> Optional[float]:
+        if not np.isfinite(distance_m):
+            return None
+        return round(distance_m / (self.walk_speed_kmh * 1000.0 / 60.0), 1)
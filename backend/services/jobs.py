@@ -0,0 +1,139 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Tuple
+import logging
+import threading
+import time
+import uuid
+
+from .analysis import AreaAnalyzer
+from .result_store import AnalysisResultStore, get_result_store
+
+logger = logging.getLogger(__name__)
+
+BBoxKey = Tuple[float, float, float, float]
+
+
+def normalize_bbox(nw_lat: float, nw_lng: float, se_lat: float, se_lng: float,
+                   precision: int = 5) -> BBoxKey:
+    return (
+        round(max(nw_lat, se_lat), precision),
+        round(min(nw_lng, se_lng), precision),
+        round(min(nw_lat, se_lat), precision),
+        round(max(nw_lng, se_lng), precision)
+    )
+
+
+class AnalysisJob:
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, bbox: BBoxKey):
+        self.id = uuid.uuid4().hex
+        self.bbox = bbox
+        self.status = self.PENDING
+        self.result = None
+        self.result_token = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (self.DONE, self.FAILED)
+
+    def to_dict(self) -> dict:
+        data = {
+            'job_id': self.id,
+            'job_status': self.status,
+            'bounds': [[self.bbox[0], self.bbox[1]], [self.bbox[2], self.bbox[3]]]
+        }
+        if self.status == self.DONE:
+            data['results'] = self.result
+            data['result_token'] = self.result_token
+        elif self.status == self.FAILED:
+            data['message'] = self.error
+        return data
+
+
+class AnalysisJobManager:
+    def __init__(self, max_workers: int = 4, retention: int = 600, max_jobs: int = 1000,
+                 analyzer_factory: Optional[Callable[[], AreaAnalyzer]] = None,
+                 result_store: Optional[AnalysisResultStore] = None):
+        self.retention = retention
+        self.max_jobs = max_jobs
+        self.analyzer_factory = analyzer_factory
+        self.result_store = result_store
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis-job')
+        self._jobs = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def submit(self, nw_lat: float, nw_lng: float, se_lat: float, se_lng: float) -> AnalysisJob:
+        bbox = normalize_bbox(nw_lat, nw_lng, se_lat, se_lng)
+
+        with self._lock:
+            self._prune()
+
+            job_id = self._in_flight.get(bbox)
+            if job_id is not None:
+                return self._jobs[job_id]
+
+            job = AnalysisJob(bbox)
+            self._jobs[job.id] = job
+            self._in_flight[bbox] = job.id
+
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[AnalysisJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: AnalysisJob):
+        job.status = AnalysisJob.RUNNING
+        north, west, south, east = job.bbox
+
+        try:
+            analyzer = (self.analyzer_factory or AreaAnalyzer)()
+            job.result = analyzer.perform_analysis(north, west, south, east)
+            job.result_token = (self.result_store or get_result_store()).put(
+                job.bbox, getattr(analyzer, 'VERSION', ''), job.result
+            )
+            job.status = AnalysisJob.DONE
+        except Exception as e:
+            logger.error(f"Analysis job {job.id} failed: {e}")
+            job.error = f'Analysis failed: {str(e)}'
+            job.status = AnalysisJob.FAILED
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                if self._in_flight.get(job.bbox) == job.id:
+                    del self._in_flight[job.bbox]
+
+    def _prune(self):
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            too_many = len(self._jobs) > self.max_jobs
+            expired = job.finished and now - job.finished_at > self.retention
+            if not (expired or (too_many and job.finished)):
+                continue
+            del self._jobs[job_id]
+
+
+_job_manager = None
+_job_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> AnalysisJobManager:
+    global _job_manager
+    with _job_manager_lock:
+        if _job_manager is None:
+            from django.conf import settings
+            _job_manager = AnalysisJobManager(
+                max_workers=getattr(settings, 'ANALYSIS_JOB_WORKERS', 4),
+                retention=getattr(settings, 'ANALYSIS_JOB_RETENTION', 600)
+            )
+        return _job_manager
@@ -0,0 +1,129 @@
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Кільце або лінія: масиви широт і довгот
+Ring = Tuple[np.ndarray, np.ndarray]
+
+# Кінці ліній порівнюються з точністю ~1 см: спільний вузол має однакові координати
+ENDPOINT_PRECISION = 1e7
+
+INNER_ROLE = "inner"
+
+
+def is_multipolygon(element: dict) -> bool:
+    return element.get("type") == "relation" and (element.get("tags") or {}).get("type") == "multipolygon"
+
+
+def _endpoint_keys(lat: float, lon: float) -> Tuple[int, int]:
+    return int(round(float(lat) * ENDPOINT_PRECISION)), int(round(float(lon) * ENDPOINT_PRECISION))
+
+
+def assemble_rings(lines: List[Ring]) -> Tuple[List[Ring], int]:
+    # Склеює лінії в замкнені кільця за спільними кінцями. Кінці лежать у
+    # словнику, і кожна лінія береться рівно один раз, тож час лінійний від
+    # кількості ліній. Повертає кільця і кількість ліній, що не замкнулися
+    rings = []
+    open_lines = []
+    for lat, lon in lines:
+        if len(lat) < 2:
+            continue
+        if _endpoint_keys(lat[0], lon[0]) == _endpoint_keys(lat[-1], lon[-1]):
+            rings.append((lat, lon))
+        else:
+            open_lines.append((lat, lon))
+
+    starts = [_endpoint_keys(lat[0], lon[0]) for lat, lon in open_lines]
+    ends = [_endpoint_keys(lat[-1], lon[-1]) for lat, lon in open_lines]
+    by_endpoint = defaultdict(list)
+    for position in range(len(open_lines)):
+        by_endpoint[starts[position]].append(position)
+        by_endpoint[ends[position]].append(position)
+
+    used = [False] * len(open_lines)
+    unclosed = 0
+    for first in range(len(open_lines)):
+        if used[first]:
+            continue
+        used[first] = True
+        parts = [open_lines[first]]
+        ring_start, current = starts[first], ends[first]
+
+        while current != ring_start:
+            candidates = by_endpoint[current]
+            while candidates and used[candidates[-1]]:
+                candidates.pop()
+            if not candidates:
+                break
+            position = candidates.pop()
+            used[position] = True
+            lat, lon = open_lines[position]
+            # Наступна лінія може бути намальована в протилежному напрямку
+            if starts[position] == current:
+                parts.append((lat[1:], lon[1:]))
+                current = ends[position]
+            else:
+                parts.append((lat[-2::-1], lon[-2::-1]))
+                current = starts[position]
+
+        if current == ring_start:
+            rings.append((np.concatenate([lat for lat, _ in parts]), np.concatenate([lon for _, lon in parts])))
+        else:
+            unclosed += len(parts)
+
+    return rings, unclosed
+
+
+class Multipolygon:
+    # Зібрана геометрія відношення type=multipolygon: зовнішні і внутрішні
+    # кільця та площа (км²) = зовнішні мінус внутрішні
+    def __init__(self, outer: List[Ring], inner: List[Ring], unclosed: int = 0):
+        self.outer = outer
+        self.inner = inner
+        self.unclosed = unclosed
+        self.outer_areas = np.zeros(len(outer))
+        self.inner_areas = np.zeros(len(inner))
+
+    @classmethod
+    def from_members(cls, members: List[Tuple[str, Ring]]) -> 'Multipolygon':
+        # Порожня або невідома роль вважається зовнішньою
+        outer, outer_unclosed = assemble_rings([line for role, line in members if role != INNER_ROLE])
+        inner, inner_unclosed = assemble_rings([line for role, line in members if role == INNER_ROLE])
+        return cls(outer, inner, outer_unclosed + inner_unclosed)
+
+    @property
+    def rings(self) -> List[Ring]:
+        return self.outer + self.inner
+
+    @property
+    def area(self) -> Optional[float]:
+        if not self.outer:
+            return None
+        return max(0.0, float(self.outer_areas.sum() - self.inner_areas.sum()))
+
+    def outline(self) -> Optional[Ring]:
+        # Найбільше зовнішнє кільце - для показу на карті одним polyline
+        if not self.outer:
+            return None
+        return self.outer[int(np.argmax(self.outer_areas))]
+
+
+def member_lines(relation: dict, way_lines: Dict[int, Ring]) -> List[Tuple[str, Ring]]:
+    # Лінії-члени відношення: з індексу, а якщо лінії там немає - з
+    # геометрії самого члена (відповідь "out geom" на відношення)
+    members = []
+    for member in relation.get("members", []):
+        if member.get("type") != "way":
+            continue
+        line = way_lines.get(member.get("ref"))
+        if line is None and member.get("geometry"):
+            points = [point for point in member["geometry"] if point]
+            line = (np.array([point["lat"] for point in points], dtype=np.float64),
+                    np.array([point["lon"] for point in points], dtype=np.float64))
+        if line is not None:
+            members.append((member.get("role") or "", line))
+    return members
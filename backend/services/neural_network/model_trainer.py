@@ -7,6 +7,8 @@ import math
 from typing import List, Dict, Tuple
 import logging
 
+from ..feature_geometry import GeometryBuffer, feature_coordinates
+
 logger = logging.getLogger(__name__)
 
 
@@ -192,39 +194,24 @@ class RoadNetworkTrainer:
         if len(roads_data) < 2:
             return 0.0
 
-        intersection_count = 0
-        road_segments = []
-
-        for road in roads_data:
-            coords = road.get('coordinates', [])
-            if len(coords) > 1:
-                road_segments.append(coords)
+        # Рамки всіх доріг зі спільного буфера геометрії; пари порівнюються
+        # блоками рядків, без матриці n x n в пам'яті
+        geometry = GeometryBuffer.from_features(roads_data)
+        bounds = geometry.bounds()[geometry.point_counts() > 1]
+        positions = np.arange(len(bounds))
 
-        for i in range(len(road_segments)):
-            for j in range(i + 1, len(road_segments)):
-                if self._roads_potentially_intersect(road_segments[i], road_segments[j]):
-                    intersection_count += 1
+        intersection_count = 0
+        for start in range(0, len(bounds), 512):
+            block = bounds[start:start + 512]
+            overlap = ((block[:, np.newaxis, 0] <= bounds[np.newaxis, :, 1]) &
+                       (block[:, np.newaxis, 1] >= bounds[np.newaxis, :, 0]) &
+                       (block[:, np.newaxis, 2] <= bounds[np.newaxis, :, 3]) &
+                       (block[:, np.newaxis, 3] >= bounds[np.newaxis, :, 2]))
+            overlap &= positions[np.newaxis, :] > positions[start:start + len(block), np.newaxis]
+            intersection_count += int(np.count_nonzero(overlap))
 
         return min(1.0, intersection_count / max(len(roads_data), 1))
 
-    def _roads_potentially_intersect(self, road1_coords: List, road2_coords: List) -> bool:
-        if len(road1_coords) < 2 or len(road2_coords) < 2:
-            return False
-
-        r1_lats = [coord[0] for coord in road1_coords if len(coord) >= 2]
-        r1_lngs = [coord[1] for coord in road1_coords if len(coord) >= 2]
-        r2_lats = [coord[0] for coord in road2_coords if len(coord) >= 2]
-        r2_lngs = [coord[1] for coord in road2_coords if len(coord) >= 2]
-
-        if not (r1_lats and r1_lngs and r2_lats and r2_lngs):
-            return False
-
-        r1_bbox = (min(r1_lats), max(r1_lats), min(r1_lngs), max(r1_lngs))
-        r2_bbox = (min(r2_lats), max(r2_lats), min(r2_lngs), max(r2_lngs))
-
-        return (r1_bbox[0] <= r2_bbox[1] and r1_bbox[1] >= r2_bbox[0] and
-                r1_bbox[2] <= r2_bbox[3] and r1_bbox[3] >= r2_bbox[2])
-
     def _calculate_green_fragmentation(self, green_data: List[Dict], bounds: List[List[float]]) -> float:
         if not green_data:
             return 1.0
@@ -233,7 +220,7 @@ class RoadNetworkTrainer:
         areas = []
 
         for green in green_data:
-            coords = green.get('coordinates', [])
+            coords = feature_coordinates(green)
             if len(coords) > 2:
                 area = self._calculate_polygon_area_simple(coords)
                 areas.append(area)
@@ -248,6 +235,11 @@ class RoadNetworkTrainer:
         return min(1.0, fragmentation)
 
     def _assess_transport_coverage(self, analysis: Dict, bounds: List[List[float]]) -> float:
+        # Пішохідне покриття з аналізу (частка будинків до 500 м від зупинки)
+        coverage = analysis.get('transport_coverage') or {}
+        if coverage.get('buildings'):
+            return float(coverage.get('within_500m', 0.0))
+
         transport_stops = analysis.get('public_transport_stops', [])
         if not transport_stops:
             return 0.1
@@ -4,6 +4,8 @@ import math
 import hashlib
 from typing import Dict, List, Any, Tuple
 
+from ..feature_geometry import feature_coordinates
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -52,8 +54,8 @@ class RoadNetworkGenerator:
 
         buildings_data = data.get('buildings_data', [])
         for building in buildings_data:
-            if 'coordinates' in building and len(building['coordinates']) > 2:
-                coords = building['coordinates']
+            coords = feature_coordinates(building)
+            if len(coords) > 2:
                 center = self._calculate_polygon_center(coords)
                 bounds = self._calculate_polygon_bounds(coords)
                 collision_map['buildings'].append({
@@ -65,8 +67,8 @@ class RoadNetworkGenerator:
 
         roads_data = data.get('roads_data', [])
         for road in roads_data:
-            if 'coordinates' in road and len(road['coordinates']) > 1:
-                coords = road['coordinates']
+            coords = feature_coordinates(road)
+            if len(coords) > 1:
                 collision_map['existing_roads'].append({
                     'coordinates': coords,
                     'path_zones': self._create_road_buffer_zones(coords)
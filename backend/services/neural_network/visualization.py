@@ -3,6 +3,8 @@ import matplotlib.patches as patches
 import numpy as np
 from typing import List, Dict
 
+from ..feature_geometry import feature_coordinates
+
 
 class RoadNetworkVisualizer:
     def __init__(self):
@@ -50,8 +52,8 @@ class RoadNetworkVisualizer:
 
         roads_data = analysis.get('roads_data', [])
         for road in roads_data:
-            if 'coordinates' in road and len(road['coordinates']) > 1:
-                coords = road['coordinates']
+            coords = feature_coordinates(road)
+            if len(coords) > 1:
                 lats = [coord[0] for coord in coords]
                 lngs = [coord[1] for coord in coords]
 
@@ -65,8 +67,8 @@ class RoadNetworkVisualizer:
 
         green_spaces = analysis.get('green_spaces_data', [])
         for space in green_spaces:
-            if 'coordinates' in space and len(space['coordinates']) > 2:
-                coords = space['coordinates']
+            coords = feature_coordinates(space)
+            if len(coords) > 2:
                 lats = [coord[0] for coord in coords]
                 lngs = [coord[1] for coord in coords]
 
@@ -79,8 +81,8 @@ class RoadNetworkVisualizer:
 
         buildings_data = analysis.get('buildings_data', [])
         for building in buildings_data[:20]:  # обмежуємо кількість для швидкості
-            if 'coordinates' in building and len(building['coordinates']) > 2:
-                coords = building['coordinates']
+            coords = feature_coordinates(building)
+            if len(coords) > 2:
                 lats = [coord[0] for coord in coords]
                 lngs = [coord[1] for coord in coords]
 
@@ -0,0 +1,329 @@
+import json
+import math
+import os
+import time
+import logging
+import zipfile
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TileKey = Tuple[int, int]
+
+# columnar - масиви ColumnarOSMData в одному .npz на тайл, json - список елементів
+TILE_FORMATS = {'json': '.json', 'columnar': '.npz'}
+
+
+def prune_tags(tags: dict, keys: Iterable[str]) -> dict:
+    return {key: value for key, value in tags.items() if key in keys}
+
+
+def way_geometry_nodes(way: dict) -> Iterator[Tuple[int, float, float]]:
+    # Лінія з відповіді "out geom" несе координати своїх вузлів у "geometry"
+    # (null - вузол без координат); окремих елементів-вузлів для неї немає
+    for node_id, point in zip(way.get("nodes", []), way.get("geometry") or []):
+        if point:
+            yield node_id, point["lat"], point["lon"]
+
+
+class OSMTileCache:
+    # TTL рахується від fetched_at всередині файлу, а mtime файлу оновлюється
+    # при кожному читанні і використовується для LRU-витіснення
+    def __init__(self, cache_dir: str, tile_size: float = 0.01, ttl: int = 24 * 60 * 60,
+                 max_tiles: int = 20000, namespace: str = 'default', tile_format: str = 'columnar'):
+        if tile_format not in TILE_FORMATS:
+            raise ValueError(f"Unknown OSM tile format: {tile_format}")
+        self.tile_size = tile_size
+        self.ttl = ttl
+        self.max_tiles = max_tiles
+        self.tile_format = tile_format
+        self.suffix = TILE_FORMATS[tile_format]
+        self.cache_dir = os.path.join(cache_dir, namespace, f"{tile_size:g}")
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @classmethod
+    def from_settings(cls, namespace: str = 'default') -> Optional['OSMTileCache']:
+        try:
+            from django.conf import settings
+            cache_dir = getattr(settings, 'OSM_TILE_CACHE_DIR', None)
+            if not cache_dir:
+                return None
+            return cls(
+                cache_dir,
+                tile_size=getattr(settings, 'OSM_TILE_SIZE', 0.01),
+                ttl=getattr(settings, 'OSM_TILE_CACHE_TTL', 24 * 60 * 60),
+                max_tiles=getattr(settings, 'OSM_TILE_CACHE_MAX_TILES', 20000),
+                namespace=namespace,
+                tile_format=getattr(settings, 'OSM_TILE_CACHE_FORMAT', 'columnar')
+            )
+        except Exception as e:
+            logger.warning(f"OSM tile cache disabled: {e}")
+            return None
+
+    def tiles_for_bbox(self, north: float, west: float, south: float, east: float) -> List[TileKey]:
+        x0 = math.floor(west / self.tile_size)
+        x1 = math.ceil(east / self.tile_size) - 1
+        y0 = math.floor(south / self.tile_size)
+        y1 = math.ceil(north / self.tile_size) - 1
+
+        return [(x, y) for y in range(y0, max(y0, y1) + 1) for x in range(x0, max(x0, x1) + 1)]
+
+    def tile_bounds(self, key: TileKey) -> Tuple[float, float, float, float]:
+        x, y = key
+        return (
+            round((y + 1) * self.tile_size, 7),
+            round(x * self.tile_size, 7),
+            round(y * self.tile_size, 7),
+            round((x + 1) * self.tile_size, 7)
+        )
+
+    def bbox_for_tiles(self, keys: Iterable[TileKey]) -> Tuple[float, float, float, float]:
+        keys = list(keys)
+        north, west, _, _ = self.tile_bounds((min(k[0] for k in keys), max(k[1] for k in keys)))
+        _, _, south, east = self.tile_bounds((max(k[0] for k in keys), min(k[1] for k in keys)))
+        return north, west, south, east
+
+    def group_tiles(self, keys: Iterable[TileKey]) -> List[List[TileKey]]:
+        # Відсутні тайли об'єднуються в прямокутники, щоб не довантажувати закешовані
+        # тайли між ними: спершу суцільні відрізки в рядку, потім однакові
+        # відрізки сусідніх рядків
+        rows = {}
+        for x, y in sorted(set(keys), key=lambda key: (key[1], key[0])):
+            runs = rows.setdefault(y, [])
+            if runs and runs[-1][1] == x - 1:
+                runs[-1][1] = x
+            else:
+                runs.append([x, x])
+
+        rectangles = []
+        open_rectangles = {}
+        for y in sorted(rows):
+            for x0, x1 in rows[y]:
+                rows_span = open_rectangles.get((x0, x1))
+                if rows_span is not None and rows_span[1] == y - 1:
+                    rows_span[1] = y
+                else:
+                    rows_span = open_rectangles[(x0, x1)] = [y, y]
+                    rectangles.append((x0, x1, rows_span))
+
+        return [
+            [(x, y) for y in range(rows_span[0], rows_span[1] + 1) for x in range(x0, x1 + 1)]
+            for x0, x1, rows_span in rectangles
+        ]
+
+    def _tile_path(self, key: TileKey) -> str:
+        return os.path.join(self.cache_dir, f"{key[1]}_{key[0]}{self.suffix}")
+
+    def _read(self, path: str) -> Tuple[float, Callable[[], List[dict]]]:
+        if self.tile_format == 'columnar':
+            from .osm_columnar import ColumnarOSMData
+            data, meta = ColumnarOSMData.load_npz(path)
+            return meta.get('fetched_at', 0), lambda: list(data.iter_elements())
+
+        with open(path, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+        return payload.get('fetched_at', 0), lambda: payload.get('elements', [])
+
+    def _write(self, file: BinaryIO, elements: List[dict]):
+        if self.tile_format == 'columnar':
+            from .osm_columnar import ColumnarOSMData
+            ColumnarOSMData.from_elements(elements).save_npz(file, fetched_at=time.time())
+        else:
+            payload = {'fetched_at': time.time(), 'elements': elements}
+            file.write(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+
+    def get(self, key: TileKey) -> Optional[List[dict]]:
+        path = self._tile_path(key)
+        try:
+            fetched_at, elements = self._read(path)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return None
+
+        if time.time() - fetched_at > self.ttl:
+            self._remove(path)
+            return None
+
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        return elements()
+
+    def get_many(self, keys: Iterable[TileKey]) -> Tuple[Dict[TileKey, List[dict]], List[TileKey]]:
+        cached = {}
+        missing = []
+        for key in keys:
+            elements = self.get(key)
+            if elements is None:
+                missing.append(key)
+            else:
+                cached[key] = elements
+        return cached, missing
+
+    def put(self, key: TileKey, elements: List[dict]):
+        path = self._tile_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                self._write(f, elements)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write OSM tile {key}: {e}")
+            self._remove(tmp_path)
+
+    def put_many(self, tiles: Dict[TileKey, List[dict]]):
+        for key, elements in tiles.items():
+            self.put(key, elements)
+        self.evict()
+
+    def evict(self):
+        try:
+            entries = [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith(self.suffix)]
+        except OSError:
+            return
+
+        overflow = len(entries) - self.max_tiles
+        if overflow <= 0:
+            return
+
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:overflow]:
+            self._remove(entry.path)
+        logger.info(f"Evicted {overflow} OSM tiles from cache")
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def split_into_tiles(self, elements: List[dict], keys: Iterable[TileKey]) -> Dict[TileKey, List[dict]]:
+        keys = set(keys)
+        tiles = {key: {} for key in keys}
+
+        nodes = {}
+        for element in elements:
+            if element["type"] == "node" and (element["id"] not in nodes or "tags" in element):
+                nodes[element["id"]] = element
+
+        def tile_of_point(lat: float, lon: float) -> Optional[TileKey]:
+            key = (math.floor(lon / self.tile_size), math.floor(lat / self.tile_size))
+            return key if key in keys else None
+
+        def tile_of(node: dict) -> Optional[TileKey]:
+            if "lat" not in node or "lon" not in node:
+                return None
+            return tile_of_point(node["lat"], node["lon"])
+
+        def add_way(tile: dict, way: dict):
+            tile[("way", way["id"])] = way
+            for node_id in way.get("nodes", []):
+                if node_id in nodes and ("node", node_id) not in tile:
+                    tile[("node", node_id)] = nodes[node_id]
+
+        ways = {}
+        way_tiles = {}
+        for element in elements:
+            if element["type"] != "way":
+                continue
+
+            ways[element["id"]] = element
+            if element.get("geometry"):
+                element_tiles = {tile_of_point(lat, lon) for _, lat, lon in way_geometry_nodes(element)}
+            else:
+                element_tiles = {tile_of(nodes[node_id]) for node_id in element.get("nodes", []) if node_id in nodes}
+            element_tiles.discard(None)
+            way_tiles[element["id"]] = element_tiles
+
+            for key in element_tiles:
+                add_way(tiles[key], element)
+
+        for node in nodes.values():
+            if "tags" in node:
+                key = tile_of(node)
+                if key is not None:
+                    tiles[key][("node", node["id"])] = node
+
+        for element in elements:
+            if element["type"] != "relation":
+                continue
+
+            element_tiles = set()
+            for member in element.get("members", []):
+                if member.get("type") == "way":
+                    element_tiles |= way_tiles.get(member.get("ref"), set())
+                elif member.get("type") == "node" and member.get("ref") in nodes:
+                    element_tiles.add(tile_of(nodes[member["ref"]]))
+            element_tiles.discard(None)
+
+            # Відношення приходить з усіма своїми лініями, як і у відповіді
+            # Overpass, інакше мультиполігон у тайлі не збереться в кільця
+            for key in element_tiles or keys:
+                tiles[key][("relation", element["id"])] = element
+                for member in element.get("members", []):
+                    if member.get("type") == "way" and member.get("ref") in ways:
+                        add_way(tiles[key], ways[member["ref"]])
+
+        return {key: list(tile.values()) for key, tile in tiles.items()}
+
+
+def merge_tiles(tiles: Iterable[List[dict]]) -> List[dict]:
+    merged = {}
+    for elements in tiles:
+        for element in elements:
+            key = (element["type"], element["id"])
+            if key not in merged or "tags" in element:
+                merged[key] = element
+    return list(merged.values())
+
+
+def clip_elements(elements: List[dict], north: float, west: float, south: float, east: float) -> List[dict]:
+    def inside(node: dict) -> bool:
+        return ("lat" in node and "lon" in node and
+                south <= node["lat"] <= north and west <= node["lon"] <= east)
+
+    nodes = {element["id"]: element for element in elements if element["type"] == "node"}
+
+    ways = []
+    way_ids = set()
+    used_nodes = set()
+    for element in elements:
+        if element["type"] != "way":
+            continue
+        way_nodes = element.get("nodes", [])
+        if element.get("geometry"):
+            crosses = any(south <= lat <= north and west <= lon <= east
+                          for _, lat, lon in way_geometry_nodes(element))
+        else:
+            crosses = any(node_id in nodes and inside(nodes[node_id]) for node_id in way_nodes)
+        if crosses:
+            ways.append(element)
+            way_ids.add(element["id"])
+            used_nodes.update(way_nodes)
+
+    relations = [
+        element for element in elements
+        if element["type"] == "relation" and any(
+            member.get("ref") in way_ids for member in element.get("members", [])
+            if member.get("type") == "way"
+        )
+    ]
+    # Лінії-члени відношення беруться всі, навіть поза bbox
+    way_elements = {element["id"]: element for element in elements if element["type"] == "way"}
+    for relation in relations:
+        for member in relation.get("members", []):
+            if member.get("type") == "node":
+                used_nodes.add(member.get("ref"))
+            elif member.get("type") == "way" and member.get("ref") in way_elements:
+                if member["ref"] not in way_ids:
+                    way_ids.add(member["ref"])
+                    ways.append(way_elements[member["ref"]])
+                    used_nodes.update(way_elements[member["ref"]].get("nodes", []))
+
+    clipped_nodes = [
+        node for node_id, node in nodes.items()
+        if node_id in used_nodes or ("tags" in node and inside(node))
+    ]
+
+    return ways + relations + clipped_nodes
@@ -0,0 +1,246 @@
+from array import array
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+import json
+import logging
+import os
+
+import numpy as np
+
+from .osm_cache import way_geometry_nodes
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+ARRAY_NAMES = (
+    "node_ids", "node_lat", "node_lon",
+    "tagged_node_rows", "node_tag_offsets", "node_tags",
+    "way_ids", "way_offsets", "way_refs", "way_tag_offsets", "way_tags"
+)
+
+
+class StringTable:
+    # Кожен ключ і значення тегу зберігається один раз, а елементи
+    # посилаються на них індексами
+    def __init__(self, strings: Optional[List[str]] = None):
+        self.strings: List[str] = list(strings or [])
+        self._positions = {value: position for position, value in enumerate(self.strings)}
+
+    def intern(self, value: str) -> int:
+        position = self._positions.get(value)
+        if position is None:
+            position = len(self.strings)
+            self.strings.append(value)
+            self._positions[value] = position
+        return position
+
+    def __getitem__(self, position: int) -> str:
+        return self.strings[position]
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+
+class ColumnarOSMData:
+    # Стовпчикове представлення відповіді Overpass:
+    #   node_ids/node_lat/node_lon - відсортовані координати всіх вузлів;
+    #   way_offsets/way_refs - CSR: вузли лінії i це way_refs[way_offsets[i]:way_offsets[i + 1]];
+    #   *_tag_offsets/*_tags - CSR пар (ключ, значення) з індексами у strings.
+    # Масиви можна зберегти в каталог і відкрити через mmap без копіювання
+    def __init__(self, arrays: Dict[str, np.ndarray], strings: StringTable,
+                 relations: Optional[List[dict]] = None, element_count: int = 0):
+        self.arrays = arrays
+        self.strings = strings
+        self.relations = relations or []
+        self.element_count = element_count
+        self._tag_sets: Dict[bytes, dict] = {}
+
+    @classmethod
+    def from_osm_data(cls, osm_data: dict) -> 'ColumnarOSMData':
+        return cls.from_elements(osm_data.get("elements", []))
+
+    @classmethod
+    def from_elements(cls, elements: Iterable[dict]) -> 'ColumnarOSMData':
+        strings = StringTable()
+        node_ids, node_lat, node_lon = array('q'), array('d'), array('d')
+        node_tags: Dict[int, dict] = {}
+        way_ids, way_offsets, way_refs = array('q'), array('q', [0]), array('q')
+        way_tag_offsets, way_tags = array('q', [0]), array('i')
+        seen_ways = set()
+        relations = []
+        element_count = 0
+
+        for element in elements:
+            element_count += 1
+            element_type = element["type"]
+
+            if element_type == "node":
+                if "lat" not in element or "lon" not in element:
+                    continue
+                node_ids.append(element["id"])
+                node_lat.append(element["lat"])
+                node_lon.append(element["lon"])
+                if element.get("tags"):
+                    node_tags[element["id"]] = element["tags"]
+            elif element_type == "way":
+                # Одна лінія може прийти з кількох тайлів
+                if element["id"] in seen_ways:
+                    continue
+                seen_ways.add(element["id"])
+                way_ids.append(element["id"])
+                for node_id, lat, lon in way_geometry_nodes(element):
+                    node_ids.append(node_id)
+                    node_lat.append(lat)
+                    node_lon.append(lon)
+                way_refs.extend(element.get("nodes", []))
+                way_offsets.append(len(way_refs))
+                for key, value in (element.get("tags") or {}).items():
+                    way_tags.append(strings.intern(key))
+                    way_tags.append(strings.intern(value))
+                way_tag_offsets.append(len(way_tags) // 2)
+            elif element_type == "relation":
+                relations.append(element)
+
+        ids = np.frombuffer(node_ids, dtype=np.int64) if len(node_ids) else np.zeros(0, dtype=np.int64)
+        order = np.argsort(ids, kind="stable")
+        ids = ids[order]
+        unique = np.ones(len(ids), dtype=bool)
+        unique[1:] = ids[1:] != ids[:-1]
+        order = order[unique]
+        ids = ids[unique]
+
+        tagged_ids = np.array(sorted(node_tags), dtype=np.int64)
+        tag_offsets = array('q', [0])
+        tag_pairs = array('i')
+        for node_id in tagged_ids.tolist():
+            for key, value in node_tags[node_id].items():
+                tag_pairs.append(strings.intern(key))
+                tag_pairs.append(strings.intern(value))
+            tag_offsets.append(len(tag_pairs) // 2)
+
+        arrays = {
+            "node_ids": ids,
+            "node_lat": np.asarray(node_lat, dtype=np.float64)[order],
+            "node_lon": np.asarray(node_lon, dtype=np.float64)[order],
+            "tagged_node_rows": np.searchsorted(ids, tagged_ids).astype(np.int64),
+            "node_tag_offsets": np.asarray(tag_offsets, dtype=np.int64),
+            "node_tags": np.asarray(tag_pairs, dtype=np.int32).reshape(-1, 2),
+            "way_ids": np.asarray(way_ids, dtype=np.int64),
+            "way_offsets": np.asarray(way_offsets, dtype=np.int64),
+            "way_refs": np.asarray(way_refs, dtype=np.int64),
+            "way_tag_offsets": np.asarray(way_tag_offsets, dtype=np.int64),
+            "way_tags": np.asarray(way_tags, dtype=np.int32).reshape(-1, 2)
+        }
+        return cls(arrays, strings, relations, element_count)
+
+    def _meta(self, **extra) -> dict:
+        return {
+            "version": FORMAT_VERSION,
+            "element_count": self.element_count,
+            "strings": self.strings.strings,
+            "relations": self.relations,
+            **extra
+        }
+
+    @classmethod
+    def _from_meta(cls, arrays: Dict[str, np.ndarray], meta: dict) -> 'ColumnarOSMData':
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported columnar OSM format version: {meta.get('version')}")
+        return cls(arrays, StringTable(meta["strings"]), meta["relations"], meta["element_count"])
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(path, f"{name}.npy"), self.arrays[name])
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(self._meta(), f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'ColumnarOSMData':
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+
+        mmap_mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in ARRAY_NAMES}
+        return cls._from_meta(arrays, meta)
+
+    def save_npz(self, file: BinaryIO, **extra):
+        # Один файл замість каталогу - для тайлів кешу, які записуються атомарно;
+        # meta зберігається як UTF-8 байти, щоб читати без pickle
+        meta = json.dumps(self._meta(**extra), ensure_ascii=False).encode("utf-8")
+        np.savez(file, meta=np.frombuffer(meta, dtype=np.uint8), **self.arrays)
+
+    @classmethod
+    def load_npz(cls, path: str) -> Tuple['ColumnarOSMData', dict]:
+        with np.load(path, allow_pickle=False) as archive:
+            meta = json.loads(archive["meta"].tobytes().decode("utf-8"))
+            arrays = {name: archive[name] for name in ARRAY_NAMES}
+        return cls._from_meta(arrays, meta), meta
+
+    @property
+    def nbytes(self) -> int:
+        return sum(int(values.nbytes) for values in self.arrays.values())
+
+    @property
+    def node_count(self) -> int:
+        return len(self.arrays["node_ids"])
+
+    @property
+    def way_count(self) -> int:
+        return len(self.arrays["way_ids"])
+
+    def node_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return self.arrays["node_ids"], self.arrays["node_lat"], self.arrays["node_lon"]
+
+    def _tags(self, pairs: np.ndarray, start: int, end: int) -> dict:
+        # Елементи з однаковим набором тегів (тисячі {"building": "yes"})
+        # отримують один і той самий словник - його не можна змінювати
+        pairs = pairs[start:end]
+        key = pairs.tobytes()
+        tags = self._tag_sets.get(key)
+        if tags is None:
+            strings = self.strings.strings
+            tags = {strings[name]: strings[value] for name, value in pairs.tolist()}
+            self._tag_sets[key] = tags
+        return tags
+
+    def way_nodes(self, position: int) -> List[int]:
+        offsets = self.arrays["way_offsets"]
+        return self.arrays["way_refs"][offsets[position]:offsets[position + 1]].tolist()
+
+    def iter_ways(self) -> Iterator[dict]:
+        way_ids = self.arrays["way_ids"].tolist()
+        tag_offsets = self.arrays["way_tag_offsets"].tolist()
+        pairs = self.arrays["way_tags"]
+        for position, way_id in enumerate(way_ids):
+            way = {"type": "way", "id": way_id, "nodes": self.way_nodes(position)}
+            if tag_offsets[position + 1] > tag_offsets[position]:
+                way["tags"] = self._tags(pairs, tag_offsets[position], tag_offsets[position + 1])
+            yield way
+
+    def iter_tagged_nodes(self) -> Iterator[dict]:
+        ids, lat, lon = self.node_arrays()
+        tag_offsets = self.arrays["node_tag_offsets"].tolist()
+        pairs = self.arrays["node_tags"]
+        for position, row in enumerate(self.arrays["tagged_node_rows"].tolist()):
+            yield {
+                "type": "node",
+                "id": int(ids[row]),
+                "lat": float(lat[row]),
+                "lon": float(lon[row]),
+                "tags": self._tags(pairs, tag_offsets[position], tag_offsets[position + 1])
+            }
+
+    def iter_elements(self, untagged_nodes: bool = True) -> Iterator[dict]:
+        if untagged_nodes:
+            tagged = np.zeros(self.node_count, dtype=bool)
+            tagged[self.arrays["tagged_node_rows"]] = True
+            ids, lat, lon = self.node_arrays()
+            for row in np.flatnonzero(~tagged).tolist():
+                yield {"type": "node", "id": int(ids[row]), "lat": float(lat[row]), "lon": float(lon[row])}
+        yield from self.iter_tagged_nodes()
+        yield from self.iter_ways()
+        yield from self.relations
+
+    def to_osm_data(self) -> dict:
+        return {"elements": list(self.iter_elements())}
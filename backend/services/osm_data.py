@@ -1,58 +1,359 @@
-from math import radians, cos, sin, asin, sqrt
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Optional, Tuple
+import hashlib
+import math
 import requests
+import threading
 import time
 import logging
 
+from .distance import haversine_array
+from .osm_cache import OSMTileCache, merge_tiles, clip_elements, prune_tags
+from .osm_local import LocalOSMStore
+from .osm_stream import OverpassStreamParser
+from .overpass_client import OverpassClient, get_overpass_client
+
 logger = logging.getLogger(__name__)
 
 
+BBox = Tuple[float, float, float, float]
+
+# Ознаки того, що Overpass не встиг виконати запит і повернув неповні дані
+OVERPASS_OVERLOAD_REMARKS = ("timed out", "timeout", "out of memory")
+
+
+# Які елементи потрібні аналізу: (тип, ключ тегу, значення або None для будь-якого)
+OSM_FEATURE_FILTERS = [
+    ("way", "highway", None),
+    ("way", "leisure", "park"),
+    ("way", "natural", "wood"),
+    ("way", "landuse", "forest"),
+    ("way", "landuse", "meadow"),
+    ("way", "landuse", "grass"),
+    ("way", "natural", "water"),
+    ("way", "waterway", None),
+    # Великі парки, ліси і водойми часто задані мультиполігонами
+    ("relation", "leisure", "park"),
+    ("relation", "natural", "wood"),
+    ("relation", "landuse", "forest"),
+    ("relation", "landuse", "meadow"),
+    ("relation", "landuse", "grass"),
+    ("relation", "natural", "water"),
+    ("node", "public_transport", None),
+    ("node", "highway", "bus_stop"),
+    ("node", "railway", "station"),
+    ("node", "railway", "tram_stop")
+]
+
+
+# Ключі тегів, які читають аналізатори, крім ключів з OSM_FEATURE_FILTERS
+ANALYSIS_TAG_KEYS = [
+    "name", "lanes", "maxspeed", "surface", "oneway", "junction", "bicycle",
+    "building", "building:levels", "building:use", "height", "addr:street",
+    "amenity", "parking", "parking:lane", "capacity", "shop", "office", "station", "type"
+]
+
+OSM_TAG_KEYS = frozenset([key for _, key, _ in OSM_FEATURE_FILTERS] + ANALYSIS_TAG_KEYS)
+
+# skel - лінії з посиланнями і окремий список усіх їх вузлів (out body; >; out skel);
+# geom - геометрія ліній одразу в самих лініях (out geom), теги обрізаються до OSM_TAG_KEYS
+OSM_QUERY_MODES = ("skel", "geom")
+
+
+def _overpass_selector(key: str, value: Optional[str]) -> str:
+    return f'["{key}"]' if value is None else f'["{key}"="{value}"]'
+
+
+def matches_feature_filters(element_type: str, tags: Optional[dict]) -> bool:
+    if not tags:
+        return False
+    return any(
+        element_type == filter_type and key in tags and (value is None or tags[key] == value)
+        for filter_type, key, value in OSM_FEATURE_FILTERS
+    )
+
+
+def parse_elements(elements: Iterable[dict], tag_keys: Optional[frozenset] = None) -> Iterator[dict]:
+    # Розбір відповіді режиму geom: "bounds" не потрібні, зайві теги
+    # відкидаються одразу, щоб не тримати їх у кеші і в індексі. Лінії-члени
+    # відношень приходять окремими елементами (way(r)), тож їх копія в
+    # members відношення теж не потрібна
+    tag_keys = OSM_TAG_KEYS if tag_keys is None else tag_keys
+    for element in elements:
+        element.pop("bounds", None)
+        for member in element.get("members", ()):
+            member.pop("geometry", None)
+        tags = element.get("tags")
+        if tags:
+            tags = prune_tags(tags, tag_keys)
+            if tags:
+                element["tags"] = tags
+            else:
+                del element["tags"]
+        yield element
+
+
+def fetch_warnings(osm_data) -> List[str]:
+    # Неповні дані позначаються полем remark: частина тайлів не завантажилась
+    # або запит не вдався зовсім. Такі дані не можна вважати повними
+    remark = osm_data.get("remark") if isinstance(osm_data, dict) else None
+    return [str(remark)] if remark else []
+
+
 def haversine(lon1, lat1, lon2, lat2):
-    lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
+    return float(haversine_array(lon1, lat1, lon2, lat2))
+
+
+def _setting(name: str, default):
+    try:
+        from django.conf import settings
+        return getattr(settings, name, default)
+    except Exception:
+        return default
+
+
+def split_bbox(north: float, west: float, south: float, east: float, tile_degrees: float) -> List[BBox]:
+    rows = max(1, math.ceil((north - south) / tile_degrees - 1e-9))
+    cols = max(1, math.ceil((east - west) / tile_degrees - 1e-9))
+    lat_step = (north - south) / rows
+    lon_step = (east - west) / cols
+
+    return [
+        (north - row * lat_step, west + col * lon_step, north - (row + 1) * lat_step, west + (col + 1) * lon_step)
+        for row in range(rows)
+        for col in range(cols)
+    ]
+
+
+class OverpassTooBusy(Exception):
+    pass
+
+
+class RateLimiter:
+    # Спільний для всіх потоків інтервал між запитами до Overpass
+    def __init__(self, requests_per_second: float):
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
 
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-    c = 2 * asin(sqrt(a))
-    r = 6371
-    return c * r
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter(_setting('OSM_REQUESTS_PER_SECOND', 2.0))
+        return _rate_limiter
 
 
 class OSMDataFetcher:
-    def __init__(self):
-        self.overpass_url = "https://overpass-api.de/api/interpreter"
+    def __init__(self, tile_cache: Optional[OSMTileCache] = None, stream: Optional[bool] = None,
+                 rate_limiter: Optional[RateLimiter] = None, client: Optional[OverpassClient] = None,
+                 local_store: Optional[LocalOSMStore] = None, query_mode: Optional[str] = None):
+        # OSM_DATA_SOURCE = 'local' - дані беруться з імпортованого витягу, без Overpass
+        self.local_store = local_store if local_store is not None else LocalOSMStore.from_settings()
+        self.client = client or get_overpass_client()
+        self.stream = stream if stream is not None else bool(_setting('OSM_STREAMING', False))
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.query_mode = query_mode or _setting('OSM_QUERY_MODE', 'skel')
+        if self.query_mode not in OSM_QUERY_MODES:
+            raise ValueError(f"Unknown OSM query mode: {self.query_mode}")
 
-    def get_area_data(self, north, west, south, east):
-        query = f"""
+        # Великі bbox діляться на підзапити, які виконуються паралельно; тайл,
+        # на якому Overpass не встиг, ділиться ще на чотири частини
+        self.query_tile_degrees = _setting('OSM_QUERY_TILE_DEGREES', 0.05)
+        self.max_workers = _setting('OSM_FETCH_WORKERS', 4)
+        self.max_split_depth = _setting('OSM_MAX_SPLIT_DEPTH', 2)
+
+        # Простір імен кешу залежить від тексту запиту, тому зміна набору тегів
+        # не змішується зі старими тайлами
+        query_hash = hashlib.sha1(self._build_query('n', 'w', 's', 'e').encode()).hexdigest()[:10]
+        self.tile_cache = tile_cache if tile_cache is not None else OSMTileCache.from_settings(query_hash)
+
+    def _build_query(self, north, west, south, east) -> str:
+        statements = "\n".join(
+            f"          {element_type}{_overpass_selector(key, value)}({south},{west},{north},{east});"
+            for element_type, key, value in OSM_FEATURE_FILTERS
+        )
+        if self.query_mode == "geom":
+            # way(r) додає лінії-члени знайдених відношень з їхньою геометрією
+            output = """(._; way(r););
+        out geom qt;"""
+        else:
+            output = """out body;
+        >;
+        out skel qt;"""
+        return f"""
         [out:json];
         (
-          way["highway"]({south},{west},{north},{east});
-          way["leisure"="park"]({south},{west},{north},{east});
-          way["natural"="wood"]({south},{west},{north},{east});
-          way["landuse"="forest"]({south},{west},{north},{east});
-          way["landuse"="meadow"]({south},{west},{north},{east});
-          way["landuse"="grass"]({south},{west},{north},{east});
-          way["natural"="water"]({south},{west},{north},{east});
-          way["waterway"]({south},{west},{north},{east});
-          node["public_transport"]({south},{west},{north},{east});
-          node["highway"="bus_stop"]({south},{west},{north},{east});
-          node["railway"="station"]({south},{west},{north},{east});
-          node["railway"="tram_stop"]({south},{west},{north},{east});
+{statements}
         );
-        out body;
-        >;
-        out skel qt;
+        {output}
         """
 
+    def get_area_data(self, north, west, south, east):
         try:
-            response = requests.post(self.overpass_url, data=query, timeout=30)
+            if self.local_store is not None:
+                return self.local_store.get_area_data(north, west, south, east)
+            if self.tile_cache is not None:
+                return self._get_cached_area_data(north, west, south, east)
+            return self._fetch_bbox(north, west, south, east, stream=self.stream)
+        except Exception as e:
+            logger.error(f"Error fetching OSM data: {e}")
+            return {"elements": [], "remark": f"failed: {e}"}
 
-            if response.status_code == 429:
-                logger.warning("Rate limited by Overpass API, waiting 5 seconds")
-                time.sleep(5)
-                return self.get_area_data(north, west, south, east)
+    def _fetch_bbox(self, north, west, south, east, stream: bool = False) -> dict:
+        tiles = split_bbox(north, west, south, east, self.query_tile_degrees)
+        if stream and len(tiles) == 1:
+            data = {}
+            data["elements"] = self._guarded_stream(data, (north, west, south, east))
+            return data
+        return self._fetch_tiled(tiles)
 
-            response.raise_for_status()
-            return response.json()
+    def _guarded_stream(self, data: dict, bbox: BBox) -> Iterator[dict]:
+        # Потік розбирається вже в OSMIndex, поза try/except get_area_data,
+        # тож помилки обробляються тут так само, як без потоку: перевантажений
+        # Overpass - bbox довантажується частинами (без уже отриманих
+        # елементів), інша помилка - лог і позначка remark у data
+        seen = set()
+        try:
+            for element in self._fetch_area_data(*bbox, stream=True)["elements"]:
+                seen.add((element["type"], element["id"]))
+                yield element
+        except (requests.Timeout, OverpassTooBusy) as e:
+            # Частини ловлять лише таймаути - інша помилка догрузки теж іде в remark
+            try:
+                elements, failed = self._split_tile(bbox, 0, e)
+            except Exception as split_error:
+                logger.error(f"Error fetching split OSM data: {split_error}")
+                data["remark"] = f"failed: {split_error}"
+                return
+            for element in elements:
+                if (element["type"], element["id"]) not in seen:
+                    yield element
+            if failed:
+                data["remark"] = f"incomplete: {failed} sub-queries failed"
         except Exception as e:
-            logger.error(f"Error fetching OSM data: {e}")
-            return {"elements": []}
\ No newline at end of file
+            logger.error(f"Error streaming OSM data: {e}")
+            data["remark"] = f"failed: {e}"
+
+    def _fetch_tiled(self, tiles: List[BBox]) -> dict:
+        if len(tiles) > 1:
+            logger.info(f"Splitting Overpass query into {len(tiles)} tiles")
+
+        results = []
+        errors = []
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(tiles)))) as executor:
+            futures = [executor.submit(self._fetch_tile, tile) for tile in tiles]
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    errors.append(e)
+
+        if errors and not results:
+            raise errors[0]
+
+        # Лінії на межі тайлів приходять з кожного тайла - merge_tiles лишає одну копію
+        data = {"elements": merge_tiles(elements for elements, _ in results)}
+        incomplete = len(errors) + sum(failed for _, failed in results)
+        if incomplete:
+            logger.error(f"{incomplete} Overpass sub-queries failed, returning partial data")
+            data["remark"] = f"incomplete: {incomplete} sub-queries failed"
+        return data
+
+    def _fetch_tile(self, bbox: BBox, depth: int = 0) -> Tuple[List[dict], int]:
+        try:
+            data = self._fetch_area_data(*bbox)
+            remark = str(data.get("remark") or "").lower()
+            if any(marker in remark for marker in OVERPASS_OVERLOAD_REMARKS):
+                raise OverpassTooBusy(data["remark"])
+            return data.get("elements", []), 0
+        except (requests.Timeout, OverpassTooBusy) as e:
+            return self._split_tile(bbox, depth, e)
+
+    def _split_tile(self, bbox: BBox, depth: int, error: Exception) -> Tuple[List[dict], int]:
+        if depth >= self.max_split_depth:
+            logger.error(f"Overpass tile {bbox} failed after {depth} splits: {error}")
+            return [], 1
+
+        north, west, south, east = bbox
+        logger.warning(f"Overpass tile {bbox} is too heavy ({error}), splitting")
+        half = max(north - south, east - west) / 2
+        elements = []
+        failed = 0
+        for sub_bbox in split_bbox(north, west, south, east, half):
+            sub_elements, sub_failed = self._fetch_tile(sub_bbox, depth + 1)
+            elements.append(sub_elements)
+            failed += sub_failed
+        return merge_tiles(elements), failed
+
+    def _fetch_area_data(self, north, west, south, east, stream: bool = False) -> dict:
+        query = self._build_query(north, west, south, east)
+        self.rate_limiter.acquire()
+        # Повтори, Retry-After і перемикання між серверами - в OverpassClient
+        response = self.client.post(query, stream=stream)
+
+        if response.status_code == 504:
+            response.close()
+            raise OverpassTooBusy("Overpass gateway timeout")
+
+        response.raise_for_status()
+        if stream:
+            # "elements" - лінивий ітератор: OSMIndex розбирає відповідь по
+            # одному елементу, не створюючи повного списку
+            elements = self._stream_elements(response)
+            return {"elements": parse_elements(elements) if self.query_mode == "geom" else elements}
+        data = response.json()
+        if self.query_mode == "geom" and "elements" in data:
+            data["elements"] = list(parse_elements(data["elements"]))
+        return data
+
+    def _stream_elements(self, response):
+        parser = OverpassStreamParser()
+        try:
+            yield from parser.iter_elements(response.iter_content(chunk_size=64 * 1024))
+        finally:
+            response.close()
+        logger.info(f"Streamed {parser.element_count} OSM elements")
+        # Remark про таймаут приходить після елементів - відповідь неповна
+        remark = str(parser.meta.get("remark") or "")
+        if any(marker in remark.lower() for marker in OVERPASS_OVERLOAD_REMARKS):
+            raise OverpassTooBusy(remark)
+
+    def _get_cached_area_data(self, north, west, south, east) -> dict:
+        keys = self.tile_cache.tiles_for_bbox(north, west, south, east)
+        tiles, missing = self.tile_cache.get_many(keys)
+        remark = None
+
+        if missing:
+            groups = self.tile_cache.group_tiles(missing)
+            logger.info(f"OSM tile cache: {len(tiles)} hit, {len(missing)} missing in {len(groups)} queries")
+            remarks = []
+            for group in groups:
+                fetched = self._fetch_bbox(*self.tile_cache.bbox_for_tiles(group))
+                fresh_tiles = self.tile_cache.split_into_tiles(fetched.get("elements", []), group)
+                if "remark" in fetched:
+                    remarks.append(str(fetched["remark"]))
+                else:
+                    self.tile_cache.put_many(fresh_tiles)
+                tiles.update(fresh_tiles)
+            remark = "; ".join(remarks) or None
+
+        elements = merge_tiles(tiles.values())
+        data = {"elements": clip_elements(elements, north, west, south, east)}
+        # Без remark аналізатор не дізнається, що частина тайлів прийшла неповною
+        if remark is not None:
+            data["remark"] = remark
+        return data
@@ -0,0 +1,308 @@
+from array import array
+from collections import defaultdict
+from itertools import chain
+from typing import Dict, List, Optional, Tuple, Union
+import logging
+
+import numpy as np
+
+from .geometry import polygon_areas_km2
+from .multipolygon import Multipolygon, is_multipolygon, member_lines
+from .osm_cache import way_geometry_nodes
+from .osm_columnar import ColumnarOSMData
+
+logger = logging.getLogger(__name__)
+
+GREEN_TAGS = {
+    "leisure": ["park", "garden", "nature_reserve"],
+    "natural": ["wood", "forest", "scrub"],
+    "landuse": ["forest", "meadow", "grass", "recreation_ground"]
+}
+
+TRAFFIC_CONTROL_TYPES = ["traffic_signals", "stop", "speed_camera"]
+
+AREA_FEATURES = ["building", "green", "water"]
+
+TRANSPORT_TAGS = {
+    "highway": ["bus_stop"],
+    "railway": ["station", "halt", "tram_stop"]
+}
+
+
+def _is_green(tags: dict) -> bool:
+    return any(tags.get(key) in values for key, values in GREEN_TAGS.items())
+
+
+def _is_water(tags: dict) -> bool:
+    return tags.get("natural") in ["water", "coastline"] or "waterway" in tags
+
+
+def _is_transport(tags: dict) -> bool:
+    return "public_transport" in tags or any(tags.get(key) in values for key, values in TRANSPORT_TAGS.items())
+
+
+class NodeStore:
+    # Координати вузлів у компактних масивах (id, lat, lon) замість словника
+    # кортежів: ~24 байти на вузол; пошук іде по відсортованій копії
+    def __init__(self):
+        self._ids = array('q')
+        self._lat = array('d')
+        self._lon = array('d')
+        self._sorted = None
+
+    @classmethod
+    def from_arrays(cls, ids: np.ndarray, lat: np.ndarray, lon: np.ndarray) -> 'NodeStore':
+        # Масиви вже відсортовані і без повторів (ColumnarOSMData), тож
+        # використовуються як є, зокрема відкриті через mmap
+        store = cls()
+        store._sorted = (ids, lat, lon)
+        return store
+
+    def add(self, node_id: int, lat: float, lon: float):
+        if self._sorted is not None and not len(self._ids):
+            ids, lat_values, lon_values = self._sorted
+            self._ids.extend(ids.tolist())
+            self._lat.extend(lat_values.tolist())
+            self._lon.extend(lon_values.tolist())
+        self._ids.append(node_id)
+        self._lat.append(lat)
+        self._lon.append(lon)
+        self._sorted = None
+
+    def __len__(self) -> int:
+        return len(self.arrays()[0])
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if self._sorted is None:
+            ids = np.frombuffer(self._ids, dtype=np.int64) if len(self._ids) else np.zeros(0, dtype=np.int64)
+            order = np.argsort(ids, kind="stable")
+            ids = ids[order]
+            # Повторний вузол (наприклад, з двох тайлів) лишається один раз
+            unique = np.ones(len(ids), dtype=bool)
+            unique[1:] = ids[1:] != ids[:-1]
+            order = order[unique]
+            self._sorted = (ids[unique],
+                            np.asarray(self._lat, dtype=np.float64)[order],
+                            np.asarray(self._lon, dtype=np.float64)[order])
+        return self._sorted
+
+    def contains(self, node_ids) -> np.ndarray:
+        ids = self.arrays()[0]
+        node_ids = np.asarray(node_ids, dtype=np.int64)
+        if len(ids) == 0:
+            return np.zeros(len(node_ids), dtype=bool)
+        positions = np.minimum(np.searchsorted(ids, node_ids), len(ids) - 1)
+        return ids[positions] == node_ids
+
+    def get(self, node_id: int, default=None) -> Optional[Tuple[float, float]]:
+        ids, lat, lon = self.arrays()
+        position = int(np.searchsorted(ids, node_id))
+        if position < len(ids) and ids[position] == node_id:
+            return float(lat[position]), float(lon[position])
+        return default
+
+    def __contains__(self, node_id: int) -> bool:
+        return self.get(node_id) is not None
+
+    def __getitem__(self, node_id: int) -> Tuple[float, float]:
+        coords = self.get(node_id)
+        if coords is None:
+            raise KeyError(node_id)
+        return coords
+
+
+class OSMIndex:
+    def __init__(self):
+        self.node_coords = NodeStore()
+        self.tagged_nodes: Dict[int, dict] = {}
+        self.ways: Dict[int, dict] = {}
+        self.relations: Dict[int, dict] = {}
+        self.features: Dict[str, List[dict]] = defaultdict(list)
+        self.element_count = 0
+        self._way_areas = None
+        self._multipolygons = None
+
+    @classmethod
+    def from_osm_data(cls, osm_data: Union[dict, ColumnarOSMData]) -> 'OSMIndex':
+        if isinstance(osm_data, ColumnarOSMData):
+            return cls.from_columnar(osm_data)
+        index = cls()
+        for element in osm_data.get("elements", []):
+            index.add(element)
+        return index
+
+    @classmethod
+    def from_columnar(cls, data: ColumnarOSMData) -> 'OSMIndex':
+        # Вузли без тегів лишаються в масивах; словниками стають лише лінії,
+        # вузли з тегами і відношення
+        index = cls()
+        index.node_coords = NodeStore.from_arrays(*data.node_arrays())
+        for element in data.iter_elements(untagged_nodes=False):
+            index._register(element)
+        index.element_count = data.element_count
+        return index
+
+    @classmethod
+    def ensure(cls, osm_data: Union[dict, ColumnarOSMData, 'OSMIndex']) -> 'OSMIndex':
+        if isinstance(osm_data, cls):
+            return osm_data
+        return cls.from_osm_data(osm_data)
+
+    def add(self, element: dict):
+        self.element_count += 1
+        if element["type"] == "node" and "lat" in element and "lon" in element:
+            self.node_coords.add(element["id"], element["lat"], element["lon"])
+        elif element["type"] == "way" and element.get("geometry"):
+            for node_id, lat, lon in way_geometry_nodes(element):
+                self.node_coords.add(node_id, lat, lon)
+        self._register(element)
+
+    def _register(self, element: dict):
+        element_type = element["type"]
+
+        if element_type == "node":
+            if element.get("tags"):
+                self.tagged_nodes[element["id"]] = element
+        elif element_type == "way":
+            # Лінія-член відношення може прийти ще раз без тегів (out skel)
+            if element.get("tags") or element["id"] not in self.ways:
+                self.ways[element["id"]] = element
+        elif element_type == "relation":
+            self.relations[element["id"]] = element
+
+        tags = element.get("tags")
+        if tags:
+            self._classify(element_type, element, tags)
+
+    def _classify(self, element_type: str, element: dict, tags: dict):
+        if tags.get("amenity") == "parking" or (tags.get("highway") and tags.get("parking:lane")):
+            self.features["parking"].append(element)
+
+        if element_type == "node":
+            if tags.get("highway") in TRAFFIC_CONTROL_TYPES:
+                self.features["traffic_control"].append(element)
+            if _is_transport(tags):
+                self.features["transport"].append(element)
+            return
+
+        if element_type == "way":
+            if "highway" in tags:
+                self.features["road"].append(element)
+            if tags.get("junction") == "roundabout":
+                self.features["roundabout"].append(element)
+
+        if "building" in tags:
+            self.features["building"].append(element)
+        if _is_green(tags):
+            self.features["green"].append(element)
+        if _is_water(tags):
+            self.features["water"].append(element)
+
+    def node(self, node_id: int) -> Optional[Tuple[float, float]]:
+        return self.node_coords.get(node_id)
+
+    def tags(self, element_type: str, element_id: int) -> dict:
+        if element_type == "node":
+            element = self.tagged_nodes.get(element_id)
+        elif element_type == "way":
+            element = self.ways.get(element_id)
+        elif element_type == "relation":
+            element = self.relations.get(element_id)
+        else:
+            element = None
+        return element.get("tags", {}) if element else {}
+
+    def coordinate_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return self.node_coords.arrays()
+
+    def gather_way_coordinates(self, ways: List[dict],
+                               keep_missing: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # keep_missing=True зберігає невідомі вузли як NaN, щоб не з'єднувати
+        # сусідів через розрив
+        ids, lat, lon = self.coordinate_arrays()
+
+        lengths = np.fromiter((len(way.get("nodes", [])) for way in ways), dtype=np.int64, count=len(ways))
+        refs = np.fromiter(chain.from_iterable(way.get("nodes", []) for way in ways),
+                           dtype=np.int64, count=int(lengths.sum()))
+
+        if len(ids) == 0:
+            found = np.zeros(len(refs), dtype=bool)
+            positions = np.zeros(len(refs), dtype=np.int64)
+        else:
+            positions = np.minimum(np.searchsorted(ids, refs), len(ids) - 1)
+            found = ids[positions] == refs
+
+        if keep_missing:
+            offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+            if len(ids) == 0:
+                return np.full(len(refs), np.nan), np.full(len(refs), np.nan), offsets
+            return np.where(found, lat[positions], np.nan), np.where(found, lon[positions], np.nan), offsets
+
+        way_index = np.repeat(np.arange(len(ways)), lengths)
+        counts = np.bincount(way_index[found], minlength=len(ways))
+        offsets = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+
+        positions = positions[found]
+        return lat[positions], lon[positions], offsets
+
+    def way_areas(self) -> Dict[int, float]:
+        if self._way_areas is None:
+            ways = {}
+            for feature in AREA_FEATURES:
+                for element in self.features[feature]:
+                    if element["type"] == "way":
+                        ways[element["id"]] = element
+
+            way_list = list(ways.values())
+            lat, lon, offsets = self.gather_way_coordinates(way_list)
+            areas = polygon_areas_km2(lat, lon, offsets)
+
+            self._way_areas = {
+                way["id"]: float(area)
+                for way, area in zip(way_list, areas)
+                if not np.isnan(area)
+            }
+        return self._way_areas
+
+    def assemble_multipolygons(self, relations: List[dict]) -> Dict[int, Multipolygon]:
+        # Координати всіх ліній-членів збираються одним проходом, площі всіх
+        # кілець рахуються одним векторним викликом
+        member_ids = {member.get("ref") for relation in relations for member in relation.get("members", [])
+                      if member.get("type") == "way" and member.get("ref") in self.ways}
+        member_ways = [self.ways[way_id] for way_id in member_ids]
+        lat, lon, offsets = self.gather_way_coordinates(member_ways)
+        way_lines = {
+            way["id"]: (lat[offsets[position]:offsets[position + 1]], lon[offsets[position]:offsets[position + 1]])
+            for position, way in enumerate(member_ways)
+        }
+
+        multipolygons = {relation["id"]: Multipolygon.from_members(member_lines(relation, way_lines))
+                         for relation in relations}
+
+        rings = [ring for multipolygon in multipolygons.values() for ring in multipolygon.rings]
+        if rings:
+            ring_offsets = np.concatenate(([0], np.cumsum([len(ring[0]) for ring in rings])))
+            areas = polygon_areas_km2(np.concatenate([ring[0] for ring in rings]),
+                                      np.concatenate([ring[1] for ring in rings]), ring_offsets, min_points=4)
+            areas = np.nan_to_num(areas)
+            position = 0
+            for multipolygon in multipolygons.values():
+                multipolygon.outer_areas = areas[position:position + len(multipolygon.outer)]
+                position += len(multipolygon.outer)
+                multipolygon.inner_areas = areas[position:position + len(multipolygon.inner)]
+                position += len(multipolygon.inner)
+
+        unclosed = sum(multipolygon.unclosed for multipolygon in multipolygons.values())
+        if unclosed:
+            logger.debug(f"{unclosed} multipolygon member ways did not close into rings")
+        return multipolygons
+
+    def multipolygons(self) -> Dict[int, Multipolygon]:
+        if self._multipolygons is None:
+            relations = {}
+            for feature in AREA_FEATURES:
+                for element in self.features[feature]:
+                    if is_multipolygon(element):
+                        relations[element["id"]] = element
+            self._multipolygons = self.assemble_multipolygons(list(relations.values()))
+        return self._multipolygons
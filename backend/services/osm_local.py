@@ -0,0 +1,312 @@
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+import bz2
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import threading
+import xml.etree.ElementTree as ElementTree
+
+logger = logging.getLogger(__name__)
+
+# ("node", id, lat, lon, tags), ("way", id, [node ids], tags) або
+# ("relation", id, [(тип члена, id, роль)], tags)
+OSMRecord = Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (id INTEGER PRIMARY KEY, lat REAL NOT NULL, lon REAL NOT NULL, tags TEXT);
+CREATE TABLE IF NOT EXISTS ways (id INTEGER PRIMARY KEY, nodes TEXT NOT NULL, tags TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS relations (id INTEGER PRIMARY KEY, members TEXT NOT NULL, tags TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS relation_ways (
+    way_id INTEGER NOT NULL, relation_id INTEGER NOT NULL, PRIMARY KEY (way_id, relation_id)
+) WITHOUT ROWID;
+CREATE VIRTUAL TABLE IF NOT EXISTS node_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon);
+CREATE VIRTUAL TABLE IF NOT EXISTS way_rtree USING rtree(id, min_lat, max_lat, min_lon, max_lon);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+PBF_MEMBER_TYPES = {"n": "node", "w": "way", "r": "relation"}
+
+
+def _open_extract(path: str):
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def iter_osm_xml(path: str, relations_only: bool = False) -> Iterator[OSMRecord]:
+    # Розібрані елементи лишаються дочірніми в корені <osm>, тож після кожного
+    # вузла, лінії чи відношення корінь очищується - пам'ять не росте з розміром витягу
+    with _open_extract(path) as source:
+        root = None
+        tags = {}
+        refs = []
+        members = []
+        for event, element in ElementTree.iterparse(source, events=("start", "end")):
+            if event == "start":
+                if root is None:
+                    root = element
+                continue
+            tag = element.tag
+            if tag == "tag":
+                tags[element.get("k")] = element.get("v")
+            elif tag == "nd":
+                refs.append(int(element.get("ref")))
+            elif tag == "member":
+                members.append((element.get("type"), int(element.get("ref")), element.get("role") or ""))
+            elif tag == "node":
+                if not relations_only:
+                    yield "node", int(element.get("id")), float(element.get("lat")), float(element.get("lon")), tags
+                tags = {}
+                root.clear()
+            elif tag == "way":
+                if not relations_only:
+                    yield "way", int(element.get("id")), refs, tags
+                tags, refs = {}, []
+                root.clear()
+            elif tag == "relation":
+                yield "relation", int(element.get("id")), members, tags
+                tags, members = {}, []
+                root.clear()
+
+
+def iter_osm_pbf(path: str, relations_only: bool = False) -> Iterator[OSMRecord]:
+    try:
+        import osmium
+    except ImportError:
+        raise ImportError("Reading .osm.pbf extracts requires the 'osmium' package (pip install osmium)")
+
+    kinds = osmium.osm.RELATION if relations_only else osmium.osm.NODE | osmium.osm.WAY | osmium.osm.RELATION
+    for obj in osmium.FileProcessor(path, kinds):
+        tags = {tag.k: tag.v for tag in obj.tags}
+        if obj.is_node():
+            if obj.location.valid():
+                yield "node", obj.id, obj.location.lat, obj.location.lon, tags
+        elif obj.is_way():
+            yield "way", obj.id, [node.ref for node in obj.nodes], tags
+        elif obj.is_relation():
+            members = [(PBF_MEMBER_TYPES.get(member.type, member.type), member.ref, member.role)
+                       for member in obj.members]
+            yield "relation", obj.id, members, tags
+
+
+def iter_osm_extract(path: str, relations_only: bool = False) -> Iterator[OSMRecord]:
+    if path.endswith(".pbf"):
+        return iter_osm_pbf(path, relations_only)
+    return iter_osm_xml(path, relations_only)
+
+
+def relation_member_ways(records: Iterable[OSMRecord], matches) -> Set[int]:
+    # Лінії-члени потрібних відношень (часто без власних тегів). У витягу
+    # відношення йдуть після ліній, тож їх збирає окремий перший прохід
+    return {
+        ref
+        for record in records if record[0] == "relation" and matches("relation", record[3])
+        for member_type, ref, _ in record[2] if member_type == "way"
+    }
+
+
+class LocalOSMStore:
+    # Локальна копія потрібної частини витягу OSM у SQLite: вузли і лінії
+    # з R-tree індексами, щоб bbox-запит не проходив по всій таблиці
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._has_relations = None
+
+    @classmethod
+    def from_settings(cls) -> Optional['LocalOSMStore']:
+        try:
+            from django.conf import settings
+            if getattr(settings, 'OSM_DATA_SOURCE', 'overpass') != 'local':
+                return None
+            db_path = getattr(settings, 'OSM_LOCAL_DB', None)
+            if not db_path or not os.path.exists(db_path):
+                logger.error(f"OSM_DATA_SOURCE is 'local' but OSM_LOCAL_DB does not exist: {db_path}")
+                return None
+            return cls(db_path)
+        except Exception as e:
+            logger.warning(f"Local OSM store disabled: {e}")
+            return None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # sqlite3 не дозволяє ділити з'єднання між потоками
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path)
+            self._local.connection = connection
+        return connection
+
+    def import_records(self, records: Iterable[OSMRecord], matches, member_ways: Optional[Set[int]] = None,
+                       batch_size: int = 10000) -> dict:
+        # member_ways - лінії-члени відношень (relation_member_ways), які
+        # зберігаються, навіть якщо самі не проходять фільтр
+        connection = self.connection
+        connection.executescript(SCHEMA)
+        counts = {"nodes": 0, "ways": 0, "relations": 0}
+        member_ways = member_ways or set()
+        records = iter(records)
+
+        with connection:
+            for batch in iter(lambda: list(islice(records, batch_size)), []):
+                nodes = []
+                tagged = []
+                ways = []
+                relations = []
+                relation_ways = []
+                for record in batch:
+                    if record[0] == "node":
+                        _, node_id, lat, lon, tags = record
+                        if matches("node", tags):
+                            nodes.append((node_id, lat, lon, json.dumps(tags, ensure_ascii=False)))
+                            tagged.append((node_id, lat, lat, lon, lon))
+                        else:
+                            nodes.append((node_id, lat, lon, None))
+                    elif record[0] == "way":
+                        _, way_id, refs, tags = record
+                        if matches("way", tags) or way_id in member_ways:
+                            ways.append((way_id, json.dumps(refs), json.dumps(tags, ensure_ascii=False)))
+                    elif record[0] == "relation" and matches("relation", record[3]):
+                        _, relation_id, members, tags = record
+                        relations.append((relation_id, json.dumps(
+                            [{"type": member_type, "ref": ref, "role": role} for member_type, ref, role in members]
+                        ), json.dumps(tags, ensure_ascii=False)))
+                        relation_ways.extend((ref, relation_id) for member_type, ref, _ in members
+                                             if member_type == "way")
+
+                connection.executemany("INSERT OR REPLACE INTO nodes VALUES (?, ?, ?, ?)", nodes)
+                connection.executemany("INSERT OR REPLACE INTO node_rtree VALUES (?, ?, ?, ?, ?)", tagged)
+                connection.executemany("INSERT OR REPLACE INTO ways VALUES (?, ?, ?)", ways)
+                connection.executemany("INSERT OR REPLACE INTO relations VALUES (?, ?, ?)", relations)
+                connection.executemany("INSERT OR IGNORE INTO relation_ways VALUES (?, ?)", relation_ways)
+                counts["nodes"] += len(nodes)
+                counts["ways"] += len(ways)
+                counts["relations"] += len(relations)
+
+            # Межі ліній рахуються вже після завантаження всіх вузлів
+            connection.execute("DELETE FROM way_rtree")
+            connection.execute("""
+                INSERT INTO way_rtree
+                SELECT w.id, MIN(n.lat), MAX(n.lat), MIN(n.lon), MAX(n.lon)
+                FROM ways w, json_each(w.nodes) j JOIN nodes n ON n.id = j.value
+                GROUP BY w.id
+            """)
+            # Вузли без потрібних тегів, на які не посилається жодна лінія, не потрібні
+            connection.execute("""
+                DELETE FROM nodes WHERE tags IS NULL AND id NOT IN (
+                    SELECT j.value FROM ways, json_each(ways.nodes) j
+                )
+            """)
+            counts["kept_nodes"] = connection.execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+            connection.execute("INSERT OR REPLACE INTO meta VALUES ('counts', ?)", (json.dumps(counts),))
+
+        connection.execute("VACUUM")
+        self._has_relations = True
+        return counts
+
+    def get_area_data(self, north: float, west: float, south: float, east: float) -> dict:
+        connection = self.connection
+        bbox = (south, north, west, east)
+
+        ways = connection.execute("""
+            SELECT w.id, w.nodes, w.tags FROM way_rtree r JOIN ways w ON w.id = r.id
+            WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lon >= ? AND r.min_lon <= ?
+        """, bbox).fetchall()
+
+        tagged_nodes = connection.execute("""
+            SELECT n.id, n.lat, n.lon, n.tags FROM node_rtree r JOIN nodes n ON n.id = r.id
+            WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lon >= ? AND r.min_lon <= ?
+              AND n.lat BETWEEN ? AND ? AND n.lon BETWEEN ? AND ?
+        """, bbox + bbox).fetchall()
+
+        way_refs = [(way_id, json.loads(refs), json.loads(tags)) for way_id, refs, tags in ways]
+        coords = self._node_coords({ref for _, refs, _ in way_refs for ref in refs})
+
+        def inside(node_id: int) -> bool:
+            lat, lon = coords.get(node_id, (None, None))
+            return lat is not None and south <= lat <= north and west <= lon <= east
+
+        # Як і Overpass, беремо лише лінії, у яких хоча б один вузол всередині bbox
+        way_refs = [way for way in way_refs if any(inside(ref) for ref in way[1])]
+
+        # Відношення - якщо хоча б одна лінія-член перетинає bbox; тоді
+        # приходять усі його лінії, навіть поза bbox (як way(r) в Overpass)
+        relations = self._relations_for_ways([way_id for way_id, _, _ in way_refs])
+        member_ids = {member["ref"] for _, relation_members, _ in relations
+                      for member in relation_members if member["type"] == "way"}
+        member_ways = self._ways(member_ids - {way_id for way_id, _, _ in way_refs})
+        way_refs += member_ways
+        coords.update(self._node_coords({ref for _, refs, _ in member_ways for ref in refs} - coords.keys()))
+
+        elements: List[dict] = [
+            {"type": "way", "id": way_id, "nodes": refs, **({"tags": tags} if tags else {})}
+            for way_id, refs, tags in way_refs
+        ]
+        elements += [
+            {"type": "relation", "id": relation_id, "members": relation_members, "tags": tags}
+            for relation_id, relation_members, tags in relations
+        ]
+        elements += [
+            {"type": "node", "id": node_id, "lat": lat, "lon": lon, "tags": json.loads(tags)}
+            for node_id, lat, lon, tags in tagged_nodes
+        ]
+        used = {ref for _, refs, _ in way_refs for ref in refs}
+        elements += [
+            {"type": "node", "id": node_id, "lat": lat, "lon": lon}
+            for node_id, (lat, lon) in sorted(coords.items()) if node_id in used
+        ]
+        return {"elements": elements}
+
+    def _relations_for_ways(self, way_ids: List[int]) -> List[tuple]:
+        if not self._relations_imported():
+            return []
+        relation_ids = set()
+        for start in range(0, len(way_ids), 900):
+            chunk = way_ids[start:start + 900]
+            relation_ids.update(row[0] for row in self.connection.execute(
+                f"SELECT relation_id FROM relation_ways WHERE way_id IN ({','.join('?' * len(chunk))})", chunk
+            ))
+        return [(relation_id, json.loads(members), json.loads(tags))
+                for relation_id, members, tags in self._rows_by_id("relations", "id, members, tags", relation_ids)]
+
+    def _ways(self, way_ids: set) -> List[tuple]:
+        return [(way_id, json.loads(refs), json.loads(tags))
+                for way_id, refs, tags in self._rows_by_id("ways", "id, nodes, tags", way_ids)]
+
+    def _rows_by_id(self, table: str, columns: str, ids: set) -> List[tuple]:
+        rows = []
+        ids = sorted(ids)
+        for start in range(0, len(ids), 900):
+            chunk = ids[start:start + 900]
+            rows += self.connection.execute(
+                f"SELECT {columns} FROM {table} WHERE id IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+        return rows
+
+    def _relations_imported(self) -> bool:
+        # База, імпортована до підтримки відношень, не має таблиці relations:
+        # мультиполігональні парки, ліси і водойми тоді просто відсутні
+        if self._has_relations is None:
+            self._has_relations = self.connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'relation_ways'"
+            ).fetchone() is not None
+            if not self._has_relations:
+                logger.warning(f"Local OSM store {self.db_path} has no relations - multipolygon green and "
+                               f"water areas are missing; re-import the extract to include them")
+        return self._has_relations
+
+    def _node_coords(self, node_ids: set) -> dict:
+        coords = {}
+        ids = list(node_ids)
+        for start in range(0, len(ids), 900):
+            chunk = ids[start:start + 900]
+            rows = self.connection.execute(
+                f"SELECT id, lat, lon FROM nodes WHERE id IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            coords.update((node_id, (lat, lon)) for node_id, lat, lon in rows)
+        return coords
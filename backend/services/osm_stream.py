@@ -0,0 +1,91 @@
+from typing import Iterable, Iterator, Union
+import codecs
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+ELEMENTS_START = re.compile(r'"elements"\s*:\s*\[')
+WHITESPACE = re.compile(r'[\s,]*')
+
+
+class OverpassStreamParser:
+    # Інкрементальний розбір відповіді Overpass: елементи масиву "elements"
+    # декодуються по одному, тож у пам'яті тримається лише поточний шматок
+    # тексту, а не вся відповідь і не весь список елементів
+    def __init__(self):
+        self.meta = {}
+        self.element_count = 0
+        self._decoder = json.JSONDecoder()
+
+    def iter_elements(self, chunks: Iterable[Union[bytes, str]]) -> Iterator[dict]:
+        utf8 = codecs.getincrementaldecoder('utf-8')()
+        chunks = iter(chunks)
+        buffer = ''
+        position = 0
+        exhausted = False
+
+        def read_more() -> bool:
+            # Перед дочитуванням відкидаємо вже розібраний префікс буфера
+            nonlocal buffer, position, exhausted
+            buffer, position = buffer[position:], 0
+            for chunk in chunks:
+                if chunk:
+                    buffer += utf8.decode(chunk) if isinstance(chunk, bytes) else chunk
+                    return True
+            buffer += utf8.decode(b'', final=True)
+            exhausted = True
+            return False
+
+        match = ELEMENTS_START.search(buffer)
+        while match is None:
+            if not read_more():
+                raise ValueError("Overpass response has no elements array")
+            match = ELEMENTS_START.search(buffer)
+
+        header = buffer[:match.start()]
+        position = match.end()
+
+        while True:
+            position = WHITESPACE.match(buffer, position).end()
+            if position >= len(buffer):
+                if not read_more():
+                    raise ValueError("Overpass response ended inside the elements array")
+                continue
+
+            if buffer[position] == ']':
+                position += 1
+                break
+
+            try:
+                element, end = self._decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # Елемент розірваний між шматками - дочитуємо і пробуємо знову
+                if exhausted:
+                    raise
+                read_more()
+                continue
+
+            self.element_count += 1
+            yield element
+            position = end
+
+        while read_more():
+            pass
+        self.meta = self._parse_meta(header, buffer)
+        if self.meta.get("remark"):
+            logger.warning(f"Overpass remark: {self.meta['remark']}")
+
+    def _parse_meta(self, header: str, tail: str) -> dict:
+        try:
+            meta = json.loads(f'{header}"elements": []{tail}')
+            meta.pop("elements", None)
+            return meta
+        except json.JSONDecodeError:
+            logger.warning("Could not parse Overpass response metadata")
+            return {}
+
+
+def iter_osm_elements(chunks: Iterable[Union[bytes, str]]) -> Iterator[dict]:
+    return OverpassStreamParser().iter_elements(chunks)
@@ -0,0 +1,201 @@
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, List, Optional
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENDPOINTS = [
+    "https://overpass-api.de/api/interpreter",
+    "https://overpass.kumi.systems/api/interpreter",
+    "https://overpass.private.coffee/api/interpreter"
+]
+
+# Відповіді, після яких варто повторити запит (можливо, на іншому сервері)
+RETRY_STATUSES = {429, 502, 503}
+
+
+class OverpassUnavailable(Exception):
+    pass
+
+
+class CircuitBreaker:
+    # Після failure_threshold помилок поспіль сервер вимикається на reset_timeout
+    # секунд; потім пропускається один пробний запит (half-open)
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probe_in_flight or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self._probe_in_flight = False
+
+
+class OverpassClient:
+    def __init__(self, endpoints: Optional[List[str]] = None, timeout: float = 30,
+                 max_retries: int = 4, backoff_base: float = 1.0, backoff_max: float = 30.0,
+                 failure_threshold: int = 5, reset_timeout: float = 60.0, pool_size: int = 8,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.endpoints = list(endpoints or DEFAULT_ENDPOINTS)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.sleep = sleep
+        self.breakers: Dict[str, CircuitBreaker] = {
+            url: CircuitBreaker(failure_threshold, reset_timeout) for url in self.endpoints
+        }
+
+        # Одна сесія з пулом keep-alive з'єднань на всі запити процесу
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self.endpoints), pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Accept-Encoding": "gzip, deflate",
+            "User-Agent": "UrbanFlow/1.0"
+        })
+
+    @classmethod
+    def from_settings(cls) -> 'OverpassClient':
+        from django.conf import settings
+        return cls(
+            endpoints=getattr(settings, 'OVERPASS_ENDPOINTS', None),
+            timeout=getattr(settings, 'OVERPASS_TIMEOUT', 30),
+            max_retries=getattr(settings, 'OVERPASS_MAX_RETRIES', 4),
+            backoff_base=getattr(settings, 'OVERPASS_BACKOFF_BASE', 1.0),
+            backoff_max=getattr(settings, 'OVERPASS_BACKOFF_MAX', 30.0),
+            failure_threshold=getattr(settings, 'OVERPASS_BREAKER_THRESHOLD', 5),
+            reset_timeout=getattr(settings, 'OVERPASS_BREAKER_RESET', 60.0),
+            pool_size=getattr(settings, 'OSM_FETCH_WORKERS', 4) * 2
+        )
+
+    def post(self, query: str, stream: bool = False) -> requests.Response:
+        last_error = None
+
+        for attempt in range(self.max_retries + 1):
+            retry_after = 0.0
+            tried = False
+            for url in self.endpoints:
+                # allow() перевіряється лише перед справжнім запитом: пробний
+                # запит half-open сервера має завершитися успіхом або помилкою
+                breaker = self.breakers[url]
+                if not breaker.allow():
+                    continue
+                tried = True
+                try:
+                    response = self.session.post(url, data=query, timeout=self.timeout, stream=stream)
+                except requests.ConnectionError as e:
+                    logger.warning(f"Overpass endpoint {url} is unreachable: {e}")
+                    breaker.record_failure()
+                    last_error = e
+                    continue
+                except requests.Timeout:
+                    # Сервер живий, але запит заважкий - вирішує викликач (ділить bbox)
+                    breaker.record_success()
+                    raise
+                except requests.RequestException as e:
+                    logger.warning(f"Overpass request to {url} failed: {e}")
+                    breaker.record_failure()
+                    last_error = e
+                    continue
+
+                if response.status_code not in RETRY_STATUSES:
+                    breaker.record_success()
+                    return response
+
+                retry_after = max(retry_after, self._retry_after(response))
+                if response.status_code == 429:
+                    # Обмеження частоти - не ознака несправного сервера
+                    breaker.record_success()
+                else:
+                    breaker.record_failure()
+                last_error = f"HTTP {response.status_code} from {url}"
+                logger.warning(f"Overpass endpoint {url} answered {response.status_code}")
+                response.close()
+
+            if not tried:
+                raise OverpassUnavailable(f"All Overpass endpoints are unavailable: {last_error}")
+            if retry_after > self.backoff_max:
+                raise OverpassUnavailable(f"Overpass asked to retry after {retry_after:.0f}s")
+            if attempt < self.max_retries:
+                self.sleep(self._backoff(attempt, retry_after))
+
+        raise OverpassUnavailable(f"Overpass request failed after {self.max_retries + 1} attempts: {last_error}")
+
+    def _backoff(self, attempt: int, retry_after: float = 0.0) -> float:
+        # Експоненційна затримка з повним джитером, але не менша за Retry-After
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        return max(delay, retry_after)
+
+    @staticmethod
+    def _retry_after(response: requests.Response) -> float:
+        value = response.headers.get("Retry-After")
+        if not value:
+            return 0.0
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return 0.0
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_overpass_client() -> OverpassClient:
+    global _client
+    with _client_lock:
+        if _client is None:
+            try:
+                _client = OverpassClient.from_settings()
+            except Exception as e:
+                logger.warning(f"Using default Overpass client settings: {e}")
+                _client = OverpassClient()
+        return _client
@@ -0,0 +1,224 @@
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+import cProfile
+import logging
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+# tracemalloc один на процес: пам'ять профілюється одним запитом за раз,
+# інакше паралельні запити зупиняють трасування і скидають пік один одному.
+# Замок тримається весь аналіз разом із запитом до Overpass, тому інший
+# запит чекає не довше memory_wait секунд і далі йде без профілю пам'яті
+_memory_profile_lock = threading.Lock()
+
+
+class StageTimer:
+    # Збирає час (стіна і CPU потоку), лічильники елементів і, якщо увімкнено
+    # tracemalloc, пік виділеної пам'яті для кожного етапу аналізу
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.stages: Dict[str, dict] = {}
+        self.counts: Dict[str, int] = {}
+        self.peak_memory = 0
+        self._started = time.perf_counter()
+
+    def run(self, name: str, func: Callable, *args, **kwargs):
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            memory_before, peak = tracemalloc.get_traced_memory()
+            self.peak_memory = max(self.peak_memory, peak)
+            tracemalloc.reset_peak()
+
+        wall_started = time.perf_counter()
+        cpu_started = time.thread_time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stage = self.stages.setdefault(name, {"wall_ms": 0.0, "cpu_ms": 0.0, "calls": 0})
+            stage["wall_ms"] += (time.perf_counter() - wall_started) * 1000
+            stage["cpu_ms"] += (time.thread_time() - cpu_started) * 1000
+            stage["calls"] += 1
+            if tracing:
+                peak = tracemalloc.get_traced_memory()[1]
+                self.peak_memory = max(self.peak_memory, peak)
+                stage["peak_kb"] = max(stage.get("peak_kb", 0.0), (peak - memory_before) / 1024)
+
+    def count(self, name: str, value: int):
+        self.counts[name] = int(value)
+
+    @property
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self._started) * 1000
+
+    def to_dict(self) -> dict:
+        stages = {}
+        for name, stage in self.stages.items():
+            stages[name] = {key: round(value, 3) if isinstance(value, float) else value
+                            for key, value in stage.items()}
+        return {
+            "total_ms": round(self.total_ms, 3),
+            "stages": stages,
+            "counts": dict(self.counts),
+            **({"peak_memory_kb": round(self.peak_memory / 1024, 1)} if self.trace_memory else {})
+        }
+
+    def log(self, label: str = ""):
+        slowest = sorted(self.stages.items(), key=lambda item: -item[1]["wall_ms"])[:5]
+        summary = ", ".join(f"{name}={stage['wall_ms']:.1f}ms" for name, stage in slowest)
+        logger.info(f"Analysis {label} took {self.total_ms:.1f}ms ({summary}); counts={self.counts}")
+
+
+class SamplingProfiler:
+    # Періодично знімає стек цільового потоку і рахує, в яких функціях він
+    # перебуває; накладні витрати не залежать від кількості викликів
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples = Counter()
+        self.leaf_samples = Counter()
+        self.sample_count = 0
+        self._target = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._target = threading.get_ident()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, name='analysis-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+
+            self.sample_count += 1
+            self.leaf_samples[self._describe(frame)] += 1
+            seen = set()
+            while frame is not None:
+                name = self._describe(frame)
+                if name not in seen:
+                    seen.add(name)
+                    self.samples[name] += 1
+                frame = frame.f_back
+
+    @staticmethod
+    def _describe(frame) -> str:
+        code = frame.f_code
+        return f"{code.co_filename}:{code.co_firstlineno}({code.co_name})"
+
+
+class AnalysisProfiler:
+    MODES = ('cprofile', 'sampling', 'memory')
+
+    def __init__(self, mode: str, top: int = 25, memory_wait: float = 5.0):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown profile mode: {mode}")
+        self.mode = mode
+        self.top = top
+        self.memory_wait = memory_wait
+        self._profile = None
+        self._sampler = None
+        self._snapshot = None
+        self._started_tracing = False
+        self._memory_locked = False
+
+    @property
+    def traces_memory(self) -> bool:
+        return self._memory_locked
+
+    def __enter__(self) -> 'AnalysisProfiler':
+        if self.mode == 'cprofile':
+            self._profile = cProfile.Profile()
+            try:
+                self._profile.enable()
+            except ValueError as e:
+                # Інший профайлер уже активний (паралельний запит)
+                logger.warning(f"cProfile is unavailable: {e}")
+                self._profile = None
+        elif self.mode == 'sampling':
+            self._sampler = SamplingProfiler()
+            self._sampler.start()
+        else:
+            self._memory_locked = _memory_profile_lock.acquire(timeout=self.memory_wait)
+            if not self._memory_locked:
+                logger.warning("Memory profile is busy with another request, profiling skipped")
+            elif not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._profile:
+            self._profile.disable()
+        if self._sampler:
+            self._sampler.stop()
+        if self._memory_locked:
+            try:
+                self._snapshot = tracemalloc.take_snapshot()
+                if self._started_tracing:
+                    tracemalloc.stop()
+            finally:
+                self._memory_locked = False
+                _memory_profile_lock.release()
+        return False
+
+    def report(self) -> dict:
+        if self.mode == 'cprofile':
+            entries = self._cprofile_entries()
+        elif self.mode == 'sampling':
+            entries = self._sampling_entries()
+        else:
+            entries = self._memory_entries()
+        return {"mode": self.mode, "top": entries}
+
+    def _cprofile_entries(self) -> List[dict]:
+        if self._profile is None:
+            return []
+        stats = pstats.Stats(self._profile)
+        rows = sorted(stats.stats.items(), key=lambda item: -item[1][3])[:self.top]
+        return [{
+            "function": f"{filename}:{line}({name})",
+            "calls": calls,
+            "total_ms": round(total * 1000, 3),
+            "cumulative_ms": round(cumulative * 1000, 3)
+        } for (filename, line, name), (_, calls, total, cumulative, _) in rows]
+
+    def _sampling_entries(self) -> List[dict]:
+        total = max(self._sampler.sample_count, 1)
+        return [{
+            "function": name,
+            "samples": samples,
+            "self_samples": self._sampler.leaf_samples.get(name, 0),
+            "percent": round(samples * 100 / total, 1)
+        } for name, samples in self._sampler.samples.most_common(self.top)]
+
+    def _memory_entries(self) -> List[dict]:
+        if self._snapshot is None:
+            return []
+        stats = self._snapshot.statistics('lineno')[:self.top]
+        return [{
+            "location": str(stat.traceback),
+            "size_kb": round(stat.size / 1024, 1),
+            "blocks": stat.count
+        } for stat in stats]
+
+
+def profiler_from_header(value: Optional[str], enabled: bool) -> Optional[AnalysisProfiler]:
+    if not enabled or not value:
+        return None
+    mode = value.strip().lower()
+    if mode not in AnalysisProfiler.MODES:
+        logger.warning(f"Ignoring unknown analysis profile mode: {value}")
+        return None
+    return AnalysisProfiler(mode)
@@ -0,0 +1,54 @@
+from typing import Iterable, List, Optional, Union
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Великі списки результату: у відповідь потрапляють лише на вимогу, решту
+# можна дочитати сторінками за result_token
+DETAIL_FIELDS = ("roads_data", "green_spaces_data", "water_features_data", "buildings_data")
+
+DETAIL_LEVELS = ("full", "summary")
+
+# Ознаки неповних даних повертаються завжди, навіть коли fields їх не містить
+STATUS_FIELDS = ("incomplete", "warnings")
+
+
+def parse_fields(value: Union[str, Iterable[str], None]) -> Optional[List[str]]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(",")
+    fields = [field.strip() for field in value if field and field.strip()]
+    return fields or None
+
+
+def project_results(results: dict, fields: Optional[List[str]] = None, detail: Optional[str] = None) -> dict:
+    # fields - явний перелік ключів верхнього рівня; detail=summary - усе,
+    # крім великих списків, замість яких віддається лише їх довжина
+    detail = detail or "full"
+    if detail not in DETAIL_LEVELS:
+        raise ValueError(f"Unknown detail level: {detail}")
+
+    if fields is not None:
+        fields = list(fields) + [field for field in STATUS_FIELDS if field not in fields]
+        return {field: results[field] for field in fields if field in results}
+    if detail == "full":
+        return results
+
+    projected = {key: value for key, value in results.items() if key not in DETAIL_FIELDS}
+    projected["detail_counts"] = {field: len(results[field]) for field in DETAIL_FIELDS if field in results}
+    return projected
+
+
+def paginate(items: list, offset: int, limit: int) -> dict:
+    if offset < 0 or limit <= 0:
+        raise ValueError("offset must be >= 0 and limit > 0")
+    page = items[offset:offset + limit]
+    next_offset = offset + len(page)
+    return {
+        "total": len(items),
+        "offset": offset,
+        "limit": limit,
+        "items": page,
+        "next_offset": next_offset if next_offset < len(items) else None
+    }
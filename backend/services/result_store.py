@@ -0,0 +1,64 @@
+from collections import OrderedDict
+from typing import Optional, Tuple
+import hashlib
+import threading
+import time
+
+BBoxKey = Tuple[float, float, float, float]
+
+
+class AnalysisResultStore:
+    # Короткоживуче сховище результатів аналізу в пам'яті процесу: ключ -
+    # нормалізований bbox разом з версією аналізатора, витіснення LRU + TTL
+    def __init__(self, max_entries: int = 256, ttl: int = 15 * 60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_token(bbox: BBoxKey, version: str) -> str:
+        key = f"{version}|{','.join(f'{value:.5f}' for value in bbox)}"
+        return hashlib.sha1(key.encode()).hexdigest()[:24]
+
+    def put(self, bbox: BBoxKey, version: str, result: dict) -> str:
+        token = self.make_token(bbox, version)
+        with self._lock:
+            self._entries[token] = (time.time(), result)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return token
+
+    def get(self, token: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+
+            stored_at, result = entry
+            if time.time() - stored_at > self.ttl:
+                del self._entries[token]
+                return None
+
+            self._entries.move_to_end(token)
+            return result
+
+    def find(self, bbox: BBoxKey, version: str) -> Optional[dict]:
+        return self.get(self.make_token(bbox, version))
+
+
+_result_store = None
+_result_store_lock = threading.Lock()
+
+
+def get_result_store() -> AnalysisResultStore:
+    global _result_store
+    with _result_store_lock:
+        if _result_store is None:
+            from django.conf import settings
+            _result_store = AnalysisResultStore(
+                max_entries=getattr(settings, 'ANALYSIS_RESULT_STORE_SIZE', 256),
+                ttl=getattr(settings, 'ANALYSIS_RESULT_TTL', 15 * 60)
+            )
+        return _result_store
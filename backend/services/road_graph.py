@@ -0,0 +1,284 @@
+from concurrent.futures import ProcessPoolExecutor
+from heapq import heappop, heappush
+from typing import List, Optional, Sequence, Tuple
+import logging
+import math
+import multiprocessing
+
+import numpy as np
+
+from .distance import segment_lengths
+from .spatial_index import SegmentGridIndex
+
+logger = logging.getLogger(__name__)
+
+# Швидкість за замовчуванням (км/год), якщо в дорозі немає maxspeed
+DEFAULT_SPEEDS = {
+    "motorway": 90, "motorway_link": 60,
+    "trunk": 70, "trunk_link": 50,
+    "primary": 50, "primary_link": 40,
+    "secondary": 50, "secondary_link": 40,
+    "tertiary": 40, "tertiary_link": 30,
+    "unclassified": 40, "residential": 30,
+    "service": 20, "living_street": 10
+}
+DEFAULT_SPEED = 30
+
+# Дороги, якими не їздять автомобілі, у граф не потрапляють
+NON_MOTOR_TYPES = {
+    "pedestrian", "footway", "path", "steps", "walkway", "cycleway", "bridleway", "corridor", "track"
+}
+
+# Пішохідний граф: усі дороги, крім автомагістралей, без одностороннього руху
+NON_WALK_TYPES = {"motorway", "motorway_link", "trunk", "trunk_link"}
+
+# Мінімальна вага ребра, щоб ребра нульової довжини не давали нескінченних нічиїх
+MIN_EDGE_SECONDS = 1e-3
+
+
+class RoadGraph:
+    # Орієнтований граф доріг у форматі CSR: ребра вершини v - це
+    # targets[indptr[v]:indptr[v + 1]]. Вершини - перехрестя і кінці доріг,
+    # проміжні точки лінії згортаються в одне ребро
+    def __init__(self, node_ids: np.ndarray, indptr: np.ndarray, sources: np.ndarray, targets: np.ndarray,
+                 lengths: np.ndarray, seconds: np.ndarray, lanes: np.ndarray, roads: np.ndarray,
+                 lat: Optional[np.ndarray] = None, lon: Optional[np.ndarray] = None):
+        self.node_ids = node_ids
+        self.indptr = indptr
+        self.sources = sources
+        self.targets = targets
+        self.lengths = lengths
+        self.seconds = seconds
+        self.lanes = lanes
+        self.roads = roads
+        self.lat = lat if lat is not None else np.full(len(node_ids), np.nan)
+        self.lon = lon if lon is not None else np.full(len(node_ids), np.nan)
+        self._vertex_index = None
+
+    @property
+    def vertex_count(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.targets)
+
+    @classmethod
+    def from_roads(cls, roads: List[dict], osm_index, mode: str = "drive") -> 'RoadGraph':
+        # mode="walk" - пішохідний граф: кожна точка лінії є вершиною (щоб
+        # прив'язувати будинки і зупинки до найближчої точки), рух в обидва боки
+        if mode not in ("drive", "walk"):
+            raise ValueError(f"Unknown road graph mode: {mode}")
+        excluded = NON_MOTOR_TYPES if mode == "drive" else NON_WALK_TYPES
+        positions = [position for position, road in enumerate(roads) if road.get("type") not in excluded]
+        lat, lon, offsets = osm_index.gather_way_coordinates([roads[p] for p in positions], keep_missing=True)
+        refs = np.fromiter((ref for p in positions for ref in roads[p].get("nodes", [])),
+                           dtype=np.int64, count=len(lat))
+        owners = np.repeat(np.arange(len(positions)), np.diff(offsets))
+
+        known = ~np.isnan(lat)
+        if len(refs) < 2:
+            return cls.empty()
+
+        # Відрізок придатний, якщо обидві точки відомі і належать одній дорозі
+        valid = (owners[:-1] == owners[1:]) & known[:-1] & known[1:]
+        lengths_km = segment_lengths(lat, lon, offsets)
+
+        # Вершина - точка, спільна для кількох доріг або присутня двічі в одній,
+        # а також кінець придатного ланцюжка відрізків
+        unique_refs, inverse, counts = np.unique(refs, return_inverse=True, return_counts=True)
+        is_vertex = counts[inverse] >= 2
+        is_vertex[:-1] |= valid & ~np.concatenate(([False], valid[:-1]))
+        is_vertex[1:] |= valid & ~np.concatenate((valid[1:], [False]))
+        if mode == "walk":
+            is_vertex[:] = True
+        is_vertex &= known
+
+        vertex_positions = np.flatnonzero(is_vertex)
+        if len(vertex_positions) < 2:
+            return cls.empty()
+
+        # Ребро - між сусідніми вершинами однієї дороги без розривів між ними
+        start, end = vertex_positions[:-1], vertex_positions[1:]
+        invalid_before = np.concatenate(([0], np.cumsum(~valid)))
+        length_before = np.concatenate(([0.0], np.cumsum(np.where(valid, lengths_km, 0.0))))
+        connected = (owners[start] == owners[end]) & (invalid_before[end] == invalid_before[start])
+        start, end = start[connected], end[connected]
+        edge_km = length_before[end] - length_before[start]
+        edge_roads = np.asarray(positions, dtype=np.int64)[owners[start]]
+
+        vertex_refs, first_position, vertex_index = np.unique(refs[vertex_positions], return_index=True,
+                                                              return_inverse=True)
+        vertex_of = np.full(len(refs), -1, dtype=np.int64)
+        vertex_of[vertex_positions] = vertex_index
+        tails, heads = vertex_of[start], vertex_of[end]
+
+        speeds = np.array([roads[p].get("max_speed") or DEFAULT_SPEEDS.get(roads[p].get("type"), DEFAULT_SPEED)
+                           for p in range(len(roads))], dtype=np.float64)
+        lanes = np.array([max(int(roads[p].get("lanes") or 1), 1) for p in range(len(roads))], dtype=np.int64)
+        oneway = np.array([mode == "drive" and bool(roads[p].get("oneway")) for p in range(len(roads))], dtype=bool)
+
+        two_way = ~oneway[edge_roads]
+        all_tails = np.concatenate((tails, heads[two_way]))
+        all_heads = np.concatenate((heads, tails[two_way]))
+        all_km = np.concatenate((edge_km, edge_km[two_way]))
+        all_roads = np.concatenate((edge_roads, edge_roads[two_way]))
+
+        order = np.argsort(all_tails, kind="stable")
+        all_tails, all_heads, all_km, all_roads = (a[order] for a in (all_tails, all_heads, all_km, all_roads))
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(all_tails, minlength=len(vertex_refs))))).astype(np.int64)
+        seconds = np.maximum(all_km / speeds[all_roads] * 3600.0, MIN_EDGE_SECONDS)
+
+        vertex_positions = vertex_positions[first_position]
+        return cls(vertex_refs, indptr, all_tails, all_heads, all_km * 1000.0, seconds, lanes[all_roads], all_roads,
+                   lat=lat[vertex_positions], lon=lon[vertex_positions])
+
+    @classmethod
+    def empty(cls) -> 'RoadGraph':
+        empty_int = np.zeros(0, dtype=np.int64)
+        return cls(empty_int, np.zeros(1, dtype=np.int64), empty_int, empty_int,
+                   np.zeros(0), np.zeros(0), empty_int, empty_int)
+
+    def nearest_vertices(self, lat: np.ndarray, lon: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Найближча вершина графа і відстань до неї в метрах
+        if self._vertex_index is None:
+            self._vertex_index = SegmentGridIndex.from_polylines(self.lat, self.lon,
+                                                                 np.arange(self.vertex_count + 1))
+        distances, vertices = self._vertex_index.nearest(lat, lon)
+        return vertices, distances * 1000.0
+
+    def adjacency(self) -> Tuple[List[int], List[int], List[int], List[float]]:
+        # Списки Python для внутрішнього циклу Дейкстри швидші за індексацію numpy
+        return self.indptr.tolist(), self.sources.tolist(), self.targets.tolist(), self.seconds.tolist()
+
+
+def _brandes_edge_betweenness(adjacency, vertex_count: int, sources: Sequence[int]) -> Tuple[np.ndarray, int]:
+    # Алгоритм Брандеса для зважених графів: найкоротші шляхи (за часом) з
+    # кожного джерела до всіх вершин, потім зворотне накопичення залежностей
+    indptr, tails, heads, weights = adjacency
+    betweenness = [0.0] * len(heads)
+    pairs = 0
+    infinity = math.inf
+    push, pop = heappush, heappop
+
+    for source in sources:
+        distance = [infinity] * vertex_count
+        sigma = [0] * vertex_count
+        predecessors = {}
+        settled = []
+        distance[source] = 0.0
+        sigma[source] = 1
+        heap = [(0.0, source)]
+
+        while heap:
+            current, vertex = pop(heap)
+            if current > distance[vertex]:
+                continue
+            settled.append(vertex)
+            paths = sigma[vertex]
+            for edge in range(indptr[vertex], indptr[vertex + 1]):
+                head = heads[edge]
+                candidate = current + weights[edge]
+                known = distance[head]
+                if candidate < known - 1e-9:
+                    distance[head] = candidate
+                    sigma[head] = paths
+                    predecessors[head] = [edge]
+                    push(heap, (candidate, head))
+                elif candidate <= known + 1e-9 and head != source:
+                    sigma[head] += paths
+                    predecessors[head].append(edge)
+
+        pairs += len(settled) - 1
+        delta = [0.0] * vertex_count
+        for vertex in reversed(settled):
+            edges = predecessors.get(vertex)
+            if edges is None:
+                continue
+            coefficient = (1.0 + delta[vertex]) / sigma[vertex]
+            for edge in edges:
+                tail = tails[edge]
+                contribution = sigma[tail] * coefficient
+                betweenness[edge] += contribution
+                delta[tail] += contribution
+
+    return np.asarray(betweenness, dtype=np.float64), pairs
+
+
+_worker_state = None
+
+
+def _init_worker(adjacency, vertex_count: int):
+    global _worker_state
+    _worker_state = (adjacency, vertex_count)
+
+
+def _betweenness_chunk(sources: List[int]) -> Tuple[np.ndarray, int]:
+    adjacency, vertex_count = _worker_state
+    return _brandes_edge_betweenness(adjacency, vertex_count, sources)
+
+
+class RoadLoadEstimator:
+    # Оцінка навантаження доріг за вибірковою реберною центральністю:
+    # частка найкоротших маршрутів між вибраними джерелами і всіма вершинами,
+    # що проходить через ребро. Для великих графів джерела діляться між процесами
+    def __init__(self, samples: int = 64, workers: int = 1, parallel_min_edges: int = 20000, seed: int = 0):
+        self.samples = samples
+        self.workers = workers
+        self.parallel_min_edges = parallel_min_edges
+        self.seed = seed
+
+    @classmethod
+    def from_settings(cls) -> 'RoadLoadEstimator':
+        try:
+            from django.conf import settings
+            return cls(
+                samples=getattr(settings, 'ROAD_GRAPH_SAMPLES', 64),
+                workers=getattr(settings, 'ROAD_GRAPH_WORKERS', 1),
+                parallel_min_edges=getattr(settings, 'ROAD_GRAPH_PARALLEL_MIN_EDGES', 20000)
+            )
+        except Exception as e:
+            logger.warning(f"Using default road load settings: {e}")
+            return cls()
+
+    def sample_sources(self, graph: RoadGraph) -> List[int]:
+        count = min(self.samples, graph.vertex_count)
+        rng = np.random.default_rng(self.seed)
+        return sorted(rng.choice(graph.vertex_count, size=count, replace=False).tolist())
+
+    def edge_shares(self, graph: RoadGraph) -> np.ndarray:
+        if graph.edge_count == 0:
+            return np.zeros(0)
+
+        sources = self.sample_sources(graph)
+        adjacency = graph.adjacency()
+
+        if self.workers > 1 and graph.edge_count >= self.parallel_min_edges and len(sources) >= 2 * self.workers:
+            chunks = [sources[i::self.workers] for i in range(self.workers)]
+            # spawn замість fork: аналіз може працювати у фоновому потоці, а
+            # fork багатопотокового процесу здатен успадкувати захоплені блокування
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(self.workers, mp_context=context, initializer=_init_worker,
+                                     initargs=(adjacency, graph.vertex_count)) as pool:
+                results = list(pool.map(_betweenness_chunk, chunks))
+        else:
+            results = [_brandes_edge_betweenness(adjacency, graph.vertex_count, sources)]
+
+        betweenness = np.sum([result[0] for result in results], axis=0)
+        pairs = sum(result[1] for result in results)
+        return betweenness / pairs if pairs else betweenness
+
+    def estimate(self, graph: RoadGraph, road_count: int) -> Tuple[np.ndarray, float]:
+        # Навантаження дороги - найбільша частка маршрутів на її ребрах.
+        # Навантаження мережі - середня за потоком "вузькість" доріг: 100, якщо
+        # всі маршрути йдуть однією смугою, 25 - якщо чотирма
+        shares = self.edge_shares(graph)
+        loads = np.zeros(road_count)
+        if not len(shares):
+            return loads, 0.0
+
+        np.maximum.at(loads, graph.roads, shares)
+        flow = shares * graph.lengths
+        total = flow.sum()
+        network_load = float(100.0 * np.sum(flow / graph.lanes) / total) if total > 0 else 0.0
+        return loads, network_load
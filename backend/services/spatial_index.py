@@ -0,0 +1,169 @@
+from typing import Optional, Tuple
+import numpy as np
+
+from .geometry import lambert_azimuthal_equal_area
+
+
+def point_segment_distance(px: np.ndarray, py: np.ndarray, ax: np.ndarray, ay: np.ndarray,
+                           bx: np.ndarray, by: np.ndarray) -> np.ndarray:
+    dx = bx - ax
+    dy = by - ay
+    length_sq = dx * dx + dy * dy
+    t = np.where(length_sq > 0, ((px - ax) * dx + (py - ay) * dy) / np.where(length_sq > 0, length_sq, 1), 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    return np.hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+class SegmentGridIndex:
+    # Рівномірна сітка над спроєктованими координатами (км). Кожен відрізок
+    # потрапляє в усі клітинки, які перетинає його bbox; пошук іде кільцями
+    # клітинок навколо точки, доки найближчий відрізок не стане гарантованим
+    def __init__(self, ax: np.ndarray, ay: np.ndarray, bx: np.ndarray, by: np.ndarray,
+                 origin: Tuple[float, float], cell_size: Optional[float] = None):
+        self.ax, self.ay, self.bx, self.by = ax, ay, bx, by
+        self.origin = origin
+        self.segment_count = len(ax)
+
+        if self.segment_count == 0:
+            self.cell_size = 1.0
+            self.min_x = self.min_y = 0.0
+            self.nx = self.ny = 0
+            self.cell_keys = np.zeros(0, dtype=np.int64)
+            self.cell_starts = np.zeros(1, dtype=np.int64)
+            self.cell_segments = np.zeros(0, dtype=np.int64)
+            return
+
+        x0 = np.minimum(ax, bx)
+        x1 = np.maximum(ax, bx)
+        y0 = np.minimum(ay, by)
+        y1 = np.maximum(ay, by)
+
+        self.min_x = float(x0.min())
+        self.min_y = float(y0.min())
+        width = max(float(x1.max()) - self.min_x, 1e-6)
+        height = max(float(y1.max()) - self.min_y, 1e-6)
+
+        if cell_size is None:
+            cell_size = max(np.sqrt(width * height / self.segment_count) * 2, 0.01)
+        self.cell_size = cell_size
+        self.nx = int(width // cell_size) + 1
+        self.ny = int(height // cell_size) + 1
+
+        ix0, iy0 = self._cell_of(x0, y0)
+        ix1, iy1 = self._cell_of(x1, y1)
+        spans_x = ix1 - ix0 + 1
+        counts = spans_x * (iy1 - iy0 + 1)
+
+        segment_ids = np.repeat(np.arange(self.segment_count), counts)
+        local = np.arange(len(segment_ids)) - np.repeat(np.cumsum(counts) - counts, counts)
+        cell_x = ix0[segment_ids] + local % spans_x[segment_ids]
+        cell_y = iy0[segment_ids] + local // spans_x[segment_ids]
+        keys = cell_y * self.nx + cell_x
+
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        self.cell_segments = segment_ids[order]
+        self.cell_keys, starts = np.unique(keys, return_index=True)
+        self.cell_starts = np.append(starts, len(keys)).astype(np.int64)
+
+    @classmethod
+    def from_polylines(cls, lat: np.ndarray, lon: np.ndarray, offsets: np.ndarray,
+                       origin: Optional[Tuple[float, float]] = None,
+                       cell_size: Optional[float] = None) -> 'SegmentGridIndex':
+        if origin is None:
+            origin = (float(np.mean(lat)), float(np.mean(lon))) if len(lat) else (0.0, 0.0)
+        x, y = lambert_azimuthal_equal_area(lat, lon, origin[0], origin[1])
+
+        offsets = np.asarray(offsets, dtype=np.int64)
+        sizes = np.diff(offsets)
+        starts = offsets[:-1]
+
+        # Відрізки між сусідніми точками кожної лінії; лінія з однієї точки
+        # стає виродженим відрізком
+        is_last = np.zeros(len(x), dtype=bool)
+        is_last[offsets[1:][sizes > 0] - 1] = True
+        first = np.arange(len(x))[~is_last]
+        single = starts[sizes == 1]
+
+        a = np.concatenate((first, single))
+        b = np.concatenate((first + 1, single))
+        return cls(x[a], y[a], x[b], y[b], origin, cell_size)
+
+    def _cell_of(self, x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        ix = np.floor((x - self.min_x) / self.cell_size).astype(np.int64)
+        iy = np.floor((y - self.min_y) / self.cell_size).astype(np.int64)
+        return ix, iy
+
+    def _ring_offsets(self, radius: int) -> Tuple[np.ndarray, np.ndarray]:
+        if radius == 0:
+            return np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64)
+        span = np.arange(-radius, radius + 1)
+        dx = np.concatenate((span, span, np.full(2 * radius - 1, -radius), np.full(2 * radius - 1, radius)))
+        dy = np.concatenate((np.full(2 * radius + 1, -radius), np.full(2 * radius + 1, radius),
+                             span[1:-1], span[1:-1]))
+        return dx, dy
+
+    def nearest_distance(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        return self.nearest(lat, lon)[0]
+
+    def nearest(self, lat: np.ndarray, lon: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Відстань до найближчого відрізка і його номер (-1, якщо відрізків немає)
+        px, py = lambert_azimuthal_equal_area(np.asarray(lat, dtype=np.float64),
+                                              np.asarray(lon, dtype=np.float64),
+                                              self.origin[0], self.origin[1])
+        best = np.full(len(px), np.inf)
+        best_segment = np.full(len(px), -1, dtype=np.int64)
+        if self.segment_count == 0 or len(px) == 0:
+            return best, best_segment
+
+        qx, qy = self._cell_of(px, py)
+        pending = np.arange(len(px))
+        # Точки поза сіткою починають з кільця, яке вже торкається сітки
+        outside = np.maximum.reduce([-qx, qx - (self.nx - 1), -qy, qy - (self.ny - 1), np.zeros_like(qx)])
+        max_radius = int(outside.max()) + max(self.nx, self.ny)
+
+        radius = 0
+        while len(pending) and radius <= max_radius:
+            active = pending[outside[pending] <= radius]
+            dx, dy = self._ring_offsets(radius)
+
+            cell_x = (qx[active][:, None] + dx[None, :]).ravel()
+            cell_y = (qy[active][:, None] + dy[None, :]).ravel()
+            query_ids = np.repeat(active, len(dx))
+
+            inside = (cell_x >= 0) & (cell_x < self.nx) & (cell_y >= 0) & (cell_y < self.ny)
+            keys = cell_y[inside] * self.nx + cell_x[inside]
+            query_ids = query_ids[inside]
+
+            positions = np.searchsorted(self.cell_keys, keys)
+            positions = np.minimum(positions, len(self.cell_keys) - 1)
+            hit = self.cell_keys[positions] == keys
+            positions = positions[hit]
+            query_ids = query_ids[hit]
+
+            counts = self.cell_starts[positions + 1] - self.cell_starts[positions]
+            if counts.sum():
+                pair_queries = np.repeat(query_ids, counts)
+                local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+                pair_segments = self.cell_segments[np.repeat(self.cell_starts[positions], counts) + local]
+
+                distances = point_segment_distance(
+                    px[pair_queries], py[pair_queries],
+                    self.ax[pair_segments], self.ay[pair_segments],
+                    self.bx[pair_segments], self.by[pair_segments]
+                )
+                # Найближчий кандидат для кожної точки: перший після сортування за (точка, відстань)
+                order = np.lexsort((distances, pair_queries))
+                first = np.ones(len(order), dtype=bool)
+                first[1:] = pair_queries[order][1:] != pair_queries[order][:-1]
+                order = order[first]
+                better = distances[order] < best[pair_queries[order]]
+                order = order[better]
+                best[pair_queries[order]] = distances[order]
+                best_segment[pair_queries[order]] = pair_segments[order]
+
+            # Невідвідані клітинки лежать не ближче ніж radius * cell_size
+            pending = pending[best[pending] > radius * self.cell_size]
+            radius += 1
+
+        return best, best_segment
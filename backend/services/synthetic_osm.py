@@ -0,0 +1,207 @@
+from typing import Dict, List, Optional, Tuple
+import math
+import random
+
+LAYOUTS = ("grid", "organic")
+
+BUILDING_TYPES = [
+    ("apartments", 30), ("house", 20), ("residential", 15), ("commercial", 8),
+    ("retail", 7), ("office", 7), ("industrial", 4), ("school", 2),
+    ("university", 1), ("hospital", 1), ("public", 2), ("yes", 3)
+]
+
+STREET_NAMES = [
+    "Хрещатик", "Шевченка", "Франка", "Лесі Українки", "Сагайдачного",
+    "Грушевського", "Богдана Хмельницького", "Володимирська", "Саксаганського", "Антоновича"
+]
+
+# Приблизна кількість елементів OSM на один квартал сітки: вузол перехрестя,
+# будинок (5 вузлів + лінія) і частка доріг, парків, зупинок тощо
+ELEMENTS_PER_BLOCK = 7.5
+
+
+class SyntheticOSMGenerator:
+    # Детермінований генератор даних у форматі відповіді Overpass: однаковий
+    # seed і параметри дають однаковий набір елементів
+    def __init__(self, seed: int = 0, center: Tuple[float, float] = (50.45, 30.52),
+                 block_size: float = 0.001):
+        self.seed = seed
+        self.center = center
+        self.block_size = block_size
+
+    def generate(self, element_count: int = 10000, layout: str = "grid") -> dict:
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown layout: {layout}")
+
+        rng = random.Random(f"{self.seed}:{layout}:{element_count}")
+        size = self._grid_size(element_count)
+        builder = _ElementBuilder()
+
+        grid = self._street_nodes(rng, builder, size, organic=layout == "organic")
+        self._streets(rng, builder, grid, size, organic=layout == "organic")
+        self._blocks(rng, builder, grid, size)
+
+        return {"version": 0.6, "generator": "synthetic", "elements": builder.elements}
+
+    def bounds(self, element_count: int = 10000) -> Tuple[float, float, float, float]:
+        return self._bounds_for_size(self._grid_size(element_count))
+
+    def _grid_size(self, element_count: int) -> int:
+        return max(2, int(math.sqrt(element_count / ELEMENTS_PER_BLOCK)))
+
+    def _bounds_for_size(self, size: int) -> Tuple[float, float, float, float]:
+        half = size * self.block_size / 2
+        lat, lon = self.center
+        return lat + half, lon - half, lat - half, lon + half
+
+    def _street_nodes(self, rng: random.Random, builder: '_ElementBuilder', size: int,
+                      organic: bool) -> List[List[int]]:
+        north, west, _, _ = self._bounds_for_size(size)
+        jitter = self.block_size * 0.35 if organic else 0.0
+
+        grid = []
+        for row in range(size + 1):
+            grid_row = []
+            for col in range(size + 1):
+                lat = north - row * self.block_size + rng.uniform(-jitter, jitter)
+                lon = west + col * self.block_size + rng.uniform(-jitter, jitter)
+                grid_row.append(builder.node(lat, lon))
+            grid.append(grid_row)
+        return grid
+
+    def _street_class(self, line: int) -> Dict[str, str]:
+        if line % 16 == 0:
+            return {"highway": "primary", "maxspeed": "60", "lanes": "4"}
+        if line % 8 == 0:
+            return {"highway": "secondary", "maxspeed": "50", "lanes": "2"}
+        if line % 4 == 0:
+            return {"highway": "tertiary", "maxspeed": "50"}
+        if line % 7 == 3:
+            return {"highway": "footway"}
+        if line % 11 == 5:
+            return {"highway": "cycleway"}
+        return {"highway": "residential"}
+
+    def _streets(self, rng: random.Random, builder: '_ElementBuilder', grid: List[List[int]],
+                 size: int, organic: bool):
+        lines = [[grid[row][col] for col in range(size + 1)] for row in range(size + 1)]
+        lines += [[grid[row][col] for row in range(size + 1)] for col in range(size + 1)]
+
+        for number, line in enumerate(lines):
+            tags = dict(self._street_class(number % (size + 1)))
+            tags["name"] = f"вулиця {STREET_NAMES[number % len(STREET_NAMES)]} {number}"
+            if tags["highway"] in ("primary", "secondary"):
+                for node_id in line[::2]:
+                    builder.tag_node(node_id, {"highway": "traffic_signals"})
+                if rng.random() < 0.3:
+                    tags["parking:lane"] = "parallel"
+
+            # Вулиця розбивається на лінії по кілька кварталів; в органічному
+            # планування частина відрізків випадає, а між вузлами з'являються вигини
+            chunk = []
+            for position, node_id in enumerate(line):
+                if organic and chunk and rng.random() < 0.12:
+                    self._emit_street(builder, chunk, tags)
+                    chunk = []
+                if organic and chunk:
+                    chunk.extend(self._bend(rng, builder, chunk[-1], node_id))
+                chunk.append(node_id)
+                if len(chunk) >= 10 and position < len(line) - 1:
+                    self._emit_street(builder, chunk, tags)
+                    chunk = [node_id]
+            self._emit_street(builder, chunk, tags)
+
+            if tags["highway"] in ("primary", "secondary", "tertiary"):
+                for node_id in line[1::3]:
+                    lat, lon = builder.coords[node_id]
+                    builder.node(lat + self.block_size * 0.05, lon + self.block_size * 0.05, {
+                        "highway": "bus_stop",
+                        "public_transport": "platform",
+                        "name": f"Зупинка {node_id}"
+                    })
+
+    def _bend(self, rng: random.Random, builder: '_ElementBuilder', start: int, end: int) -> List[int]:
+        if rng.random() < 0.5:
+            return []
+        (lat1, lon1), (lat2, lon2) = builder.coords[start], builder.coords[end]
+        offset = self.block_size * 0.15
+        return [builder.node((lat1 + lat2) / 2 + rng.uniform(-offset, offset),
+                             (lon1 + lon2) / 2 + rng.uniform(-offset, offset))]
+
+    def _emit_street(self, builder: '_ElementBuilder', nodes: List[int], tags: dict):
+        if len(nodes) >= 2:
+            builder.way(nodes, dict(tags))
+
+    def _blocks(self, rng: random.Random, builder: '_ElementBuilder', grid: List[List[int]], size: int):
+        types, weights = zip(*BUILDING_TYPES)
+
+        for row in range(size):
+            for col in range(size):
+                lat1, lon1 = builder.coords[grid[row][col]]
+                lat2, lon2 = builder.coords[grid[row + 1][col + 1]]
+                north, south = max(lat1, lat2), min(lat1, lat2)
+                west, east = min(lon1, lon2), max(lon1, lon2)
+                roll = rng.random()
+
+                if roll < 0.06:
+                    self._polygon(builder, north, west, south, east, 0.1, {
+                        "leisure": rng.choice(["park", "garden"]), "name": f"Сквер {row}-{col}"
+                    })
+                elif roll < 0.08:
+                    self._polygon(builder, north, west, south, east, 0.15, {"natural": "water"})
+                elif roll < 0.10:
+                    self._polygon(builder, north, west, south, east, 0.2, {
+                        "amenity": "parking",
+                        "capacity": str(rng.randint(10, 200)),
+                        "parking": rng.choice(["surface", "surface", "underground"])
+                    })
+                else:
+                    building_type = rng.choices(types, weights)[0]
+                    tags = {"building": building_type, "building:levels": str(rng.randint(1, 16))}
+                    if rng.random() < 0.3:
+                        tags["addr:street"] = STREET_NAMES[(row + col) % len(STREET_NAMES)]
+                    self._polygon(builder, north, west, south, east, rng.uniform(0.15, 0.3), tags)
+
+                if rng.random() < 0.03:
+                    builder.node((north + south) / 2, (west + east) / 2, {"natural": "tree"})
+
+    def _polygon(self, builder: '_ElementBuilder', north: float, west: float, south: float,
+                 east: float, margin: float, tags: dict):
+        dlat = (north - south) * margin
+        dlon = (east - west) * margin
+        corners = [
+            builder.node(north - dlat, west + dlon),
+            builder.node(north - dlat, east - dlon),
+            builder.node(south + dlat, east - dlon),
+            builder.node(south + dlat, west + dlon)
+        ]
+        builder.way(corners + corners[:1], tags)
+
+
+class _ElementBuilder:
+    def __init__(self):
+        self.elements: List[dict] = []
+        self.coords: Dict[int, Tuple[float, float]] = {}
+        self._nodes: Dict[int, dict] = {}
+        self._next_node = 1
+        self._next_way = 1
+
+    def node(self, lat: float, lon: float, tags: Optional[dict] = None) -> int:
+        node_id = self._next_node
+        self._next_node += 1
+        element = {"type": "node", "id": node_id, "lat": round(lat, 7), "lon": round(lon, 7)}
+        if tags:
+            element["tags"] = tags
+        self.elements.append(element)
+        self._nodes[node_id] = element
+        self.coords[node_id] = (element["lat"], element["lon"])
+        return node_id
+
+    def tag_node(self, node_id: int, tags: dict):
+        self._nodes[node_id].setdefault("tags", {}).update(tags)
+
+    def way(self, nodes: List[int], tags: dict) -> int:
+        way_id = self._next_way
+        self._next_way += 1
+        self.elements.append({"type": "way", "id": way_id, "nodes": list(nodes), "tags": tags})
+        return way_id
@@ -7,6 +7,14 @@ document.addEventListener('DOMContentLoaded', function() {
     let rectangle = null;
     let startPoint = null;
     let endPoint = null;
+    let handles = [];
+    let movingSelection = false;
+
+    // Після першого аналізу зміни виділення рахуються інкрементною сесією,
+    // яка довантажує лише нові смуги області
+    let analyzed = false;
+    let sessionId = null;
+    let reanalyzeTimer = null;
 
     map.on('click', function(e) {
         if (!startPoint) {
@@ -31,6 +39,65 @@ document.addEventListener('DOMContentLoaded', function() {
         }).addTo(map);
 
         map.fitBounds(rectangle.getBounds());
+        drawHandles();
+    }
+
+    function drawHandles() {
+        handles.forEach(handle => map.removeLayer(handle));
+
+        // Кути змінюють розмір виділення, центр пересуває його цілком
+        const corner = (getPoint, setPoint) => {
+            const handle = L.marker(getPoint(), { draggable: true }).addTo(map);
+            handle.on('drag', () => {
+                setPoint(handle.getLatLng());
+                updateSelection();
+            });
+            handle.on('dragend', scheduleReanalysis);
+            return handle;
+        };
+
+        const center = L.marker(rectangle.getBounds().getCenter(), { draggable: true }).addTo(map);
+        let previous = center.getLatLng();
+        center.on('dragstart', () => {
+            movingSelection = true;
+            previous = center.getLatLng();
+        });
+        center.on('drag', () => {
+            const current = center.getLatLng();
+            const dLat = current.lat - previous.lat;
+            const dLng = current.lng - previous.lng;
+            startPoint = L.latLng(startPoint.lat + dLat, startPoint.lng + dLng);
+            endPoint = L.latLng(endPoint.lat + dLat, endPoint.lng + dLng);
+            previous = current;
+            updateSelection();
+        });
+        center.on('dragend', () => {
+            movingSelection = false;
+            scheduleReanalysis();
+        });
+
+        handles = [
+            corner(() => startPoint, point => { startPoint = point; }),
+            corner(() => endPoint, point => { endPoint = point; }),
+            center
+        ];
+    }
+
+    function updateSelection() {
+        const bounds = L.latLngBounds(startPoint, endPoint);
+        rectangle.setBounds(bounds);
+        handles[0].setLatLng(startPoint);
+        handles[1].setLatLng(endPoint);
+        if (!movingSelection) {
+            handles[2].setLatLng(bounds.getCenter());
+        }
+        updateCoordinatesDisplay();
+    }
+
+    function scheduleReanalysis() {
+        if (!analyzed) return;
+        clearTimeout(reanalyzeTimer);
+        reanalyzeTimer = setTimeout(analyzeArea, 300);
     }
 
     function updateCoordinatesDisplay() {
@@ -46,8 +113,17 @@ document.addEventListener('DOMContentLoaded', function() {
             map.removeLayer(rectangle);
             rectangle = null;
         }
+        handles.forEach(handle => map.removeLayer(handle));
+        handles = [];
         startPoint = null;
         endPoint = null;
+        analyzed = false;
+        sessionId = null;
+        clearTimeout(reanalyzeTimer);
+
+        const results = document.getElementById('analysis-results');
+        delete results.dataset.resultToken;
+        delete results.dataset.bounds;
     }
 
     document.getElementById('analyze-btn').addEventListener('click', analyzeArea);
@@ -59,31 +135,77 @@ document.addEventListener('DOMContentLoaded', function() {
         }
 
         try {
-            const response = await fetch('/api/analyze/', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                    'X-CSRFToken': getCSRFToken(),
-                },
-                body: JSON.stringify({
-                    nw_lat: startPoint.lat,
-                    nw_lng: startPoint.lng,
-                    se_lat: endPoint.lat,
-                    se_lng: endPoint.lng
-                })
-            });
+            const analysis = analyzed ? await analyzeSession() : await analyzeJob();
+            analyzed = true;
+            displayResults(analysis.results);
+
+            // Токен результату дійсний лише для меж, які рахував сервер, тож при збереженні
+            // надсилаються саме вони, а не округлені координати з екрана
+            const results = document.getElementById('analysis-results');
+            results.dataset.resultToken = analysis.result_token || '';
+            results.dataset.bounds = JSON.stringify(analysis.bounds);
 
+        } catch (error) {
+            console.error('Помилка:', error);
+            alert(`Помилка: ${error.message}`);
+        }
+    }
+
+    function selectionBody(extra) {
+        return JSON.stringify({
+            nw_lat: startPoint.lat,
+            nw_lng: startPoint.lng,
+            se_lat: endPoint.lat,
+            se_lng: endPoint.lng,
+            ...extra
+        });
+    }
+
+    async function postAnalysis(url, extra) {
+        const response = await fetch(url, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': getCSRFToken(),
+            },
+            body: selectionBody(extra)
+        });
+
+        const data = await response.json();
+
+        if (!response.ok) {
+            throw new Error(data.message || 'Помилка сервера');
+        }
+        return data;
+    }
+
+    async function analyzeJob() {
+        const data = await postAnalysis('/api/analyze/jobs/', {});
+        return await waitForJob(data.job_id);
+    }
+
+    async function analyzeSession() {
+        const data = await postAnalysis('/api/analyze/session/', {
+            session_id: sessionId,
+            detail: 'summary'
+        });
+        sessionId = data.session_id;
+        return data;
+    }
+
+    async function waitForJob(jobId) {
+        while (true) {
+            const response = await fetch(`/api/analyze/jobs/${jobId}/?detail=summary`);
             const data = await response.json();
 
-            if (!response.ok) {
+            if (!response.ok || data.job_status === 'failed') {
                 throw new Error(data.message || 'Помилка сервера');
             }
+            if (data.job_status === 'done') {
+                return data;
+            }
 
-            displayResults(data.results);
-
-        } catch (error) {
-            console.error('Помилка:', error);
-            alert(`Помилка: ${error.message}`);
+            await new Promise(resolve => setTimeout(resolve, 1000));
         }
     }
 
@@ -0,0 +1,79 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import gzip
+import json
+import socket
+import threading
+
+
+def closed_port_url() -> str:
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return f"http://127.0.0.1:{port}/api/interpreter"
+
+
+class OverpassStub:
+    # Локальний замінник Overpass API для тестів без доступу до мережі:
+    # відповіді беруться з черги, а коли вона порожня - повертається default
+    def __init__(self, default=None, gzip_responses: bool = True):
+        self.default = default if default is not None else (200, {}, {"elements": []})
+        self.gzip_responses = gzip_responses
+        self.responses = []
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/api/interpreter"
+
+    def queue(self, status: int, body=None, headers=None):
+        self.responses.append((status, headers or {}, body if body is not None else {"elements": []}))
+
+    def __enter__(self) -> 'OverpassStub':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+        return False
+
+    def _next_response(self):
+        with self._lock:
+            return self.responses.pop(0) if self.responses else self.default
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                stub.requests.append({
+                    "query": self.rfile.read(length).decode(),
+                    "headers": dict(self.headers),
+                    "client": self.client_address
+                })
+
+                status, headers, body = stub._next_response()
+                payload = body if isinstance(body, bytes) else json.dumps(body).encode()
+                if stub.gzip_responses and "gzip" in self.headers.get("Accept-Encoding", ""):
+                    payload = gzip.compress(payload)
+                    headers = dict(headers, **{"Content-Encoding": "gzip"})
+
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
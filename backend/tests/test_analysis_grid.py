@@ -0,0 +1,77 @@
+import unittest
+
+import numpy as np
+
+from backend.services.analysis import AreaAnalyzer
+from backend.services.analysis_grid import AnalysisGrid, GridMembership
+from backend.services.benchmark import StaticOSMFetcher
+from backend.services.osm_cache import clip_elements
+from backend.services.osm_index import OSMIndex
+from backend.services.synthetic_osm import SyntheticOSMGenerator
+
+LAYERS = ("congestion", "ecology", "pedestrian_friendly", "public_transport", "road_count")
+
+
+class TestAnalysisGrid(unittest.TestCase):
+    def test_cells_tile_bbox(self):
+        grid = AnalysisGrid(50.46, 30.50, 50.44, 30.53, cell_size_m=500)
+
+        self.assertEqual(grid.shape, (4, 4))
+        self.assertAlmostEqual(grid.cell_bounds(3, 3)[2], 50.44)
+        self.assertAlmostEqual(grid.cell_bounds(3, 3)[3], 30.53)
+        self.assertEqual(grid.locate([50.46, 50.44, 50.449, 50.47, np.nan],
+                                     [30.50, 30.53, 30.516, 30.51, 30.51]).tolist(), [0, 15, 10, -1, -1])
+
+    def test_cell_limit(self):
+        with self.assertRaises(ValueError):
+            AnalysisGrid.from_corners(50.6, 30.3, 50.3, 30.8, cell_size_m=100, max_cells=1000)
+
+    def test_relation_and_way_membership(self):
+        elements = [
+            {"type": "node", "id": 1, "lat": 50.459, "lon": 30.501},
+            {"type": "node", "id": 2, "lat": 50.441, "lon": 30.501},
+            {"type": "node", "id": 3, "lat": 50.459, "lon": 30.529, "tags": {"highway": "bus_stop"}},
+            {"type": "way", "id": 10, "nodes": [1, 2]},
+            {"type": "relation", "id": 20, "tags": {"leisure": "park"}, "members": [
+                {"type": "way", "ref": 10, "role": "outer"},
+                {"type": "node", "ref": 3, "role": "label"}
+            ]}
+        ]
+        grid = AnalysisGrid(50.46, 30.50, 50.44, 30.53, cell_size_m=1000)
+        membership = GridMembership(OSMIndex.from_osm_data({"elements": elements}), grid)
+
+        self.assertEqual(grid.shape, (2, 2))
+        self.assertEqual(membership.count([elements[4]]).tolist(), [[1, 0], [1, 0]])
+        # Вузол приходить разом із відношенням у західні клітинки і власною - у північно-східну
+        self.assertEqual(membership.count([elements[2]]).tolist(), [[1, 1], [1, 0]])
+
+
+class TestGridAnalysis(unittest.TestCase):
+    def setUp(self):
+        generator = SyntheticOSMGenerator(seed=11)
+        self.osm_data = generator.generate(4000, layout="organic")
+        self.osm_data["elements"].append({
+            "type": "relation", "id": 900000, "tags": {"type": "multipolygon", "landuse": "forest"},
+            "members": [{"type": "way", "ref": element["id"], "role": "outer"}
+                        for element in self.osm_data["elements"][-400:] if element["type"] == "way"][:3]
+        })
+        self.assertTrue(self.osm_data["elements"][-1]["members"])
+        self.bounds = generator.bounds(4000)
+        self.analyzer = AreaAnalyzer()
+        self.analyzer.osm_fetcher = StaticOSMFetcher(self.osm_data)
+
+    def test_layers_match_per_cell_analysis(self):
+        north, west, south, east = self.bounds
+        results = self.analyzer.perform_grid_analysis(north, west, south, east, cell_size_m=180)
+        grid = AnalysisGrid(north, west, south, east, cell_size_m=180)
+
+        self.assertEqual((results["rows"], results["columns"]), grid.shape)
+        self.assertGreater(grid.size, 4)
+        for row in range(grid.rows):
+            for column in range(grid.columns):
+                cell = grid.cell_bounds(row, column)
+                clipped = {"elements": clip_elements(self.osm_data["elements"], *cell)}
+                expected = self.analyzer.analyze_osm_data(clipped, *cell)
+                for layer in LAYERS:
+                    self.assertEqual(results["layers"][layer][row][column], expected[layer],
+                                     f"{layer} at {row}, {column}")
@@ -0,0 +1,109 @@
+import unittest
+from unittest.mock import patch
+
+from backend.services.analysis import AreaAnalyzer
+from backend.services import batch as batch_module
+from backend.services.batch import BatchAnalysis, partition_elements, union_bbox
+from backend.services.benchmark import StaticOSMFetcher
+from backend.services.osm_cache import clip_elements
+from backend.services.synthetic_osm import SyntheticOSMGenerator
+
+
+def grid_cells(bounds, rows, columns):
+    north, west, south, east = bounds
+    height = (north - south) / rows
+    width = (east - west) / columns
+    return [
+        (north - row * height, west + column * width, north - (row + 1) * height, west + (column + 1) * width)
+        for row in range(rows) for column in range(columns)
+    ]
+
+
+def element_keys(elements):
+    return sorted((element["type"], element["id"]) for element in elements)
+
+
+class TestPartitionElements(unittest.TestCase):
+    def setUp(self):
+        generator = SyntheticOSMGenerator(seed=3)
+        self.osm_data = generator.generate(3000, layout="organic")
+        self.cells = grid_cells(generator.bounds(3000), 3, 3)
+
+    def test_matches_clip_per_cell(self):
+        elements = self.osm_data["elements"]
+        parts = partition_elements(elements, self.cells)
+
+        self.assertEqual(len(parts), len(self.cells))
+        for cell, part in zip(self.cells, parts):
+            self.assertEqual(element_keys(part), element_keys(clip_elements(elements, *cell)))
+
+    def test_relation_follows_way(self):
+        elements = [
+            {"type": "node", "id": 1, "lat": 50.1, "lon": 30.1},
+            {"type": "node", "id": 2, "lat": 50.1, "lon": 30.2},
+            {"type": "node", "id": 3, "lat": 50.9, "lon": 30.9, "tags": {"amenity": "cafe"}},
+            {"type": "way", "id": 10, "nodes": [1, 2]},
+            {"type": "relation", "id": 20, "members": [
+                {"type": "way", "ref": 10, "role": "outer"},
+                {"type": "node", "ref": 3, "role": "label"}
+            ]}
+        ]
+
+        near, far = partition_elements(elements, [(50.15, 30.0, 50.0, 30.15), (51.0, 30.8, 50.8, 31.0)])
+
+        self.assertEqual(element_keys(near), [("node", 1), ("node", 2), ("node", 3), ("relation", 20), ("way", 10)])
+        self.assertEqual(element_keys(far), [("node", 3)])
+
+    def test_union_bbox(self):
+        self.assertEqual(union_bbox([(2, 0, 1, 1), (1, -1, 0, 0.5)]), (2, -1, 0, 1))
+
+
+class TestBatchAnalysis(unittest.TestCase):
+    def setUp(self):
+        generator = SyntheticOSMGenerator(seed=5)
+        self.osm_data = generator.generate(2000)
+        self.cells = grid_cells(generator.bounds(2000), 2, 2)
+        self.analyzer = AreaAnalyzer()
+        self.analyzer.osm_fetcher = StaticOSMFetcher(self.osm_data)
+
+    def test_serial_matches_single_cell_analysis(self):
+        outcomes = list(self.analyzer.perform_batch_analysis(self.cells, workers=1))
+
+        self.assertEqual([outcome["index"] for outcome in outcomes], [0, 1, 2, 3])
+        for outcome, cell in zip(outcomes, self.cells):
+            self.assertEqual(outcome["status"], "success")
+            clipped = {"elements": clip_elements(self.osm_data["elements"], *cell)}
+            self.assertEqual(outcome["results"], self.analyzer.analyze_osm_data(clipped, *cell))
+
+    def test_process_pool_returns_every_cell(self):
+        batch = BatchAnalysis(self.analyzer, workers=2, parallel_min_cells=1)
+
+        for _ in range(2):
+            outcomes = list(batch.run(self.cells))
+
+            self.assertEqual(sorted(outcome["index"] for outcome in outcomes), [0, 1, 2, 3])
+            self.assertTrue(all(outcome["status"] == "success" for outcome in outcomes))
+        # Другий пакет іде в той самий пул, без нового запуску воркерів
+        self.assertEqual(list(batch_module._batch_pools), [("backend.services.analysis.AreaAnalyzer", 2)])
+
+    def test_small_batch_skips_process_pool(self):
+        with patch.object(batch_module, 'get_batch_pool') as get_pool:
+            outcomes = list(BatchAnalysis(self.analyzer, workers=2, parallel_min_cells=8).run(self.cells))
+
+        get_pool.assert_not_called()
+        self.assertEqual([outcome["index"] for outcome in outcomes], [0, 1, 2, 3])
+
+    def test_cell_errors_do_not_stop_batch(self):
+        self.analyzer.analyze_osm_data = lambda osm_data, north, west, south, east: 1 / (north - south - 1)
+
+        outcomes = list(BatchAnalysis(self.analyzer, workers=1).run([(51, 30, 50, 31), (50.5, 30, 50, 31)]))
+
+        self.assertEqual([outcome["status"] for outcome in outcomes], ["error", "success"])
+
+    def test_cell_limits(self):
+        batch = BatchAnalysis(self.analyzer, workers=1, max_cells=2)
+
+        with self.assertRaises(ValueError):
+            batch.run([])
+        with self.assertRaises(ValueError):
+            batch.run(self.cells)
@@ -0,0 +1,88 @@
+import unittest
+
+from backend.analysis import AreaAnalyzer
+from backend.services.coverage import CoverageRaster, GreenCoverage, PolygonSet
+from backend.services.osm_index import OSMIndex
+
+BOUNDS = (50.02, 30.0, 50.0, 30.02)
+
+
+def polygon_elements(way_id, corners, tags=None, first_node=None):
+    # Замкнена лінія по заданих кутах
+    first_node = first_node or way_id * 10
+    nodes = [{"type": "node", "id": first_node + i, "lat": lat, "lon": lon} for i, (lat, lon) in enumerate(corners)]
+    way = {"type": "way", "id": way_id, "nodes": [node["id"] for node in nodes] + [first_node]}
+    if tags:
+        way["tags"] = tags
+    return nodes + [way]
+
+
+def rectangle(south, west, north, east):
+    return [(south, west), (north, west), (north, east), (south, east)]
+
+
+class TestCoverageRaster(unittest.TestCase):
+    def coverage(self, elements, resolution_m=10.0, **kwargs):
+        index = OSMIndex.from_osm_data({"elements": elements})
+        polygons = [element for element in elements if element["type"] in ("way", "relation")]
+        raster = CoverageRaster(*BOUNDS, resolution_m=resolution_m, **kwargs)
+        return raster, raster.fill(PolygonSet.from_elements(index, polygons)).mean()
+
+    def test_rectangle_fraction(self):
+        # Чверть bbox
+        _, fraction = self.coverage(polygon_elements(1, rectangle(50.0, 30.0, 50.01, 30.01)))
+
+        self.assertAlmostEqual(fraction, 0.25, delta=0.01)
+
+    def test_triangle_fraction(self):
+        _, fraction = self.coverage(polygon_elements(1, [(50.0, 30.0), (50.02, 30.0), (50.0, 30.02)]))
+
+        self.assertAlmostEqual(fraction, 0.5, delta=0.01)
+
+    def test_overlaps_count_once(self):
+        park = polygon_elements(1, rectangle(50.0, 30.0, 50.01, 30.01))
+        grass = polygon_elements(2, rectangle(50.002, 30.002, 50.008, 30.008))
+        shifted = polygon_elements(3, rectangle(50.0, 30.005, 50.01, 30.015))
+
+        _, fraction = self.coverage(park + grass + shifted)
+
+        self.assertAlmostEqual(fraction, 0.25 * 1.5, delta=0.01)
+
+    def test_multipolygon_hole_is_not_covered(self):
+        outer = polygon_elements(1, rectangle(50.0, 30.0, 50.02, 30.02))
+        inner = polygon_elements(2, rectangle(50.005, 30.005, 50.015, 30.015))
+        relation = {"type": "relation", "id": 5, "tags": {"type": "multipolygon", "leisure": "park"},
+                    "members": [{"type": "way", "ref": 1, "role": "outer"}, {"type": "way", "ref": 2, "role": "inner"}]}
+        elements = outer + inner + [relation]
+        index = OSMIndex.from_osm_data({"elements": elements})
+
+        raster = CoverageRaster(*BOUNDS)
+        fraction = raster.fill(PolygonSet.from_elements(index, [relation])).mean()
+
+        self.assertAlmostEqual(fraction, 0.75, delta=0.01)
+
+    def test_cell_count_is_bounded(self):
+        raster, fraction = self.coverage(polygon_elements(1, rectangle(50.0, 30.0, 50.01, 30.01)),
+                                         resolution_m=1.0, max_cells=10000)
+
+        self.assertLessEqual(raster.rows * raster.columns, 10500)
+        self.assertGreater(raster.resolution_m, 1.0)
+        self.assertAlmostEqual(fraction, 0.25, delta=0.02)
+
+
+class TestGreenCoverage(unittest.TestCase):
+    def test_analyzer_uses_union_and_reports_missing_geometry(self):
+        elements = (polygon_elements(1, rectangle(50.0, 30.0, 50.01, 30.01), {"leisure": "park"})
+                    + polygon_elements(2, rectangle(50.002, 30.002, 50.008, 30.008), {"landuse": "grass"})
+                    + polygon_elements(3, rectangle(50.01, 30.01, 50.02, 30.02), {"natural": "water"})
+                    + [{"type": "way", "id": 4, "nodes": [999, 998], "tags": {"leisure": "park"}}])
+        index = OSMIndex.from_osm_data({"elements": elements})
+
+        analyzer = AreaAnalyzer()
+        analyzer.green_coverage = GreenCoverage(resolution_m=10.0)
+        coverage = analyzer._measure_green_coverage(index, *BOUNDS)
+
+        self.assertAlmostEqual(coverage["green_percent"], 25, delta=1)
+        self.assertAlmostEqual(coverage["water_percent"], 25, delta=1)
+        self.assertEqual(coverage["missing_geometry"], 1)
+        self.assertAlmostEqual(analyzer._get_green_coverage_percent(coverage), 50, delta=2)
@@ -0,0 +1,31 @@
+import unittest
+import numpy as np
+from backend.services.distance import haversine_array, polyline_lengths
+from backend.services.osm_data import haversine
+
+
+class TestDistanceKernels(unittest.TestCase):
+    def test_haversine_array_matches_scalar(self):
+        lon1 = np.array([30.5234, 24.0297, 0.0])
+        lat1 = np.array([50.4501, 49.8397, 0.0])
+        lon2 = np.array([24.0297, 30.5234, 0.0])
+        lat2 = np.array([49.8397, 50.4501, 1.0])
+
+        distances = haversine_array(lon1, lat1, lon2, lat2)
+        for i in range(3):
+            self.assertAlmostEqual(distances[i], haversine(lon1[i], lat1[i], lon2[i], lat2[i]))
+        self.assertAlmostEqual(distances[2], 111.19, delta=0.01)
+
+    def test_polyline_lengths_per_way(self):
+        lat = np.array([0.0, 1.0, 2.0, 10.0, 11.0, 5.0])
+        lon = np.zeros(6)
+        lengths = polyline_lengths(lat, lon, np.array([0, 3, 3, 5, 6]))
+
+        np.testing.assert_allclose(lengths, [2 * 111.19, 0.0, 111.19, 0.0], atol=0.01)
+
+    def test_missing_nodes_break_the_line(self):
+        lat = np.array([0.0, np.nan, 2.0, 3.0])
+        lon = np.zeros(4)
+        lengths = polyline_lengths(lat, lon, np.array([0, 4]))
+
+        self.assertAlmostEqual(lengths[0], 111.19, delta=0.01)
@@ -0,0 +1,88 @@
+import unittest
+
+import numpy as np
+
+from backend.services.analysis import AreaAnalyzer
+from backend.services.feature_geometry import (GeometryBuffer, decode_polyline, decode_polylines, encode_polyline,
+                                               encode_polylines, feature_coordinates)
+from backend.services.neural_network.model_trainer import RoadNetworkTrainer
+from backend.services.osm_index import OSMIndex
+from backend.services.synthetic_osm import SyntheticOSMGenerator
+
+# Приклад з опису формату Encoded Polyline
+REFERENCE_POINTS = [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]]
+REFERENCE_POLYLINE = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+
+
+class TestPolylineEncoding(unittest.TestCase):
+    def test_reference_example(self):
+        self.assertEqual(encode_polyline(REFERENCE_POINTS), REFERENCE_POLYLINE)
+        np.testing.assert_allclose(decode_polyline(REFERENCE_POLYLINE), REFERENCE_POINTS)
+
+    def test_many_lines_round_trip(self):
+        lines = [[[50.45, 30.52], [50.4512, 30.5234], [50.449, 30.519]], [], [[-33.8688, 151.2093]],
+                 REFERENCE_POINTS]
+        lat = np.array([point[0] for line in lines for point in line])
+        lon = np.array([point[1] for line in lines for point in line])
+        offsets = np.concatenate(([0], np.cumsum([len(line) for line in lines])))
+
+        encoded = encode_polylines(lat, lon, offsets)
+        self.assertEqual(encoded[1], "")
+        self.assertEqual(encoded[3], REFERENCE_POLYLINE)
+
+        decoded_lat, decoded_lon, decoded_offsets = decode_polylines(encoded)
+        np.testing.assert_array_equal(decoded_offsets, offsets)
+        np.testing.assert_allclose(decoded_lat, lat, atol=1e-9)
+        np.testing.assert_allclose(decoded_lon, lon, atol=1e-9)
+
+    def test_feature_coordinates(self):
+        self.assertEqual(feature_coordinates({"coordinates": [[1.0, 2.0]]}), [[1.0, 2.0]])
+        np.testing.assert_allclose(feature_coordinates({"polyline": REFERENCE_POLYLINE}), REFERENCE_POINTS)
+        self.assertEqual(feature_coordinates({"polyline": ""}), [])
+
+
+class TestGeometryBuffer(unittest.TestCase):
+    def setUp(self):
+        self.osm_data = SyntheticOSMGenerator(seed=3).generate(2000, layout="grid")
+        self.index = OSMIndex.from_osm_data(self.osm_data)
+
+    def test_from_ways_matches_nodes(self):
+        ways = list(self.index.ways.values())[:50]
+        elements = ways + [{"type": "relation", "id": 1, "members": []}]
+        geometry = GeometryBuffer.from_ways(self.index, elements)
+
+        self.assertEqual(len(geometry), len(elements))
+        self.assertEqual(geometry.point_counts()[-1], 0)
+        for position, way in enumerate(ways):
+            expected = [self.index.node_coords[node_id] for node_id in way["nodes"]]
+            np.testing.assert_allclose(geometry.coordinates(position), expected, atol=1e-5)
+
+        bounds = geometry.bounds()
+        self.assertTrue(np.isnan(bounds[-1]).all())
+        first = np.array(geometry.coordinates(0))
+        np.testing.assert_allclose(bounds[0], [first[:, 0].min(), first[:, 0].max(),
+                                               first[:, 1].min(), first[:, 1].max()])
+
+    def test_analysis_features_carry_polylines(self):
+        north, west, south, east = SyntheticOSMGenerator(seed=3).bounds(2000)
+        results = AreaAnalyzer().analyze_osm_data(self.osm_data, north, west, south, east)
+
+        self.assertTrue(results["roads_data"])
+        for road in results["roads_data"][:20]:
+            expected = [self.index.node_coords[node_id] for node_id in self.index.ways[road["id"]]["nodes"]]
+            np.testing.assert_allclose(feature_coordinates(road), expected, atol=1e-5)
+        for feature in results["green_spaces_data"] + results["water_features_data"]:
+            self.assertIn("polyline", feature)
+
+
+class TestIntersectionPotential(unittest.TestCase):
+    def test_counts_overlapping_bounding_boxes(self):
+        roads = [
+            {"coordinates": [[0.0, 0.0], [1.0, 1.0]]},
+            {"polyline": encode_polyline([[0.5, 0.5], [2.0, 2.0]])},
+            {"coordinates": [[5.0, 5.0], [6.0, 6.0]]},
+            {"coordinates": [[0.9, 0.9]]}
+        ]
+
+        # Перетинаються лише рамки перших двох доріг: 1 пара на 4 дороги
+        self.assertAlmostEqual(RoadNetworkTrainer()._calculate_intersection_potential(roads), 0.25)
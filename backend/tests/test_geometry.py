@@ -0,0 +1,43 @@
+import unittest
+import numpy as np
+from backend.services.geometry import polygon_areas_km2
+from backend.services.osm_index import OSMIndex
+
+
+class TestPolygonAreas(unittest.TestCase):
+    def test_square_kilometre_near_kyiv(self):
+        # Квадрат приблизно 1 х 1 км
+        dlat = 1 / 111.195
+        dlon = dlat / np.cos(np.radians(50.45))
+        lat = np.array([50.45, 50.45, 50.45 + dlat, 50.45 + dlat])
+        lon = np.array([30.52, 30.52 + dlon, 30.52 + dlon, 30.52])
+
+        areas = polygon_areas_km2(lat, lon, np.array([0, 4]))
+        self.assertAlmostEqual(areas[0], 1.0, delta=0.01)
+
+    def test_batch_with_short_rings(self):
+        lat = np.array([0.0, 0.0, 0.01, 0.0, 0.0, 0.01, 0.01])
+        lon = np.array([0.0, 0.01, 0.0, 0.0, 0.01, 0.01, 0.0])
+        areas = polygon_areas_km2(lat, lon, np.array([0, 3, 3, 5, 7]))
+
+        self.assertGreater(areas[0], 0)
+        self.assertTrue(np.isnan(areas[1]))
+        self.assertTrue(np.isnan(areas[2]))
+        self.assertTrue(np.isnan(areas[3]))
+
+    def test_index_way_areas(self):
+        index = OSMIndex.from_osm_data({
+            "elements": [
+                {"type": "way", "id": 1, "nodes": [1, 2, 3, 4, 1], "tags": {"building": "yes"}},
+                {"type": "way", "id": 2, "nodes": [1, 2], "tags": {"leisure": "park"}},
+                {"type": "way", "id": 3, "nodes": [1, 2, 3], "tags": {"highway": "residential"}},
+                {"type": "node", "id": 1, "lat": 50.0, "lon": 30.0},
+                {"type": "node", "id": 2, "lat": 50.0, "lon": 30.001},
+                {"type": "node", "id": 3, "lat": 50.001, "lon": 30.001},
+                {"type": "node", "id": 4, "lat": 50.001, "lon": 30.0}
+            ]
+        })
+
+        areas = index.way_areas()
+        self.assertEqual(set(areas), {1})
+        self.assertAlmostEqual(areas[1], 0.111 * 0.0715, delta=0.0005)
@@ -0,0 +1,135 @@
+import unittest
+
+from backend.services.analysis import AreaAnalyzer
+from backend.services.incremental import AnalysisSessionStore, IncrementalAnalysisSession, bbox_difference
+from backend.services.osm_cache import clip_elements
+from backend.services.synthetic_osm import SyntheticOSMGenerator
+
+
+class ClippingOSMFetcher:
+    # Відповідає як Overpass: лише елементи запитаного bbox
+    def __init__(self, osm_data: dict):
+        self.elements = osm_data["elements"]
+        self.requests = []
+
+    def get_area_data(self, north: float, west: float, south: float, east: float) -> dict:
+        self.requests.append((north, west, south, east))
+        return {"elements": clip_elements(self.elements, north, west, south, east)}
+
+
+def comparable(result: dict) -> dict:
+    result = dict(result)
+    for key in ("roads_data", "green_spaces_data", "water_features_data"):
+        result[key] = sorted(result[key], key=lambda item: (item["id"], item["type"]))
+    result.pop("longest_road")
+    return result
+
+
+class TestBBoxDifference(unittest.TestCase):
+    def test_pan_leaves_two_strips(self):
+        strips = bbox_difference((2.0, 0.0, 0.0, 2.0), [(3.0, 1.0, 1.0, 3.0)])
+
+        self.assertEqual(strips, [(1.0, 0.0, 0.0, 2.0), (2.0, 0.0, 1.0, 1.0)])
+
+    def test_covered_and_disjoint(self):
+        self.assertEqual(bbox_difference((1.0, 0.0, 0.0, 1.0), [(2.0, -1.0, -1.0, 2.0)]), [])
+        self.assertEqual(bbox_difference((1.0, 0.0, 0.0, 1.0), [(3.0, 2.0, 2.0, 3.0)]), [(1.0, 0.0, 0.0, 1.0)])
+
+
+class TestIncrementalAnalysisSession(unittest.TestCase):
+    def setUp(self):
+        generator = SyntheticOSMGenerator(seed=7)
+        self.osm_data = generator.generate(6000, layout="organic")
+        elements = self.osm_data["elements"]
+        ways = [element["id"] for element in elements if element["type"] == "way"]
+        stops = [element["id"] for element in elements
+                 if element["type"] == "node" and (element.get("tags") or {}).get("highway") == "bus_stop"]
+        elements.append({
+            "type": "relation", "id": 900001, "tags": {"type": "multipolygon", "leisure": "park"},
+            "members": [{"type": "way", "ref": ways[0], "role": "outer"},
+                        {"type": "way", "ref": ways[-1], "role": "outer"},
+                        {"type": "node", "ref": stops[0], "role": "label"}]
+        })
+
+        self.bounds = generator.bounds(6000)
+        self.fetcher = ClippingOSMFetcher(self.osm_data)
+        self.analyzer = AreaAnalyzer()
+        self.analyzer.osm_fetcher = self.fetcher
+
+    def expected(self, bbox):
+        north, west, south, east = bbox
+        clipped = {"elements": clip_elements(self.osm_data["elements"], north, west, south, east)}
+        return self.analyzer.analyze_osm_data(clipped, north, west, south, east)
+
+    def test_matches_full_analysis_while_panning_and_resizing(self):
+        north, west, south, east = self.bounds
+        height, width = north - south, east - west
+        session = IncrementalAnalysisSession(self.analyzer)
+
+        boxes = [
+            (north - 0.2 * height, west + 0.2 * width, south + 0.4 * height, east - 0.4 * width),
+            (north - 0.25 * height, west + 0.3 * width, south + 0.35 * height, east - 0.3 * width),
+            (north - 0.1 * height, west + 0.3 * width, south + 0.35 * height, east - 0.2 * width),
+            (north - 0.3 * height, west + 0.35 * width, south + 0.5 * height, east - 0.45 * width),
+            (north - 0.05 * height, west + 0.05 * width, south + 0.1 * height, east - 0.1 * width)
+        ]
+        for box in boxes:
+            result = session.update(box[0], box[1], box[2], box[3])
+            self.assertEqual(comparable(result), comparable(self.expected(box)))
+            self.assertEqual(result["longest_road"]["length"], self.expected(box)["longest_road"]["length"])
+
+    def test_fetches_only_new_strips(self):
+        north, west, south, east = self.bounds
+        height, width = north - south, east - west
+        session = IncrementalAnalysisSession(self.analyzer)
+        first = (north - 0.3 * height, west + 0.3 * width, south + 0.3 * height, east - 0.3 * width)
+        panned = (first[0] + 0.05 * height, first[1] + 0.05 * width, first[2] + 0.05 * height, first[3] + 0.05 * width)
+
+        session.update(*first)
+        session.update(*panned)
+        # Повернення в уже завантажену область не робить запитів
+        session.update(*first)
+
+        self.assertEqual(self.fetcher.requests[0], first)
+        self.assertEqual(len(self.fetcher.requests), 3)
+        for strip in self.fetcher.requests[1:]:
+            self.assertLess((strip[0] - strip[2]) * (strip[3] - strip[1]),
+                            0.2 * (first[0] - first[2]) * (first[3] - first[1]))
+
+    def test_far_jump_starts_over(self):
+        session = IncrementalAnalysisSession(self.analyzer)
+        session.update(50.0, 30.0, 49.99, 30.01)
+        session.update(*self.bounds)
+
+        self.assertEqual(self.fetcher.requests[-1], self.bounds)
+        self.assertEqual(session.covered, [self.bounds])
+
+    def test_failed_strip_is_fetched_again(self):
+        def fail_once(north, west, south, east):
+            self.fetcher.get_area_data = fetch
+            return {"elements": [], "remark": "failed: Overpass unavailable"}
+        fetch = self.fetcher.get_area_data
+        self.fetcher.get_area_data = fail_once
+
+        session = IncrementalAnalysisSession(self.analyzer)
+        failed = session.update(*self.bounds)
+        self.assertTrue(failed["incomplete"])
+        self.assertEqual(failed["road_count"], 0)
+        self.assertEqual(session.covered, [])
+
+        result = session.update(*self.bounds)
+        self.assertFalse(result["incomplete"])
+        self.assertEqual(comparable(result), comparable(self.expected(self.bounds)))
+        self.assertEqual(session.covered, [self.bounds])
+
+
+class TestAnalysisSessionStore(unittest.TestCase):
+    def test_lru_eviction(self):
+        store = AnalysisSessionStore(max_sessions=2)
+        first = store.create(AreaAnalyzer())
+        second = store.create(AreaAnalyzer())
+        store.get(first.id)
+        store.create(AreaAnalyzer())
+
+        self.assertIs(store.get(first.id), first)
+        self.assertIsNone(store.get(second.id))
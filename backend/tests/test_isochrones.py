@@ -0,0 +1,111 @@
+from heapq import heappop, heappush
+import unittest
+
+import numpy as np
+
+from backend.analysis import AreaAnalyzer
+from backend.services.benchmark import StaticOSMFetcher
+from backend.services.isochrones import TransportCoverage, multi_source_distances
+from backend.services.osm_index import OSMIndex
+from backend.services.road_graph import RoadGraph
+from backend.services.synthetic_osm import SyntheticOSMGenerator
+
+
+def reference_distances(graph: RoadGraph, sources) -> np.ndarray:
+    distance = np.full(graph.vertex_count, np.inf)
+    heap = [(0.0, source) for source in sources]
+    while heap:
+        current, vertex = heappop(heap)
+        if current >= distance[vertex]:
+            continue
+        distance[vertex] = current
+        for edge in range(graph.indptr[vertex], graph.indptr[vertex + 1]):
+            heappush(heap, (current + graph.lengths[edge], graph.targets[edge]))
+    return distance
+
+
+def street_index() -> OSMIndex:
+    # Вулиця зі сходу на захід: точки кожні ~107 м (0.0015° на широті 50)
+    return OSMIndex.from_osm_data({"elements": [
+        {"type": "node", "id": node_id, "lat": 50.0, "lon": 30.0 + 0.0015 * node_id} for node_id in range(10)
+    ]})
+
+
+class TestMultiSourceDistances(unittest.TestCase):
+    def setUp(self):
+        generator = SyntheticOSMGenerator(seed=11)
+        self.osm_index = OSMIndex.from_osm_data(generator.generate(3000, "organic"))
+        roads, _, _ = AreaAnalyzer()._extract_road_data(self.osm_index)
+        self.graph = RoadGraph.from_roads(roads, self.osm_index, mode="walk")
+
+    def test_matches_dijkstra(self):
+        sources = [0, self.graph.vertex_count // 2, self.graph.vertex_count - 1]
+
+        distance = multi_source_distances(self.graph, sources)
+
+        np.testing.assert_allclose(distance, reference_distances(self.graph, sources))
+
+    def test_limit(self):
+        distance = multi_source_distances(self.graph, [0], limit=300)
+        full = reference_distances(self.graph, [0])
+
+        np.testing.assert_allclose(distance[full <= 300], full[full <= 300])
+        self.assertTrue(np.isinf(distance[full > 300]).all())
+
+    def test_initial_offsets(self):
+        distance = multi_source_distances(self.graph, [0, 0], initial=[50.0, 20.0])
+
+        self.assertEqual(distance[0], 20.0)
+
+
+class TestTransportCoverage(unittest.TestCase):
+    def setUp(self):
+        self.osm_index = street_index()
+        roads = [{"id": 1, "type": "residential", "nodes": list(range(10)), "oneway": True, "lanes": 1}]
+        self.graph = RoadGraph.from_roads(roads, self.osm_index, mode="walk")
+        self.coverage = TransportCoverage(max_walk_m=800)
+
+    def test_walk_graph_keeps_every_point(self):
+        self.assertEqual(self.graph.vertex_count, 10)
+        # Односторонній рух не обмежує пішоходів
+        self.assertEqual(self.graph.edge_count, 18)
+
+    def test_access_along_the_street(self):
+        # Зупинка на початку вулиці, будинки в 20 м від вулиці на різних відстанях
+        access = self.coverage.access_distances(
+            self.graph, np.array([50.0]), np.array([30.0]),
+            np.array([50.00018, 50.00018, 50.00018, 51.0]), np.array([30.0015, 30.006, 30.0135, 30.0])
+        )
+
+        self.assertAlmostEqual(access[0], 107 + 20, delta=3)
+        self.assertAlmostEqual(access[1], 4 * 107 + 20, delta=5)
+        self.assertTrue(np.isinf(access[2]))  # далі max_walk_m
+        self.assertTrue(np.isinf(access[3]))  # далеко від будь-якої дороги
+
+        summary = self.coverage.summarize(access)
+        self.assertEqual(summary, {"buildings": 4, "within_300m": 0.25, "within_500m": 0.5, "median_walk_m": 288})
+        self.assertEqual(self.coverage.walk_minutes(access[0]), 1.6)
+        self.assertIsNone(self.coverage.walk_minutes(access[3]))
+
+    def test_no_stops(self):
+        access = self.coverage.access_distances(self.graph, np.array([]), np.array([]),
+                                                np.array([50.0]), np.array([30.0]))
+
+        self.assertTrue(np.isinf(access).all())
+
+    def test_analysis_reports_coverage(self):
+        generator = SyntheticOSMGenerator(seed=4)
+        analyzer = AreaAnalyzer()
+        analyzer.osm_fetcher = StaticOSMFetcher(generator.generate(4000))
+
+        result = analyzer.perform_analysis(*generator.bounds(4000))
+
+        coverage = result["transport_coverage"]
+        self.assertEqual(coverage["buildings"], len(result["buildings_data"]))
+        self.assertGreater(coverage["within_500m"], 0)
+        self.assertGreaterEqual(coverage["within_500m"], coverage["within_300m"])
+        self.assertTrue(any(b["transport_walk_min"] is not None for b in result["buildings_data"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import threading
+import time
+import unittest
+from backend.services.jobs import AnalysisJob, AnalysisJobManager, normalize_bbox
+
+
+def blocking_analyzer(release: threading.Event, calls: list):
+    class BlockingAnalyzer:
+        def perform_analysis(self, nw_lat, nw_lng, se_lat, se_lng):
+            calls.append((nw_lat, nw_lng, se_lat, se_lng))
+            release.wait(5)
+            return {"bounds": [[nw_lat, nw_lng], [se_lat, se_lng]]}
+
+    return BlockingAnalyzer
+
+
+class FailingAnalyzer:
+    def perform_analysis(self, *args):
+        raise RuntimeError("Overpass unavailable")
+
+
+def wait_for(job, timeout=5):
+    deadline = time.time() + timeout
+    while not job.finished and time.time() < deadline:
+        time.sleep(0.01)
+
+
+class TestAnalysisJobManager(unittest.TestCase):
+    def test_normalize_bbox(self):
+        self.assertEqual(normalize_bbox(49.5, 30.5, 50.5, 29.5), (50.5, 29.5, 49.5, 30.5))
+
+    def test_in_flight_jobs_are_deduplicated(self):
+        release = threading.Event()
+        calls = []
+        manager = AnalysisJobManager(max_workers=2, analyzer_factory=blocking_analyzer(release, calls))
+
+        first = manager.submit(50.5, 29.5, 49.5, 30.5)
+        second = manager.submit(49.5, 30.5, 50.5, 29.5)
+        self.assertIs(first, second)
+        self.assertFalse(first.finished)
+
+        release.set()
+        wait_for(first)
+
+        self.assertEqual(first.status, AnalysisJob.DONE)
+        self.assertEqual(len(calls), 1)
+        self.assertIs(manager.get(first.id), first)
+        self.assertIn('results', first.to_dict())
+
+        third = manager.submit(50.5, 29.5, 49.5, 30.5)
+        self.assertIsNot(third, first)
+        wait_for(third)
+
+    def test_failed_job(self):
+        manager = AnalysisJobManager(max_workers=1, analyzer_factory=FailingAnalyzer)
+        job = manager.submit(50.5, 29.5, 49.5, 30.5)
+        wait_for(job)
+
+        self.assertEqual(job.status, AnalysisJob.FAILED)
+        self.assertIn("Overpass unavailable", job.to_dict()['message'])
+
+    def test_finished_jobs_expire(self):
+        release = threading.Event()
+        release.set()
+        manager = AnalysisJobManager(max_workers=1, retention=-1, analyzer_factory=blocking_analyzer(release, []))
+        job = manager.submit(50.5, 29.5, 49.5, 30.5)
+        wait_for(job)
+
+        manager.submit(51.5, 29.5, 50.5, 30.5)
+        self.assertIsNone(manager.get(job.id))
@@ -0,0 +1,98 @@
+import math
+import random
+import unittest
+
+import numpy as np
+
+from backend.analysis import AreaAnalyzer
+from backend.services.feature_geometry import feature_coordinates
+from backend.services.geometry import polygon_areas_km2
+from backend.services.multipolygon import assemble_rings
+from backend.services.osm_cache import clip_elements
+from backend.services.osm_index import OSMIndex
+
+
+def square(lat, lon, size):
+    return [(lat, lon), (lat + size, lon), (lat + size, lon + size), (lat, lon + size)]
+
+
+def line(points):
+    return np.array([point[0] for point in points]), np.array([point[1] for point in points])
+
+
+def square_area(lat, lon, size):
+    corners = square(lat, lon, size)
+    return float(polygon_areas_km2(*line(corners), np.array([0, 4]))[0])
+
+
+class TestAssembleRings(unittest.TestCase):
+    def test_joins_shuffled_and_reversed_lines(self):
+        a, b, c, d = square(50.0, 30.0, 0.01)
+        lines = [line([c, d, a]), line([c, b]), line([a, b]), line([(51.0, 31.0), (51.1, 31.1)])]
+
+        rings, unclosed = assemble_rings(lines)
+
+        self.assertEqual(unclosed, 1)
+        self.assertEqual(len(rings), 1)
+        lat, lon = rings[0]
+        self.assertEqual(len(lat), 5)
+        self.assertEqual((lat[0], lon[0]), (lat[-1], lon[-1]))
+        self.assertEqual({(float(x), float(y)) for x, y in zip(lat, lon)}, {a, b, c, d})
+
+    def test_many_segments_form_one_ring(self):
+        count = 5000
+        angles = np.linspace(0, 2 * math.pi, count + 1)
+        lat = 50.0 + 0.1 * np.cos(angles)
+        lon = 30.0 + 0.1 * np.sin(angles)
+        lat[-1], lon[-1] = lat[0], lon[0]
+        lines = [(lat[i:i + 2], lon[i:i + 2]) if i % 2 else (lat[i + 1::-1][:2], lon[i + 1::-1][:2])
+                 for i in range(count)]
+        random.Random(1).shuffle(lines)
+
+        rings, unclosed = assemble_rings(lines)
+
+        self.assertEqual(unclosed, 0)
+        self.assertEqual(len(rings), 1)
+        self.assertEqual(len(rings[0][0]), count + 1)
+
+
+class TestMultipolygonRelations(unittest.TestCase):
+    def setUp(self):
+        outer = square(50.0, 30.0, 0.01)
+        inner = square(50.003, 30.003, 0.004)
+        nodes = [{"type": "node", "id": 1 + i, "lat": lat, "lon": lon} for i, (lat, lon) in enumerate(outer + inner)]
+        self.elements = nodes + [
+            # Зовнішнє кільце з двох ліній, внутрішнє - одна замкнена лінія
+            {"type": "way", "id": 10, "nodes": [1, 2, 3]},
+            {"type": "way", "id": 11, "nodes": [1, 4, 3]},
+            {"type": "way", "id": 12, "nodes": [5, 6, 7, 8, 5]},
+            {"type": "relation", "id": 100, "tags": {"type": "multipolygon", "leisure": "park", "name": "Park"},
+             "members": [{"type": "way", "ref": 10, "role": "outer"},
+                         {"type": "way", "ref": 11, "role": "outer"},
+                         {"type": "way", "ref": 12, "role": "inner"}]}
+        ]
+
+    def test_area_excludes_inner_ring(self):
+        index = OSMIndex.from_osm_data({"elements": self.elements})
+        multipolygon = index.multipolygons()[100]
+
+        self.assertEqual((len(multipolygon.outer), len(multipolygon.inner)), (1, 1))
+        expected = square_area(50.0, 30.0, 0.01) - square_area(50.003, 30.003, 0.004)
+        self.assertAlmostEqual(multipolygon.area, expected, delta=expected * 1e-3)
+
+    def test_analyzer_reports_relation_area_and_outline(self):
+        index = OSMIndex.from_osm_data({"elements": self.elements})
+        green_spaces, _ = AreaAnalyzer()._extract_green_and_water_data(index)
+
+        park, = green_spaces
+        self.assertEqual(park["name"], "Park")
+        self.assertAlmostEqual(park["area"], index.multipolygons()[100].area)
+        self.assertEqual(len(feature_coordinates(park)), 5)
+
+    def test_clipping_keeps_all_member_ways(self):
+        # bbox зачіпає лише лінію 10, але відношення приходить з усіма лініями
+        clipped = clip_elements(self.elements, 50.0105, 30.0095, 50.0095, 30.0105)
+
+        way_ids = sorted(element["id"] for element in clipped if element["type"] == "way")
+        self.assertEqual(way_ids, [10, 11, 12])
+        self.assertIsNotNone(OSMIndex.from_osm_data({"elements": clipped}).multipolygons()[100].area)
@@ -1,7 +1,21 @@
+import os
+import re
+import tempfile
+import threading
+import time
 import unittest
-from unittest.mock import patch, MagicMock
+import requests
+from unittest.mock import MagicMock
 from django.test import TestCase
-from backend.services.osm_data import OSMDataFetcher, haversine
+from backend.services.analysis import AreaAnalyzer
+from backend.services.batch import partition_elements
+from backend.services.osm_columnar import ColumnarOSMData
+from backend.services.osm_data import OSMDataFetcher, RateLimiter, haversine, split_bbox
+from backend.services.osm_index import OSMIndex
+from backend.services.synthetic_osm import SyntheticOSMGenerator
+from backend.services.overpass_client import OverpassClient
+from overpass_stub import OverpassStub, closed_port_url
+from backend.services.osm_cache import OSMTileCache, clip_elements, merge_tiles
 
 
 class TestHaversine(unittest.TestCase):
@@ -11,44 +25,331 @@ class TestHaversine(unittest.TestCase):
         self.assertAlmostEqual(distance, 469, delta=10)  # ~469 км
 
 
-class TestOSMDataFetcher(TestCase):
-    @patch('backend.services.osm_data.requests.post')
-    def test_get_area_data_success(self, mock_post):
-        # Налаштовуємо mock
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_response.json.return_value = {"elements": [{"type": "node", "id": 1}]}
-        mock_post.return_value = mock_response
+def stub_fetcher(*endpoints, **kwargs) -> OSMDataFetcher:
+    client = OverpassClient(list(endpoints), timeout=5, max_retries=2, sleep=lambda seconds: None)
+    kwargs.setdefault('tile_cache', None)
+    return OSMDataFetcher(client=client, rate_limiter=RateLimiter(0), **kwargs)
+
 
-        fetcher = OSMDataFetcher()
-        result = fetcher.get_area_data(50, 30, 49, 31)
+class TestOSMDataFetcher(TestCase):
+    def test_get_area_data_success(self):
+        with OverpassStub(default=(200, {}, {"elements": [{"type": "node", "id": 1}]})) as stub:
+            fetcher = stub_fetcher(stub.url)
+            result = fetcher.get_area_data(50.45, 30.50, 50.44, 30.52)
 
         self.assertEqual(result, {"elements": [{"type": "node", "id": 1}]})
-        mock_post.assert_called_once()
+        self.assertEqual(len(stub.requests), 1)
+        self.assertIn('way["highway"](50.44,30.5,50.45,30.52)', stub.requests[0]["query"])
 
-    @patch('backend.services.osm_data.requests.post')
-    def test_get_area_data_rate_limit(self, mock_post):
+    def test_get_area_data_rate_limit(self):
         # Перший виклик повертає 429, другий - успішний
-        mock_response1 = MagicMock()
-        mock_response1.status_code = 429
+        with OverpassStub() as stub:
+            stub.queue(429, headers={"Retry-After": "1"})
+            fetcher = stub_fetcher(stub.url)
+            result = fetcher.get_area_data(50.45, 30.50, 50.44, 30.52)
 
-        mock_response2 = MagicMock()
-        mock_response2.status_code = 200
-        mock_response2.json.return_value = {"elements": []}
+        self.assertEqual(result, {"elements": []})
+        self.assertEqual(len(stub.requests), 2)
 
-        mock_post.side_effect = [mock_response1, mock_response2]
+    def test_get_area_data_error(self):
+        fetcher = stub_fetcher(closed_port_url())
+        result = fetcher.get_area_data(50.45, 30.50, 50.44, 30.52)
 
-        fetcher = OSMDataFetcher()
-        result = fetcher.get_area_data(50, 30, 49, 31)
+        self.assertEqual(result["elements"], [])
+        self.assertTrue(result["remark"].startswith("failed"))
+        self.assertTrue(AreaAnalyzer().analyze_osm_data(result, 50.45, 30.50, 50.44, 30.52)["incomplete"])
 
-        self.assertEqual(result, {"elements": []})
-        self.assertEqual(mock_post.call_count, 2)
 
-    @patch('backend.services.osm_data.requests.post')
-    def test_get_area_data_error(self, mock_post):
-        mock_post.side_effect = Exception("API Error")
+class TestOSMTileCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = OSMTileCache(self.tmp_dir.name, tile_size=0.01, ttl=3600, max_tiles=100)
+
+        self.elements = [
+            {"type": "way", "id": 10, "nodes": [1, 2], "tags": {"highway": "primary"}},
+            {"type": "node", "id": 1, "lat": 50.005, "lon": 30.005},
+            {"type": "node", "id": 2, "lat": 50.015, "lon": 30.005},
+            {"type": "node", "id": 3, "lat": 50.005, "lon": 30.015, "tags": {"highway": "bus_stop"}}
+        ]
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_tiles_for_bbox(self):
+        keys = self.cache.tiles_for_bbox(50.02, 30.0, 50.0, 30.02)
+        self.assertEqual(len(keys), 4)
+        self.assertEqual(self.cache.bbox_for_tiles(keys), (50.02, 30.0, 50.0, 30.02))
+
+    def test_put_get_and_ttl(self):
+        def element_key(element):
+            return element["type"], element["id"]
+
+        for tile_format in ('columnar', 'json'):
+            cache = OSMTileCache(self.tmp_dir.name, tile_size=0.01, tile_format=tile_format)
+            cache.put((3000, 5000), self.elements)
+            self.assertTrue(cache._tile_path((3000, 5000)).endswith('.npz' if tile_format == 'columnar' else '.json'))
+            self.assertEqual(sorted(cache.get((3000, 5000)), key=element_key),
+                             sorted(self.elements, key=element_key))
+            self.assertIsNone(cache.get((3001, 5000)))
+
+            expired = OSMTileCache(self.tmp_dir.name, tile_size=0.01, ttl=-1, tile_format=tile_format)
+            self.assertIsNone(expired.get((3000, 5000)))
+
+    def test_lru_eviction(self):
+        cache = OSMTileCache(self.tmp_dir.name, tile_size=0.01, max_tiles=2)
+        for i, key in enumerate([(1, 1), (2, 2), (3, 3)]):
+            cache.put(key, [])
+            os.utime(cache._tile_path(key), (1000 + i, 1000 + i))
+
+        cache.get((1, 1))
+        cache.evict()
+
+        self.assertIsNotNone(cache.get((1, 1)))
+        self.assertIsNone(cache.get((2, 2)))
+        self.assertIsNotNone(cache.get((3, 3)))
+
+    def test_split_into_tiles_keeps_way_nodes(self):
+        keys = self.cache.tiles_for_bbox(50.02, 30.0, 50.0, 30.02)
+        tiles = self.cache.split_into_tiles(self.elements, keys)
+
+        lower_left = {(e["type"], e["id"]) for e in tiles[(3000, 5000)]}
+        upper_left = {(e["type"], e["id"]) for e in tiles[(3000, 5001)]}
+        self.assertEqual(lower_left, {("way", 10), ("node", 1), ("node", 2)})
+        self.assertEqual(upper_left, {("way", 10), ("node", 1), ("node", 2)})
+        self.assertEqual(tiles[(3001, 5000)], [self.elements[3]])
+        self.assertEqual(tiles[(3001, 5001)], [])
+
+    def test_clip_elements(self):
+        clipped = clip_elements(self.elements, 50.01, 30.0, 50.0, 30.01)
+        self.assertEqual({(e["type"], e["id"]) for e in clipped}, {("way", 10), ("node", 1), ("node", 2)})
+
+    def test_fetcher_reuses_cached_tiles(self):
+        with OverpassStub(default=(200, {}, {"elements": self.elements})) as stub:
+            fetcher = stub_fetcher(stub.url, tile_cache=self.cache)
+            first = fetcher.get_area_data(50.02, 30.0, 50.0, 30.02)
+            second = fetcher.get_area_data(50.01, 30.0, 50.0, 30.02)
+
+        self.assertEqual(len(stub.requests), 1)
+        self.assertEqual(len(first["elements"]), 4)
+        self.assertEqual({(e["type"], e["id"]) for e in second["elements"]},
+                         {("way", 10), ("node", 1), ("node", 2), ("node", 3)})
+
+
+    def test_group_tiles(self):
+        corners = [(0, 0), (2, 2)]
+        self.assertEqual(self.cache.group_tiles(corners), [[(0, 0)], [(2, 2)]])
+
+        block = [(x, y) for y in range(2) for x in range(3)]
+        self.assertEqual(self.cache.group_tiles(block), [block])
+
+        l_shape = [(0, 0), (1, 0), (0, 1)]
+        self.assertEqual(self.cache.group_tiles(l_shape), [[(0, 0), (1, 0)], [(0, 1)]])
+
+    def test_fetcher_skips_cached_tiles_between_missing_ones(self):
+        keys = self.cache.tiles_for_bbox(50.03, 30.0, 50.0, 30.03)
+        for key in keys:
+            if key not in [(3000, 5000), (3002, 5002)]:
+                self.cache.put(key, [])
+
+        with OverpassStub(default=(200, {}, {"elements": self.elements})) as stub:
+            fetcher = stub_fetcher(stub.url, tile_cache=self.cache)
+            fetcher.get_area_data(50.03, 30.0, 50.0, 30.03)
+
+        # Два окремі запити на кутові тайли замість одного на всю область 3x3
+        self.assertEqual(len(stub.requests), 2)
+        self.assertEqual(self.cache.get_many(keys)[1], [])
+
+
+class TestTiledFetch(unittest.TestCase):
+    def setUp(self):
+        self.queries = []
+        self.lock = threading.Lock()
+
+    def post(self, data, stream=False):
+        bbox = re.search(r"\(([-\d.]+,[-\d.]+,[-\d.]+,[-\d.]+)\)", data).group(1)
+        south, west, north, east = map(float, bbox.split(","))
+        # Тайли запитуються з кількох потоків - номер запиту береться під блокуванням
+        with self.lock:
+            self.queries.append((north, west, south, east))
+            query_number = len(self.queries)
+
+        if north - south > 0.03:
+            raise requests.Timeout("read timed out")
+
+        response = MagicMock()
+        response.status_code = 200
+        # Спільна лінія через усю область приходить з кожного тайла
+        response.json.return_value = {"elements": [
+            {"type": "way", "id": 1, "nodes": [1, 2], "tags": {"highway": "primary"}},
+            {"type": "node", "id": 1, "lat": 50.0, "lon": 30.0},
+            {"type": "node", "id": 2, "lat": 50.1, "lon": 30.1},
+            {"type": "way", "id": 1000 + query_number, "nodes": [1, 2], "tags": {"building": "yes"}}
+        ]}
+        return response
+
+    def test_split_bbox(self):
+        tiles = split_bbox(50.1, 30.0, 50.0, 30.25, 0.05)
+
+        self.assertEqual(len(tiles), 2 * 5)
+        self.assertEqual(tiles[0][:2], (50.1, 30.0))
+        self.assertAlmostEqual(tiles[-1][2], 50.0)
+        self.assertAlmostEqual(tiles[-1][3], 30.25)
+
+    def test_large_bbox_is_split_and_deduplicated(self):
+        fetcher = OSMDataFetcher(tile_cache=None, stream=False, rate_limiter=RateLimiter(0), client=self)
+        fetcher.query_tile_degrees = 0.025
+
+        result = fetcher.get_area_data(50.1, 30.0, 50.0, 30.1)
+
+        self.assertEqual(len(self.queries), 16)
+        ids = [(e["type"], e["id"]) for e in result["elements"]]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(sum(1 for e in result["elements"] if e["id"] >= 1000), 16)
+        self.assertNotIn("remark", result)
+
+    def test_timed_out_tile_is_split_again(self):
+        fetcher = OSMDataFetcher(tile_cache=None, stream=False, rate_limiter=RateLimiter(0), client=self)
+
+        result = fetcher.get_area_data(50.04, 30.0, 50.0, 30.04)
+
+        # один запит на весь bbox, що не вклався в таймаут, і чотири чверті
+        self.assertEqual(len(self.queries), 5)
+        self.assertEqual(sum(1 for e in result["elements"] if e["id"] >= 1000), 4)
+
+    def test_partial_failure_is_reported(self):
+        fetcher = OSMDataFetcher(tile_cache=None, stream=False, rate_limiter=RateLimiter(0), client=self)
+        fetcher.max_split_depth = 0
+
+        result = fetcher.get_area_data(50.04, 30.0, 50.0, 30.04)
+
+        self.assertEqual(result["elements"], [])
+        self.assertIn("incomplete", result["remark"])
+
+        results = AreaAnalyzer().analyze_osm_data(result, 50.04, 30.0, 50.0, 30.04)
+        self.assertTrue(results["incomplete"])
+        self.assertEqual(results["warnings"], [result["remark"]])
+
+    def test_partial_failure_is_reported_through_tile_cache(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = OSMTileCache(tmp_dir, tile_size=0.01)
+            fetcher = OSMDataFetcher(tile_cache=cache, stream=False, rate_limiter=RateLimiter(0), client=self)
+            fetcher.max_split_depth = 0
+
+            result = fetcher.get_area_data(50.04, 30.0, 50.0, 30.04)
+
+            self.assertIn("incomplete", result["remark"])
+            # Неповні тайли не кешуються - наступний запит знову піде до Overpass
+            _, missing = cache.get_many(cache.tiles_for_bbox(50.04, 30.0, 50.0, 30.04))
+            self.assertEqual(len(missing), 16)
+
+    def test_rate_limiter_spaces_requests(self):
+        limiter = RateLimiter(50)
+        started = time.monotonic()
+        for _ in range(5):
+            limiter.acquire()
+
+        self.assertGreaterEqual(time.monotonic() - started, 0.07)
+
+
+def to_geom_elements(elements):
+    # Та сама відповідь у формі "out geom": координати в лініях, без вузлів без тегів
+    coords = {e["id"]: {"lat": e["lat"], "lon": e["lon"]} for e in elements if e["type"] == "node"}
+    result = []
+    for element in elements:
+        if element["type"] == "way":
+            element = dict(element, geometry=[coords.get(node_id) for node_id in element["nodes"]])
+            element["bounds"] = {"minlat": 0, "minlon": 0, "maxlat": 0, "maxlon": 0}
+        elif element["type"] == "node" and not element.get("tags"):
+            continue
+        result.append(element)
+    return result
+
+
+class TestGeomQueryMode(TestCase):
+    def setUp(self):
+        generator = SyntheticOSMGenerator(seed=5)
+        self.elements = generator.generate(3000, layout="grid")["elements"]
+        self.bounds = generator.bounds(3000)
+        self.geom_elements = to_geom_elements(self.elements)
+
+    def test_query_forms(self):
+        geom = OSMDataFetcher(tile_cache=None, rate_limiter=RateLimiter(0), client=self, query_mode="geom")
+        skel = OSMDataFetcher(tile_cache=None, rate_limiter=RateLimiter(0), client=self, query_mode="skel")
+
+        self.assertIn("out geom qt;", geom._build_query(1, 2, 3, 4))
+        self.assertNotIn(">;", geom._build_query(1, 2, 3, 4))
+        self.assertIn("out skel qt;", skel._build_query(1, 2, 3, 4))
+        with self.assertRaises(ValueError):
+            OSMDataFetcher(tile_cache=None, rate_limiter=RateLimiter(0), client=self, query_mode="full")
+
+    def test_response_is_parsed_and_pruned(self):
+        way = {"type": "way", "id": 1, "nodes": [1, 2], "tags": {"highway": "primary", "name": "A", "note": "x"},
+               "bounds": {"minlat": 50.0, "minlon": 30.0, "maxlat": 50.1, "maxlon": 30.1},
+               "geometry": [{"lat": 50.0, "lon": 30.0}, {"lat": 50.1, "lon": 30.1}]}
+        bench = {"type": "node", "id": 3, "lat": 50.0, "lon": 30.0, "tags": {"fixme": "y"}}
+        with OverpassStub(default=(200, {}, {"elements": [way, bench]})) as stub:
+            result = stub_fetcher(stub.url, query_mode="geom").get_area_data(50.45, 30.50, 50.44, 30.52)
+
+        parsed_way, parsed_node = result["elements"]
+        self.assertEqual(parsed_way["tags"], {"highway": "primary", "name": "A"})
+        self.assertNotIn("bounds", parsed_way)
+        self.assertNotIn("tags", parsed_node)
+        self.assertIn("out geom", stub.requests[0]["query"])
+
+    def test_geom_form_gives_same_analysis(self):
+        north, west, south, east = self.bounds
+        analyzer = AreaAnalyzer()
+        expected = analyzer.analyze_osm_data({"elements": self.elements}, north, west, south, east)
+
+        self.assertEqual(analyzer.analyze_osm_data({"elements": self.geom_elements}, north, west, south, east),
+                         expected)
+        columnar = ColumnarOSMData.from_elements(self.geom_elements)
+        self.assertEqual(analyzer.analyze_osm_data(columnar, north, west, south, east), expected)
+
+    def test_geom_form_clips_like_node_form(self):
+        north, west, south, east = self.bounds
+        box = (north - 0.3 * (north - south), west + 0.2 * (east - west), south + 0.4 * (north - south), east)
+
+        def ways(elements):
+            return sorted(e["id"] for e in elements if e["type"] == "way")
+
+        self.assertEqual(ways(clip_elements(self.geom_elements, *box)), ways(clip_elements(self.elements, *box)))
+        cells = [box, (north, west, north - 0.5 * (north - south), west + 0.5 * (east - west))]
+        for geom_part, part in zip(partition_elements(self.geom_elements, cells),
+                                   partition_elements(self.elements, cells)):
+            self.assertEqual(ways(geom_part), ways(part))
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache = OSMTileCache(tmp_dir, tile_size=0.005)
+            keys = cache.tiles_for_bbox(north, west, south, east)
+            geom_tiles = cache.split_into_tiles(self.geom_elements, keys)
+            tiles = cache.split_into_tiles(self.elements, keys)
+        self.assertEqual({key: ways(value) for key, value in geom_tiles.items()},
+                         {key: ways(value) for key, value in tiles.items()})
+
+    def test_geom_tiles_survive_columnar_cache(self):
+        north, west, south, east = self.bounds
+        analyzer = AreaAnalyzer()
+
+        # Колонковий тайл зберігає геометрію ліній як вузли - аналіз той самий, що з JSON-тайлів
+        results = []
+        for tile_format in ('json', 'columnar'):
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                cache = OSMTileCache(tmp_dir, tile_size=0.005, tile_format=tile_format)
+                keys = cache.tiles_for_bbox(north, west, south, east)
+                cache.put_many(cache.split_into_tiles(self.geom_elements, keys))
+                tiles, missing = cache.get_many(keys)
+
+            self.assertEqual(missing, [])
+            elements = clip_elements(merge_tiles(tiles.values()), north, west, south, east)
+            results.append(analyzer.analyze_osm_data({"elements": elements}, north, west, south, east))
+
+        self.assertEqual(results[1], results[0])
 
-        fetcher = OSMDataFetcher()
-        result = fetcher.get_area_data(50, 30, 49, 31)
+    def test_index_reads_inline_geometry(self):
+        index = OSMIndex.from_osm_data({"elements": self.geom_elements})
+        reference = OSMIndex.from_osm_data({"elements": self.elements})
+        way = next(iter(reference.ways.values()))
 
-        self.assertEqual(result, {"elements": []})
\ No newline at end of file
+        self.assertEqual([index.node(node_id) for node_id in way["nodes"]],
+                         [reference.node(node_id) for node_id in way["nodes"]])
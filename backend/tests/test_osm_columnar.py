@@ -0,0 +1,111 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from backend.analysis import AreaAnalyzer
+from backend.services.benchmark import StaticOSMFetcher
+from backend.services.osm_columnar import ColumnarOSMData
+from backend.services.osm_index import OSMIndex
+from backend.services.synthetic_osm import SyntheticOSMGenerator
+
+ELEMENTS = [
+    {"type": "node", "id": 3, "lat": 50.3, "lon": 30.3},
+    {"type": "node", "id": 1, "lat": 50.1, "lon": 30.1, "tags": {"highway": "bus_stop", "name": "Зупинка"}},
+    {"type": "node", "id": 2, "lat": 50.2, "lon": 30.2},
+    {"type": "node", "id": 2, "lat": 50.2, "lon": 30.2},
+    {"type": "way", "id": 10, "nodes": [1, 2, 3], "tags": {"highway": "residential", "name": "Хрещатик"}},
+    {"type": "way", "id": 10, "nodes": [1, 2, 3], "tags": {"highway": "residential", "name": "Хрещатик"}},
+    {"type": "way", "id": 11, "nodes": [3, 1]},
+    {"type": "relation", "id": 20, "members": [], "tags": {"type": "multipolygon"}}
+]
+
+
+class TestColumnarOSMData(unittest.TestCase):
+    def setUp(self):
+        self.data = ColumnarOSMData.from_elements(ELEMENTS)
+
+    def test_columns(self):
+        ids, lat, lon = self.data.node_arrays()
+
+        self.assertEqual(ids.tolist(), [1, 2, 3])
+        self.assertEqual(lat.tolist(), [50.1, 50.2, 50.3])
+        self.assertEqual(self.data.arrays["way_offsets"].tolist(), [0, 3, 5])
+        self.assertEqual(self.data.arrays["way_refs"].tolist(), [1, 2, 3, 3, 1])
+        # "highway" і "residential" зберігаються один раз на весь набір
+        self.assertEqual(self.data.strings.strings.count("highway"), 1)
+        self.assertEqual(self.data.element_count, len(ELEMENTS))
+
+    def test_round_trip(self):
+        elements = self.data.to_osm_data()["elements"]
+
+        self.assertEqual(elements, [
+            {"type": "node", "id": 2, "lat": 50.2, "lon": 30.2},
+            {"type": "node", "id": 3, "lat": 50.3, "lon": 30.3},
+            ELEMENTS[1], ELEMENTS[4], ELEMENTS[6], ELEMENTS[7]
+        ])
+
+    def test_save_and_mmap(self):
+        with tempfile.TemporaryDirectory() as path:
+            self.data.save(path)
+            loaded = ColumnarOSMData.load(path)
+
+            self.assertIsInstance(loaded.arrays["node_lat"], np.memmap)
+            self.assertEqual(loaded.to_osm_data(), self.data.to_osm_data())
+            self.assertEqual(OSMIndex.from_osm_data(loaded).node(3), (50.3, 30.3))
+            del loaded
+
+    def test_npz_round_trip(self):
+        with tempfile.TemporaryDirectory() as path:
+            tile_path = os.path.join(path, "tile.npz")
+            with open(tile_path, "wb") as f:
+                self.data.save_npz(f, fetched_at=123.0)
+            loaded, meta = ColumnarOSMData.load_npz(tile_path)
+
+        self.assertEqual(meta["fetched_at"], 123.0)
+        self.assertEqual(loaded.to_osm_data(), self.data.to_osm_data())
+
+    def test_unsupported_version(self):
+        with tempfile.TemporaryDirectory() as path:
+            self.data.save(path)
+            with open(os.path.join(path, "meta.json"), "w") as f:
+                f.write('{"version": 99}')
+
+            with self.assertRaises(ValueError):
+                ColumnarOSMData.load(path)
+
+
+class TestColumnarAnalysis(unittest.TestCase):
+    def setUp(self):
+        generator = SyntheticOSMGenerator(seed=3)
+        self.osm_data = generator.generate(5000, "organic")
+        self.bounds = generator.bounds(5000)
+
+    def analyze(self, osm_data) -> dict:
+        analyzer = AreaAnalyzer()
+        analyzer.osm_fetcher = StaticOSMFetcher(osm_data)
+        return analyzer.perform_analysis(*self.bounds)
+
+    def test_index_matches_dict_index(self):
+        expected = OSMIndex.from_osm_data(self.osm_data)
+        index = OSMIndex.from_osm_data(ColumnarOSMData.from_osm_data(self.osm_data))
+
+        self.assertEqual(index.element_count, expected.element_count)
+        self.assertEqual({name: len(items) for name, items in index.features.items()},
+                         {name: len(items) for name, items in expected.features.items()})
+        for got, want in zip(index.coordinate_arrays(), expected.coordinate_arrays()):
+            np.testing.assert_array_equal(got, want)
+
+    def test_analysis_matches_dict_input(self):
+        expected = self.analyze(self.osm_data)
+
+        with tempfile.TemporaryDirectory() as path:
+            ColumnarOSMData.from_osm_data(self.osm_data).save(path)
+            result = self.analyze(ColumnarOSMData.load(path))
+
+        self.assertEqual(result, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
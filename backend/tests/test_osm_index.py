@@ -0,0 +1,53 @@
+import unittest
+from backend.services.osm_index import OSMIndex
+
+
+class TestOSMIndex(unittest.TestCase):
+    def setUp(self):
+        self.osm_data = {
+            "elements": [
+                {"type": "way", "id": 1, "nodes": [1, 2], "tags": {"highway": "primary", "junction": "roundabout"}},
+                {"type": "way", "id": 2, "nodes": [1, 2, 3, 1], "tags": {"leisure": "park", "natural": "water"}},
+                {"type": "way", "id": 3, "nodes": [1, 2, 3, 1], "tags": {"building": "office"}},
+                {"type": "node", "id": 1, "lat": 50.0, "lon": 30.0},
+                {"type": "node", "id": 2, "lat": 50.1, "lon": 30.1},
+                {"type": "node", "id": 3, "lat": 50.2, "lon": 30.0, "tags": {"highway": "traffic_signals"}},
+                {"type": "node", "id": 4, "tags": {"public_transport": "stop_position"}}
+            ]
+        }
+
+    def test_single_pass_classification(self):
+        index = OSMIndex.from_osm_data(self.osm_data)
+
+        self.assertEqual(index.element_count, 7)
+        self.assertEqual([e["id"] for e in index.features["road"]], [1])
+        self.assertEqual([e["id"] for e in index.features["roundabout"]], [1])
+        self.assertEqual([e["id"] for e in index.features["green"]], [2])
+        self.assertEqual([e["id"] for e in index.features["water"]], [2])
+        self.assertEqual([e["id"] for e in index.features["building"]], [3])
+        self.assertEqual([e["id"] for e in index.features["traffic_control"]], [3])
+        self.assertEqual([e["id"] for e in index.features["transport"]], [4])
+
+    def test_nodes_without_coordinates_are_skipped(self):
+        index = OSMIndex.from_osm_data(self.osm_data)
+
+        self.assertEqual(index.node(2), (50.1, 30.1))
+        self.assertIsNone(index.node(4))
+        self.assertEqual(index.tags("node", 4), {"public_transport": "stop_position"})
+        self.assertEqual(index.tags("way", 3), {"building": "office"})
+
+    def test_node_store_lookups(self):
+        index = OSMIndex.from_osm_data(self.osm_data)
+        index.add({"type": "node", "id": 1, "lat": 50.0, "lon": 30.0})
+
+        self.assertEqual(len(index.node_coords), 3)
+        self.assertIn(3, index.node_coords)
+        self.assertNotIn(4, index.node_coords)
+        self.assertEqual(index.node_coords.contains([3, 4, 1]).tolist(), [True, False, True])
+        with self.assertRaises(KeyError):
+            index.node_coords[4]
+
+    def test_ensure_reuses_index(self):
+        index = OSMIndex.from_osm_data(self.osm_data)
+        self.assertIs(OSMIndex.ensure(index), index)
+        self.assertIsInstance(OSMIndex.ensure(self.osm_data), OSMIndex)
@@ -0,0 +1,190 @@
+import bz2
+import os
+import sqlite3
+import tempfile
+import tracemalloc
+import unittest
+from io import StringIO
+
+from django.core.management import call_command
+from backend.services.osm_data import OSMDataFetcher, matches_feature_filters
+from backend.services.osm_index import OSMIndex
+from backend.services.osm_local import LocalOSMStore, iter_osm_extract
+
+EXTRACT = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="50.4410" lon="30.5010"/>
+  <node id="2" lat="50.4420" lon="30.5020"/>
+  <node id="3" lat="50.4600" lon="30.5300"/>
+  <node id="4" lat="50.4430" lon="30.5030">
+    <tag k="highway" v="bus_stop"/>
+  </node>
+  <node id="5" lat="50.4440" lon="30.5040">
+    <tag k="amenity" v="bench"/>
+  </node>
+  <node id="6" lat="51.0000" lon="31.0000"/>
+  <node id="7" lat="51.0010" lon="31.0010"/>
+  <node id="8" lat="50.4415" lon="30.5015"/>
+  <way id="10">
+    <nd ref="1"/>
+    <nd ref="2"/>
+    <nd ref="3"/>
+    <tag k="highway" v="residential"/>
+  </way>
+  <way id="11">
+    <nd ref="6"/>
+    <nd ref="7"/>
+    <tag k="highway" v="primary"/>
+  </way>
+  <way id="12">
+    <nd ref="1"/>
+    <nd ref="8"/>
+    <tag k="building" v="yes"/>
+  </way>
+  <relation id="20">
+    <member type="way" ref="10" role=""/>
+    <tag k="type" v="route"/>
+  </relation>
+</osm>
+"""
+
+# Парк-мультиполігон: зовнішнє кільце з двох ліній без тегів і внутрішнє кільце
+MULTIPOLYGON_EXTRACT = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="50.00" lon="30.00"/>
+  <node id="2" lat="50.01" lon="30.00"/>
+  <node id="3" lat="50.01" lon="30.01"/>
+  <node id="4" lat="50.00" lon="30.01"/>
+  <node id="5" lat="50.003" lon="30.003"/>
+  <node id="6" lat="50.007" lon="30.003"/>
+  <node id="7" lat="50.007" lon="30.007"/>
+  <way id="10"><nd ref="1"/><nd ref="2"/><nd ref="3"/></way>
+  <way id="11"><nd ref="3"/><nd ref="4"/><nd ref="1"/></way>
+  <way id="12"><nd ref="5"/><nd ref="6"/><nd ref="7"/><nd ref="5"/></way>
+  <way id="13"><nd ref="5"/><nd ref="7"/></way>
+  <relation id="100">
+    <member type="way" ref="10" role="outer"/>
+    <member type="way" ref="11" role="outer"/>
+    <member type="way" ref="12" role="inner"/>
+    <tag k="type" v="multipolygon"/>
+    <tag k="leisure" v="park"/>
+  </relation>
+</osm>
+"""
+
+
+class TestLocalOSMStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.extract = os.path.join(self.tmp.name, "area.osm")
+        with open(self.extract, "w", encoding="utf-8") as f:
+            f.write(EXTRACT)
+        self.db_path = os.path.join(self.tmp.name, "osm.sqlite3")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def import_extract(self) -> LocalOSMStore:
+        store = LocalOSMStore(self.db_path)
+        store.import_records(iter_osm_extract(self.extract), matches_feature_filters)
+        return store
+
+    def test_xml_parser(self):
+        records = list(iter_osm_extract(self.extract))
+
+        self.assertEqual(len(records), 12)
+        self.assertEqual(records[3], ("node", 4, 50.443, 30.503, {"highway": "bus_stop"}))
+        self.assertEqual(records[8], ("way", 10, [1, 2, 3], {"highway": "residential"}))
+
+    def test_xml_parser_memory_does_not_grow(self):
+        def parse_peak(count):
+            path = os.path.join(self.tmp.name, f"large_{count}.osm")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write('<?xml version="1.0" encoding="UTF-8"?>\n<osm version="0.6">\n')
+                for node_id in range(1, count + 1):
+                    f.write(f'  <node id="{node_id}" lat="50.44" lon="30.50"><tag k="highway" v="bus_stop"/></node>\n')
+                f.write('</osm>\n')
+
+            tracemalloc.start()
+            try:
+                for _ in iter_osm_extract(path):
+                    pass
+                return tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+
+        # Розібрані елементи не накопичуються в корені документа
+        self.assertLess(parse_peak(50000), parse_peak(5000) * 2)
+
+    def test_bz2_extract(self):
+        compressed = self.extract + ".bz2"
+        with open(compressed, "wb") as f:
+            f.write(bz2.compress(EXTRACT.encode()))
+
+        self.assertEqual(list(iter_osm_extract(compressed)), list(iter_osm_extract(self.extract)))
+
+    def test_import_keeps_only_needed_data(self):
+        store = self.import_extract()
+        nodes = store.connection.execute("SELECT id FROM nodes ORDER BY id").fetchall()
+
+        # Вузол 5 (непотрібний тег) і вузол 8 (лише в будівлі) відкинуті
+        self.assertEqual([row[0] for row in nodes], [1, 2, 3, 4, 6, 7])
+        self.assertEqual(store.connection.execute("SELECT id FROM ways ORDER BY id").fetchall(), [(10,), (11,)])
+
+    def test_bbox_query(self):
+        store = self.import_extract()
+
+        result = store.get_area_data(50.45, 30.50, 50.44, 30.52)
+
+        elements = {(element["type"], element["id"]): element for element in result["elements"]}
+        self.assertEqual(set(elements), {("way", 10), ("node", 1), ("node", 2), ("node", 3), ("node", 4)})
+        # Лінія повертається повністю, разом з вузлом поза bbox
+        self.assertEqual(elements[("way", 10)]["nodes"], [1, 2, 3])
+        self.assertEqual(elements[("node", 4)]["tags"], {"highway": "bus_stop"})
+        self.assertNotIn("tags", elements[("node", 3)])
+
+    def test_fetcher_uses_local_store(self):
+        store = self.import_extract()
+        fetcher = OSMDataFetcher(tile_cache=None, local_store=store)
+
+        result = fetcher.get_area_data(51.01, 30.99, 50.99, 31.01)
+
+        self.assertEqual([element["id"] for element in result["elements"]], [11, 6, 7])
+
+    def test_import_command(self):
+        out = StringIO()
+
+        call_command("import_osm_extract", self.extract, "--db", self.db_path, stdout=out)
+
+        self.assertIn("Imported 2 ways", out.getvalue())
+        self.assertEqual(len(LocalOSMStore(self.db_path).get_area_data(50.45, 30.50, 50.44, 30.52)["elements"]), 5)
+
+    def test_multipolygon_relations(self):
+        with open(self.extract, "w", encoding="utf-8") as f:
+            f.write(MULTIPOLYGON_EXTRACT)
+        call_command("import_osm_extract", self.extract, "--db", self.db_path, stdout=StringIO())
+
+        # bbox зачіпає лише лінію 10, але відношення приходить з усіма лініями-членами
+        result = LocalOSMStore(self.db_path).get_area_data(50.0105, 29.9995, 50.0095, 30.0005)
+
+        elements = {(element["type"], element["id"]) for element in result["elements"]}
+        self.assertEqual({key for key in elements if key[0] != "node"},
+                         {("relation", 100), ("way", 10), ("way", 11), ("way", 12)})
+        self.assertIn(("node", 4), elements)
+        index = OSMIndex.from_osm_data(result)
+        self.assertEqual([element["id"] for element in index.features["green"]], [100])
+        self.assertGreater(index.multipolygons()[100].area, 0)
+
+    def test_reimport_keeps_relation_links_unique(self):
+        with open(self.extract, "w", encoding="utf-8") as f:
+            f.write(MULTIPOLYGON_EXTRACT)
+        for _ in range(2):
+            call_command("import_osm_extract", self.extract, "--db", self.db_path, stdout=StringIO())
+
+        with sqlite3.connect(self.db_path) as connection:
+            links = connection.execute("SELECT way_id, relation_id FROM relation_ways").fetchall()
+        self.assertEqual(sorted(links), [(10, 100), (11, 100), (12, 100)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import json
+import tracemalloc
+import unittest
+from unittest.mock import patch
+
+from backend.services.osm_data import OSMDataFetcher, RateLimiter
+from backend.services.osm_index import OSMIndex
+from backend.services.osm_stream import OverpassStreamParser
+from backend.services.overpass_client import OverpassClient
+from backend.services.synthetic_osm import SyntheticOSMGenerator
+from overpass_stub import OverpassStub
+
+
+def chunked(raw: bytes, size: int):
+    for start in range(0, len(raw), size):
+        yield raw[start:start + size]
+
+
+class TestOverpassStreamParser(unittest.TestCase):
+    def setUp(self):
+        self.osm_data = SyntheticOSMGenerator(seed=3).generate(2000)
+        self.osm_data["elements"][0]["tags"] = {"name": "Вузол «Поділ»"}
+        self.raw = json.dumps(dict(self.osm_data, remark="runtime error: Query timed out"),
+                              ensure_ascii=False, indent=1).encode()
+
+    def test_elements_match_full_parse(self):
+        for size in (5, 4096):
+            parser = OverpassStreamParser()
+            elements = list(parser.iter_elements(chunked(self.raw, size)))
+
+            self.assertEqual(elements, self.osm_data["elements"])
+            self.assertEqual(parser.element_count, len(elements))
+            self.assertEqual(parser.meta["remark"], "runtime error: Query timed out")
+            self.assertNotIn("elements", parser.meta)
+
+    def test_truncated_response(self):
+        with self.assertRaises(ValueError):
+            list(OverpassStreamParser().iter_elements(chunked(self.raw[:len(self.raw) // 2], 1024)))
+
+    def test_missing_elements_array(self):
+        with self.assertRaises(ValueError):
+            list(OverpassStreamParser().iter_elements([b'{"version": 0.6}']))
+
+    def test_index_from_stream_uses_less_memory(self):
+        raw = json.dumps(SyntheticOSMGenerator(seed=3).generate(50000)).encode()
+
+        tracemalloc.start()
+        try:
+            OSMIndex.from_osm_data(json.loads(raw))
+            full_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.reset_peak()
+
+            OSMIndex.from_osm_data({"elements": OverpassStreamParser().iter_elements(chunked(raw, 65536))})
+            stream_peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        self.assertLess(stream_peak, full_peak * 0.75)
+
+
+class TestStreamingFetcher(unittest.TestCase):
+    def stream_fetcher(self, stub) -> OSMDataFetcher:
+        client = OverpassClient([stub.url], timeout=5, max_retries=0)
+        return OSMDataFetcher(tile_cache=None, stream=True, rate_limiter=RateLimiter(0), client=client)
+
+    def test_streamed_timeout_remark_is_split(self):
+        node = {"type": "node", "id": 1, "lat": 50.0, "lon": 30.0}
+        first = {"type": "way", "id": 2, "nodes": [1], "tags": {"highway": "primary"}}
+        second = {"type": "way", "id": 3, "nodes": [1], "tags": {"highway": "service"}}
+        with OverpassStub(default=(200, {}, {"elements": [node, first, second]})) as stub:
+            stub.queue(200, {"elements": [node, first], "remark": "runtime error: Query timed out"})
+            data = self.stream_fetcher(stub).get_area_data(0.01, 0.0, 0.0, 0.01)
+            index = OSMIndex.from_osm_data(data)
+
+        # Повний запит і чотири чверті; вже отримана лінія не дублюється
+        self.assertEqual(len(stub.requests), 5)
+        self.assertEqual([e["id"] for e in index.features["road"]], [2, 3])
+        self.assertNotIn("remark", data)
+
+    def test_failed_split_after_streamed_timeout_is_reported(self):
+        node = {"type": "node", "id": 1, "lat": 50.0, "lon": 30.0}
+        way = {"type": "way", "id": 2, "nodes": [1], "tags": {"highway": "primary"}}
+        with OverpassStub(default=(400, {}, b"bad request")) as stub:
+            stub.queue(200, {"elements": [node, way], "remark": "runtime error: Query timed out"})
+            data = self.stream_fetcher(stub).get_area_data(0.01, 0.0, 0.0, 0.01)
+            index = OSMIndex.from_osm_data(data)
+
+        self.assertEqual([e["id"] for e in index.features["road"]], [2])
+        self.assertTrue(data["remark"].startswith("failed"))
+
+    def test_broken_stream_is_reported(self):
+        raw = json.dumps({"elements": [{"type": "node", "id": 1, "lat": 50.0, "lon": 30.0}] * 3}).encode()
+        with OverpassStub(default=(200, {}, raw[:len(raw) // 2])) as stub:
+            data = self.stream_fetcher(stub).get_area_data(0.01, 0.0, 0.0, 0.01)
+            index = OSMIndex.from_osm_data(data)
+
+        self.assertEqual(index.node(1), (50.0, 30.0))
+        self.assertTrue(data["remark"].startswith("failed"))
+
+    def test_streaming_mode(self):
+        body = {"elements": [
+            {"type": "node", "id": 1, "lat": 50.0, "lon": 30.0},
+            {"type": "way", "id": 2, "nodes": [1], "tags": {"highway": "primary"}}
+        ]}
+        with OverpassStub(default=(200, {}, body)) as stub:
+            client = OverpassClient([stub.url], timeout=5)
+            fetcher = OSMDataFetcher(tile_cache=None, stream=True, rate_limiter=RateLimiter(0), client=client)
+
+            with patch.object(OverpassStreamParser, 'iter_elements', wraps=OverpassStreamParser().iter_elements) as parse:
+                index = OSMIndex.from_osm_data(fetcher.get_area_data(50.01, 30.0, 50.0, 30.01))
+
+        parse.assert_called_once()
+        self.assertEqual(index.node(1), (50.0, 30.0))
+        self.assertEqual([e["id"] for e in index.features["road"]], [2])
+
+
+if __name__ == '__main__':
+    unittest.main()
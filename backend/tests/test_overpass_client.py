@@ -0,0 +1,126 @@
+import unittest
+
+from backend.services.overpass_client import CircuitBreaker, OverpassClient, OverpassUnavailable
+from overpass_stub import OverpassStub, closed_port_url
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=lambda: self.now)
+
+    def test_opens_after_threshold_and_probes_after_reset(self):
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow())
+
+        self.now = 11
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+        self.now = 22
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+
+class TestOverpassClient(unittest.TestCase):
+    def setUp(self):
+        self.sleeps = []
+
+    def make_client(self, endpoints, **kwargs):
+        kwargs.setdefault("max_retries", 2)
+        return OverpassClient(endpoints, timeout=5, sleep=self.sleeps.append, **kwargs)
+
+    def test_pooled_gzip_session(self):
+        with OverpassStub(default=(200, {}, {"elements": [{"type": "node", "id": 1}]})) as stub:
+            client = self.make_client([stub.url])
+            for _ in range(3):
+                self.assertEqual(client.post("[out:json];").json(), {"elements": [{"type": "node", "id": 1}]})
+
+        self.assertEqual(len(stub.requests), 3)
+        self.assertIn("gzip", stub.requests[0]["headers"]["Accept-Encoding"])
+        # keep-alive: усі запити пройшли через одне з'єднання
+        self.assertEqual(len({request["client"] for request in stub.requests}), 1)
+
+    def test_retry_after_is_respected(self):
+        with OverpassStub() as stub:
+            stub.queue(429, headers={"Retry-After": "3"})
+            client = self.make_client([stub.url])
+
+            response = client.post("[out:json];")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(stub.requests), 2)
+        self.assertEqual(len(self.sleeps), 1)
+        self.assertGreaterEqual(self.sleeps[0], 3)
+
+    def test_long_retry_after_fails_fast(self):
+        with OverpassStub(default=(429, {"Retry-After": "3600"}, {})) as stub:
+            client = self.make_client([stub.url])
+
+            with self.assertRaises(OverpassUnavailable):
+                client.post("[out:json];")
+
+        self.assertEqual(self.sleeps, [])
+
+    def test_backoff_is_bounded(self):
+        client = self.make_client(["http://127.0.0.1:1"], backoff_base=1.0, backoff_max=4.0)
+
+        delays = [client._backoff(attempt) for attempt in range(10) for _ in range(20)]
+
+        self.assertTrue(all(0 <= delay <= 4.0 for delay in delays))
+
+    def test_failover_to_next_endpoint(self):
+        with OverpassStub(default=(200, {}, {"elements": [{"type": "way", "id": 7}]})) as stub:
+            client = self.make_client([closed_port_url(), stub.url])
+
+            response = client.post("[out:json];")
+
+        self.assertEqual(response.json()["elements"][0]["id"], 7)
+        self.assertEqual(self.sleeps, [])
+
+    def test_circuit_breaker_skips_failing_endpoint(self):
+        with OverpassStub(default=(503, {}, {})) as broken, OverpassStub() as healthy:
+            client = self.make_client([broken.url, healthy.url], failure_threshold=2)
+            for _ in range(4):
+                client.post("[out:json];")
+
+        self.assertEqual(len(broken.requests), 2)
+        self.assertEqual(len(healthy.requests), 4)
+
+    def test_unused_half_open_endpoint_keeps_its_probe(self):
+        with OverpassStub() as primary, OverpassStub() as backup:
+            primary.queue(200)
+            primary.queue(503)
+            client = self.make_client([primary.url, backup.url], max_retries=0)
+            breaker = client.breakers[backup.url]
+            breaker.opened_at = breaker.clock() - breaker.reset_timeout
+
+            # Запасний сервер не потрібен - його пробний запит не витрачається
+            client.post("[out:json];")
+            self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+            self.assertFalse(breaker._probe_in_flight)
+
+            response = client.post("[out:json];")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(backup.requests), 1)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_all_endpoints_down(self):
+        client = self.make_client([closed_port_url(), closed_port_url()])
+
+        with self.assertRaises(OverpassUnavailable):
+            client.post("[out:json];")
+
+        self.assertEqual(len(self.sleeps), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import json
+import threading
+import time
+import tracemalloc
+import unittest
+from unittest.mock import patch
+
+from django.test import RequestFactory, TestCase, override_settings
+
+from backend.services import profiling
+from backend.services.profiling import AnalysisProfiler, StageTimer, profiler_from_header
+from backend.views import analyze_area
+
+
+def busy(seconds: float) -> list:
+    deadline = time.perf_counter() + seconds
+    data = []
+    while time.perf_counter() < deadline:
+        data.append([0] * 100)
+    return data
+
+
+class TestStageTimer(unittest.TestCase):
+    def test_records_stages_and_counts(self):
+        timer = StageTimer()
+
+        self.assertEqual(timer.run("double", lambda x: x * 2, 21), 42)
+        timer.run("double", lambda x: x * 2, 1)
+        timer.count("elements", 10)
+
+        data = timer.to_dict()
+        self.assertEqual(data["stages"]["double"]["calls"], 2)
+        self.assertIn("cpu_ms", data["stages"]["double"])
+        self.assertNotIn("peak_kb", data["stages"]["double"])
+        self.assertEqual(data["counts"], {"elements": 10})
+
+    def test_failed_stage_is_still_recorded(self):
+        timer = StageTimer()
+
+        with self.assertRaises(ZeroDivisionError):
+            timer.run("broken", lambda: 1 / 0)
+
+        self.assertEqual(timer.stages["broken"]["calls"], 1)
+
+    def test_memory_peaks(self):
+        timer = StageTimer(trace_memory=True)
+
+        with AnalysisProfiler('memory') as profiler:
+            timer.run("allocate", lambda: [bytearray(1024) for _ in range(1000)])
+
+        self.assertGreater(timer.stages["allocate"]["peak_kb"], 900)
+        self.assertGreater(timer.to_dict()["peak_memory_kb"], 900)
+        self.assertNotIn("peak_memory_kb", StageTimer().to_dict())
+        self.assertTrue(profiler.report()["top"])
+
+    def test_concurrent_memory_profiles(self):
+        first_inside = threading.Event()
+        timers = [StageTimer(trace_memory=True), StageTimer(trace_memory=True)]
+        reports = [None, None]
+
+        def profile(position):
+            with AnalysisProfiler('memory') as profiler:
+                first_inside.set()
+                timers[position].run("allocate", lambda: [bytearray(1024) for _ in range(1000)])
+                time.sleep(0.1)
+            reports[position] = profiler.report()
+
+        # Другий профіль починається, поки перший ще трасує пам'ять
+        first = threading.Thread(target=profile, args=(0,))
+        first.start()
+        first_inside.wait()
+        second = threading.Thread(target=profile, args=(1,))
+        second.start()
+        first.join()
+        second.join()
+
+        for timer, report in zip(timers, reports):
+            self.assertTrue(report["top"])
+            self.assertGreater(timer.stages["allocate"]["peak_kb"], 900)
+        self.assertFalse(tracemalloc.is_tracing())
+
+    def test_busy_memory_profile_is_skipped(self):
+        # Поки інший запит тримає tracemalloc, профіль пам'яті пропускається, а не чекає весь аналіз
+        with profiling._memory_profile_lock:
+            with AnalysisProfiler('memory', memory_wait=0.01) as profiler:
+                self.assertFalse(profiler.traces_memory)
+                self.assertFalse(tracemalloc.is_tracing())
+
+        self.assertEqual(profiler.report()["top"], [])
+
+
+class TestAnalysisProfiler(unittest.TestCase):
+    def test_cprofile(self):
+        with AnalysisProfiler('cprofile') as profiler:
+            busy(0.01)
+
+        functions = [entry["function"] for entry in profiler.report()["top"]]
+        self.assertTrue(any("busy" in name for name in functions))
+
+    def test_sampling(self):
+        with AnalysisProfiler('sampling') as profiler:
+            busy(0.1)
+
+        report = profiler.report()
+        self.assertEqual(report["mode"], "sampling")
+        self.assertTrue(any("busy" in entry["function"] for entry in report["top"]))
+
+    def test_profiler_from_header(self):
+        self.assertIsNone(profiler_from_header('cprofile', enabled=False))
+        self.assertIsNone(profiler_from_header('unknown', enabled=True))
+        self.assertEqual(profiler_from_header(' Sampling ', enabled=True).mode, 'sampling')
+
+
+class TestAnalyzeAreaTimings(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.data = {"nw_lat": 50.5, "nw_lng": 29.5, "se_lat": 49.5, "se_lng": 30.5}
+
+    def _post(self, data, **headers):
+        return self.factory.post('/api/analyze/', data=json.dumps(data),
+                                 content_type='application/json', **headers)
+
+    @patch('backend.views.AreaAnalyzer')
+    def test_timings_are_optional(self, mock_analyzer):
+        def perform_analysis(*bounds, timer):
+            timer.run("fetch", lambda: None)
+            return {"test": "data"}
+        mock_analyzer.return_value.perform_analysis.side_effect = perform_analysis
+
+        without = json.loads(analyze_area(self._post(self.data)).content)
+        self.assertNotIn("timings", without)
+
+        response = json.loads(analyze_area(self._post(dict(self.data, timings=True))).content)
+        self.assertIn("fetch", response["timings"]["stages"])
+        self.assertNotIn("profile", response["timings"])
+
+    @override_settings(ANALYSIS_PROFILING_ENABLED=True)
+    @patch('backend.views.AreaAnalyzer')
+    def test_profile_header(self, mock_analyzer):
+        mock_analyzer.return_value.perform_analysis.return_value = {"test": "data"}
+
+        response = analyze_area(self._post(self.data, HTTP_X_ANALYSIS_PROFILE='cprofile'))
+
+        self.assertEqual(json.loads(response.content)["timings"]["profile"]["mode"], "cprofile")
+
+    @override_settings(ANALYSIS_PROFILING_ENABLED=False)
+    @patch('backend.views.AreaAnalyzer')
+    def test_profile_header_ignored_when_disabled(self, mock_analyzer):
+        mock_analyzer.return_value.perform_analysis.return_value = {"test": "data"}
+
+        response = analyze_area(self._post(self.data, HTTP_X_ANALYSIS_PROFILE='cprofile'))
+
+        self.assertNotIn("timings", json.loads(response.content))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+from unittest.mock import patch
+
+from backend.services.result_store import AnalysisResultStore
+
+
+class TestAnalysisResultStore(unittest.TestCase):
+    def setUp(self):
+        self.store = AnalysisResultStore(max_entries=2, ttl=60)
+        self.bbox = (50.5, 29.5, 49.5, 30.5)
+
+    def test_put_and_get(self):
+        token = self.store.put(self.bbox, '1', {"area": 1})
+
+        self.assertEqual(self.store.get(token), {"area": 1})
+        self.assertEqual(self.store.find(self.bbox, '1'), {"area": 1})
+        self.assertIsNone(self.store.find(self.bbox, '2'))
+        self.assertIsNone(self.store.get('unknown'))
+
+    def test_token_is_stable(self):
+        self.assertEqual(self.store.make_token(self.bbox, '1'), self.store.make_token(self.bbox, '1'))
+        self.assertNotEqual(self.store.make_token(self.bbox, '1'), self.store.make_token(self.bbox, '2'))
+
+    def test_expired_entries_are_dropped(self):
+        with patch('backend.services.result_store.time.time', return_value=1000.0):
+            token = self.store.put(self.bbox, '1', {"area": 1})
+        with patch('backend.services.result_store.time.time', return_value=1061.0):
+            self.assertIsNone(self.store.get(token))
+
+    def test_least_recently_used_is_evicted(self):
+        first = self.store.put((1, 1, 0, 2), '1', {"id": 1})
+        second = self.store.put((2, 1, 0, 2), '1', {"id": 2})
+        self.store.get(first)
+        self.store.put((3, 1, 0, 2), '1', {"id": 3})
+
+        self.assertIsNotNone(self.store.get(first))
+        self.assertIsNone(self.store.get(second))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+
+import numpy as np
+
+from backend.analysis import AreaAnalyzer
+from backend.services.benchmark import StaticOSMFetcher
+from backend.services.osm_index import OSMIndex
+from backend.services.road_graph import RoadGraph, RoadLoadEstimator, _brandes_edge_betweenness
+from backend.services.synthetic_osm import SyntheticOSMGenerator
+
+
+def make_index(coords: dict) -> OSMIndex:
+    return OSMIndex.from_osm_data({"elements": [
+        {"type": "node", "id": node_id, "lat": lat, "lon": lon} for node_id, (lat, lon) in coords.items()
+    ]})
+
+
+def road(road_id: int, nodes, road_type="residential", oneway=False, lanes=1, max_speed=None) -> dict:
+    return {"id": road_id, "type": road_type, "nodes": nodes, "oneway": oneway, "lanes": lanes, "max_speed": max_speed}
+
+
+# Хрест: дорога 1 з заходу на схід через центр 3, дорога 2 з півночі на південь
+CROSS = make_index({
+    1: (50.0, 30.00), 2: (50.0, 30.005), 3: (50.0, 30.01), 4: (50.0, 30.015), 5: (50.0, 30.02),
+    6: (50.01, 30.01), 7: (49.99, 30.01)
+})
+
+
+class TestRoadGraph(unittest.TestCase):
+    def test_shape_points_are_contracted(self):
+        graph = RoadGraph.from_roads([road(1, [1, 2, 3, 4, 5]), road(2, [6, 3, 7])], CROSS)
+
+        self.assertEqual(graph.node_ids.tolist(), [1, 3, 5, 6, 7])
+        self.assertEqual(graph.edge_count, 8)
+        lengths = dict(zip(zip(graph.sources.tolist(), graph.targets.tolist()), graph.lengths.tolist()))
+        self.assertAlmostEqual(lengths[(0, 1)], 715, delta=5)
+        self.assertAlmostEqual(lengths[(0, 1)], lengths[(1, 0)])
+        self.assertEqual(graph.indptr.tolist(), [0, 1, 5, 6, 7, 8])
+
+    def test_oneway_and_non_motor_roads(self):
+        graph = RoadGraph.from_roads([road(1, [1, 2, 3], oneway=True), road(2, [6, 3, 7], road_type="footway")], CROSS)
+
+        self.assertEqual(graph.node_ids.tolist(), [1, 3])
+        self.assertEqual(list(zip(graph.sources.tolist(), graph.targets.tolist())), [(0, 1)])
+        self.assertEqual(graph.roads.tolist(), [0])
+
+    def test_missing_nodes_split_the_road(self):
+        graph = RoadGraph.from_roads([road(1, [1, 2, 99, 4, 5])], CROSS)
+
+        self.assertEqual(graph.node_ids.tolist(), [1, 2, 4, 5])
+        self.assertEqual(graph.edge_count, 4)
+
+    def test_travel_time_uses_speed(self):
+        graph = RoadGraph.from_roads([road(1, [1, 3], max_speed=60), road(2, [3, 5], road_type="service")], CROSS)
+
+        seconds = graph.seconds / graph.lengths
+        self.assertAlmostEqual(seconds[graph.roads == 0][0], 3.6 / 60)
+        self.assertAlmostEqual(seconds[graph.roads == 1][0], 3.6 / 20)
+
+
+class TestRoadLoadEstimator(unittest.TestCase):
+    def test_exact_betweenness_on_a_path(self):
+        graph = RoadGraph.from_roads([road(1, [1, 3]), road(2, [3, 5])], CROSS)
+
+        betweenness, pairs = _brandes_edge_betweenness(graph.adjacency(), graph.vertex_count, range(3))
+
+        edges = dict(zip(zip(graph.sources.tolist(), graph.targets.tolist()), betweenness.tolist()))
+        self.assertEqual(pairs, 6)
+        self.assertEqual(edges, {(0, 1): 2.0, (1, 0): 2.0, (1, 2): 2.0, (2, 1): 2.0})
+
+    def test_ties_split_paths(self):
+        # Ромб 1-3-5-7, симетричний відносно екватора: до протилежної вершини два однакові шляхи
+        square = make_index({1: (0.0, 0.0), 3: (0.005, 0.01), 5: (0.0, 0.02), 7: (-0.005, 0.01)})
+        roads = [road(1, [1, 3]), road(2, [3, 5]), road(3, [5, 7]), road(4, [7, 1])]
+        graph = RoadGraph.from_roads(roads, square)
+
+        betweenness, _ = _brandes_edge_betweenness(graph.adjacency(), graph.vertex_count, [0])
+
+        self.assertEqual(sorted(betweenness.tolist()), [0.0, 0.0, 0.0, 0.0, 0.5, 0.5, 1.5, 1.5])
+
+    def test_main_road_carries_more_traffic(self):
+        index = make_index({
+            1: (50.0, 30.00), 2: (50.0, 30.005), 3: (50.0, 30.01), 4: (50.0, 30.015), 5: (50.0, 30.02),
+            6: (50.01, 30.01), 8: (50.01, 30.005), 9: (49.99, 30.015)
+        })
+        roads = [road(1, [1, 2, 3, 4, 5], road_type="primary", lanes=2),
+                 road(2, [6, 3]), road(3, [8, 2]), road(4, [9, 4])]
+
+        loads, network_load = RoadLoadEstimator(samples=10).estimate(RoadGraph.from_roads(roads, index), len(roads))
+
+        self.assertGreater(loads[0], max(loads[1:]))
+        self.assertGreater(network_load, 50)
+        self.assertLess(network_load, 100)
+
+    def test_parallel_matches_serial(self):
+        generator = SyntheticOSMGenerator(seed=5)
+        osm_index = OSMIndex.from_osm_data(generator.generate(4000))
+        roads, _, _ = AreaAnalyzer()._extract_road_data(osm_index)
+        graph = RoadGraph.from_roads(roads, osm_index)
+
+        serial = RoadLoadEstimator(samples=8).edge_shares(graph)
+        parallel = RoadLoadEstimator(samples=8, workers=2, parallel_min_edges=0).edge_shares(graph)
+
+        np.testing.assert_allclose(parallel, serial)
+
+    def test_analysis_reports_road_loads(self):
+        generator = SyntheticOSMGenerator(seed=2)
+        analyzer = AreaAnalyzer()
+        analyzer.osm_fetcher = StaticOSMFetcher(generator.generate(3000))
+
+        result = analyzer.perform_analysis(*generator.bounds(3000))
+
+        self.assertIsNotNone(result["congestion_details"]["network_load"])
+        loads = [r["load"] for r in result["roads_data"] if "load" in r]
+        self.assertTrue(loads)
+        self.assertTrue(all(0 <= load <= 1 for load in loads))
+
+
+if __name__ == '__main__':
+    unittest.main()
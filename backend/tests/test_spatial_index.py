@@ -0,0 +1,36 @@
+import unittest
+import numpy as np
+from backend.services.geometry import lambert_azimuthal_equal_area
+from backend.services.spatial_index import SegmentGridIndex, point_segment_distance
+
+
+class TestSegmentGridIndex(unittest.TestCase):
+    def test_matches_brute_force(self):
+        rng = np.random.default_rng(7)
+        lat = 50.45 + rng.random(400) * 0.02
+        lon = 30.52 + rng.random(400) * 0.03
+        offsets = np.array([0, 1, 50, 120, 121, 250, 400])
+
+        index = SegmentGridIndex.from_polylines(lat, lon, offsets)
+
+        query_lat = 50.44 + rng.random(200) * 0.04
+        query_lon = 30.51 + rng.random(200) * 0.05
+        result = index.nearest_distance(query_lat, query_lon)
+
+        px, py = lambert_azimuthal_equal_area(query_lat, query_lon, *index.origin)
+        expected = np.array([
+            point_segment_distance(x, y, index.ax, index.ay, index.bx, index.by).min()
+            for x, y in zip(px, py)
+        ])
+        np.testing.assert_allclose(result, expected)
+
+    def test_distance_to_segment_not_vertex(self):
+        index = SegmentGridIndex.from_polylines(
+            np.array([50.0, 50.0]), np.array([30.0, 30.02]), np.array([0, 2])
+        )
+        distance = index.nearest_distance(np.array([50.001]), np.array([30.01]))[0]
+        self.assertAlmostEqual(distance, 0.111, delta=0.002)
+
+    def test_empty_index(self):
+        index = SegmentGridIndex.from_polylines(np.zeros(0), np.zeros(0), np.array([0]))
+        self.assertTrue(np.isinf(index.nearest_distance(np.array([50.0]), np.array([30.0]))).all())
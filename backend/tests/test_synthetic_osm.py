@@ -0,0 +1,75 @@
+import io
+import json
+import unittest
+
+from django.core.management import call_command
+
+from backend.services.analysis import AreaAnalyzer
+from backend.services.benchmark import AnalysisBenchmark, StaticOSMFetcher
+from backend.services.synthetic_osm import SyntheticOSMGenerator
+
+
+class TestSyntheticOSMGenerator(unittest.TestCase):
+    def setUp(self):
+        self.generator = SyntheticOSMGenerator(seed=7)
+
+    def test_same_seed_gives_same_data(self):
+        self.assertEqual(self.generator.generate(2000), SyntheticOSMGenerator(seed=7).generate(2000))
+        self.assertNotEqual(self.generator.generate(2000), SyntheticOSMGenerator(seed=8).generate(2000))
+
+    def test_scale_and_references(self):
+        for layout in ("grid", "organic"):
+            elements = self.generator.generate(5000, layout)["elements"]
+            self.assertGreater(len(elements), 3500)
+            self.assertLess(len(elements), 6500)
+
+            node_ids = {e["id"] for e in elements if e["type"] == "node"}
+            for way in (e for e in elements if e["type"] == "way"):
+                self.assertTrue(set(way["nodes"]) <= node_ids)
+
+    def test_contains_realistic_features(self):
+        elements = self.generator.generate(5000, "organic")["elements"]
+        tags = [e.get("tags", {}) for e in elements]
+
+        self.assertTrue(any("highway" in t and "building" not in t for t in tags))
+        self.assertTrue(any("building" in t for t in tags))
+        self.assertTrue(any(t.get("leisure") in ("park", "garden") for t in tags))
+        self.assertTrue(any(t.get("highway") == "bus_stop" for t in tags))
+
+    def test_unknown_layout(self):
+        with self.assertRaises(ValueError):
+            self.generator.generate(1000, "radial")
+
+    def test_analyzer_runs_on_generated_data(self):
+        analyzer = AreaAnalyzer()
+        analyzer.osm_fetcher = StaticOSMFetcher(self.generator.generate(3000))
+
+        result = analyzer.perform_analysis(*self.generator.bounds(3000))
+
+        self.assertGreater(result["road_count"], 0)
+        self.assertGreater(result["public_transport"], 0)
+
+
+class TestAnalysisBenchmark(unittest.TestCase):
+    def test_report_has_stages_and_throughput(self):
+        report = AnalysisBenchmark(AreaAnalyzer, repeat=1).run([1000])
+
+        self.assertEqual(report["meta"]["seed"], 0)
+        run = report["runs"][0]
+        self.assertGreater(run["throughput_elements_per_second"], 0)
+        self.assertGreater(run["peak_memory_mb"], 0)
+        self.assertIn("extract_road_data", run["stages"])
+        self.assertIn("fetch", run["stages"])
+        self.assertIn("index", run["stages"])
+
+    def test_management_command(self):
+        out = io.StringIO()
+        call_command('benchmark_analysis', sizes='500', repeat=1, analyzer='simple', no_memory=True, stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report["runs"][0]["requested_elements"], 500)
+        self.assertNotIn("peak_memory_mb", report["runs"][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
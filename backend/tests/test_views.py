@@ -1,13 +1,23 @@
 from django.test import TestCase, RequestFactory
 from django.http import JsonResponse
 import json
-from backend.views import analyze_area
-from unittest.mock import patch
+from backend.views import analyze_area, analyze_batch, analyze_grid, analyze_session, analysis_result_items, submit_analysis_job, analysis_job_status, save_project
+from backend.models import AnalyzedArea, Road, HourlyCongestion
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from backend.services.incremental import AnalysisSessionStore, IncrementalAnalysisSession
+from backend.services.jobs import AnalysisJob, AnalysisJobManager
+from backend.services.result_store import AnalysisResultStore
+from unittest.mock import ANY, MagicMock, patch
 
 
 class TestViews(TestCase):
     def setUp(self):
         self.factory = RequestFactory()
+        self.result_store = AnalysisResultStore()
+        store_patcher = patch('backend.views.get_result_store', return_value=self.result_store)
+        store_patcher.start()
+        self.addCleanup(store_patcher.stop)
 
     @patch('backend.views.AreaAnalyzer')
     def test_analyze_area_success(self, mock_analyzer):
@@ -34,7 +44,8 @@ class TestViews(TestCase):
         self.assertIsInstance(response, JsonResponse)
         self.assertEqual(json.loads(response.content), {
             "status": "success",
-            "results": {"test": "data"}
+            "results": {"test": "data"},
+            "result_token": ANY
         })
 
     def test_analyze_area_invalid_method(self):
@@ -77,4 +88,325 @@ class TestViews(TestCase):
         response = analyze_area(request)
 
         self.assertEqual(response.status_code, 400)
-        self.assertIn("Невірний формат координат", str(response.content))
\ No newline at end of file
+        self.assertIn("Невірний формат координат", str(response.content))
+
+    @patch('backend.views.get_job_manager')
+    def test_submit_and_poll_analysis_job(self, mock_manager):
+        job = AnalysisJob((50.5, 29.5, 49.5, 30.5))
+        mock_manager.return_value.submit.return_value = job
+        mock_manager.return_value.get.return_value = job
+
+        data = {"nw_lat": 50.5, "nw_lng": 29.5, "se_lat": 49.5, "se_lng": 30.5}
+        request = self.factory.post('/api/analyze/jobs/', data=json.dumps(data),
+                                    content_type='application/json')
+        response = submit_analysis_job(request)
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(json.loads(response.content)["job_id"], job.id)
+
+        job.status = AnalysisJob.DONE
+        job.result = {"test": "data"}
+        response = analysis_job_status(self.factory.get(f'/api/analyze/jobs/{job.id}/'), job.id)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)["results"], {"test": "data"})
+
+    @patch('backend.views.get_job_manager')
+    def test_unknown_analysis_job(self, mock_manager):
+        mock_manager.return_value.get.return_value = None
+        response = analysis_job_status(self.factory.get('/api/analyze/jobs/missing/'), 'missing')
+        self.assertEqual(response.status_code, 404)
+
+    @patch('backend.views.AreaAnalyzer')
+    def test_analyze_batch_streams_cells(self, mock_analyzer):
+        mock_instance = mock_analyzer.return_value
+        mock_instance.VERSION = '1'
+        mock_instance.perform_batch_analysis.return_value = iter([
+            {"index": 1, "bbox": [50.0, 30.0, 49.5, 30.5], "status": "success", "results": {"cell": 1}},
+            {"index": 0, "bbox": [50.5, 30.0, 50.0, 30.5], "status": "error", "message": "boom"}
+        ])
+
+        data = {"cells": [
+            {"nw_lat": 50.5, "nw_lng": 30.0, "se_lat": 50.0, "se_lng": 30.5},
+            {"nw_lat": 50.0, "nw_lng": 30.0, "se_lat": 49.5, "se_lng": 30.5}
+        ]}
+        request = self.factory.post('/api/analyze/batch/', data=json.dumps(data),
+                                    content_type='application/json')
+        response = analyze_batch(request)
+
+        self.assertEqual(response.status_code, 200)
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([line.get("index") for line in lines[:2]], [1, 0])
+        self.assertEqual(self.result_store.get(lines[0]["result_token"]), {"cell": 1})
+        self.assertNotIn("result_token", lines[1])
+        self.assertEqual(lines[2], {"status": "done", "cells": 2, "failed": 1})
+        mock_instance.perform_batch_analysis.assert_called_once_with(
+            [(50.5, 30.0, 50.0, 30.5), (50.0, 30.0, 49.5, 30.5)]
+        )
+
+    def test_analyze_batch_missing_fields(self):
+        request = self.factory.post('/api/analyze/batch/', data=json.dumps({"cells": [{"nw_lat": 50.5}]}),
+                                    content_type='application/json')
+        response = analyze_batch(request)
+
+        self.assertEqual(response.status_code, 400)
+
+    @patch('backend.views.AreaAnalyzer')
+    def test_analyze_grid(self, mock_analyzer):
+        mock_instance = mock_analyzer.return_value
+        mock_instance.perform_grid_analysis.return_value = {"rows": 1, "columns": 2, "layers": {"congestion": [[10, 50]]}}
+
+        data = {"nw_lat": 50.5, "nw_lng": 30.0, "se_lat": 50.0, "se_lng": 30.5, "cell_size_m": 500}
+        request = self.factory.post('/api/analyze/grid/', data=json.dumps(data), content_type='application/json')
+        response = analyze_grid(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)["results"]["layers"]["congestion"], [[10, 50]])
+        mock_instance.perform_grid_analysis.assert_called_once_with(50.5, 30.0, 50.0, 30.5, 500.0, timer=ANY)
+
+        mock_instance.perform_grid_analysis.side_effect = ValueError("Too many grid cells")
+        response = analyze_grid(self.factory.post('/api/analyze/grid/', data=json.dumps(data),
+                                                  content_type='application/json'))
+        self.assertEqual(response.status_code, 400)
+
+    @patch.object(IncrementalAnalysisSession, 'update', return_value={"test": "data"})
+    @patch('backend.views.get_session_store')
+    def test_analyze_session_reuses_session(self, mock_store, mock_update):
+        mock_store.return_value = AnalysisSessionStore()
+
+        data = {"nw_lat": 50.5, "nw_lng": 30.0, "se_lat": 50.0, "se_lng": 30.5}
+        response = analyze_session(self.factory.post('/api/analyze/session/', data=json.dumps(data),
+                                                     content_type='application/json'))
+        first = json.loads(response.content)
+
+        data.update(nw_lat=50.6, session_id=first["session_id"])
+        response = analyze_session(self.factory.post('/api/analyze/session/', data=json.dumps(data),
+                                                     content_type='application/json'))
+        second = json.loads(response.content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(second["session_id"], first["session_id"])
+        self.assertEqual(second["bounds"], [[50.6, 30.0], [50.0, 30.5]])
+        self.assertEqual(self.result_store.get(second["result_token"]), {"test": "data"})
+        mock_update.assert_called_with(50.6, 30.0, 50.0, 30.5, timer=ANY)
+
+    @patch('backend.views.AreaAnalyzer')
+    def test_analyze_area_summary_and_fields(self, mock_analyzer):
+        mock_instance = mock_analyzer.return_value
+        mock_instance.VERSION = '1'
+        mock_instance.perform_analysis.return_value = {
+            "congestion": 40, "ecology": 60, "roads_data": [{"id": 1}, {"id": 2}], "green_spaces_data": []
+        }
+        data = {"nw_lat": 50.5, "nw_lng": 29.5, "se_lat": 49.5, "se_lng": 30.5, "detail": "summary"}
+
+        response = analyze_area(self.factory.post('/api/analyze/', data=json.dumps(data),
+                                                  content_type='application/json'))
+        self.assertEqual(json.loads(response.content)["results"], {
+            "congestion": 40, "ecology": 60, "detail_counts": {"roads_data": 2, "green_spaces_data": 0}
+        })
+
+        response = analyze_area(self.factory.post('/api/analyze/?fields=ecology,missing', data=json.dumps(data),
+                                                  content_type='application/json'))
+        self.assertEqual(json.loads(response.content)["results"], {"ecology": 60})
+
+        data["detail"] = "everything"
+        response = analyze_area(self.factory.post('/api/analyze/', data=json.dumps(data),
+                                                  content_type='application/json'))
+        self.assertEqual(response.status_code, 400)
+
+    @patch('backend.views.AreaAnalyzer')
+    def test_analyze_area_reports_incomplete_data(self, mock_analyzer):
+        mock_instance = mock_analyzer.return_value
+        mock_instance.VERSION = '1'
+        mock_instance.perform_analysis.return_value = {
+            "incomplete": True, "warnings": ["incomplete: 2 sub-queries failed"], "ecology": 60
+        }
+        data = {"nw_lat": 50.5, "nw_lng": 29.5, "se_lat": 49.5, "se_lng": 30.5}
+
+        # Ознаки неповних даних не відкидаються проекцією fields
+        response = analyze_area(self.factory.post('/api/analyze/?fields=ecology', data=json.dumps(data),
+                                                  content_type='application/json'))
+        self.assertEqual(json.loads(response.content)["results"], {
+            "ecology": 60, "incomplete": True, "warnings": ["incomplete: 2 sub-queries failed"]
+        })
+
+    def test_analysis_result_items_pages(self):
+        token = self.result_store.put((50.5, 29.5, 49.5, 30.5), '1', {"roads_data": [{"id": i} for i in range(5)]})
+
+        response = analysis_result_items(self.factory.get('/api/analyze/results/', {'offset': 2, 'limit': 2}),
+                                         token, 'roads_data')
+        page = json.loads(response.content)
+        self.assertEqual([item["id"] for item in page["items"]], [2, 3])
+        self.assertEqual((page["total"], page["next_offset"]), (5, 4))
+
+        response = analysis_result_items(self.factory.get('/api/analyze/results/', {'offset': 4}), token, 'roads_data')
+        self.assertIsNone(json.loads(response.content)["next_offset"])
+
+        self.assertEqual(analysis_result_items(self.factory.get('/'), 'missing', 'roads_data').status_code, 404)
+        self.assertEqual(analysis_result_items(self.factory.get('/'), token, 'congestion').status_code, 404)
+        self.assertEqual(analysis_result_items(self.factory.get('/', {'limit': 0}), token, 'roads_data').status_code,
+                         400)
+
+    @override_settings(ANALYSIS_SAVE_BATCH_SIZE=100)
+    @patch('backend.views.AreaAnalyzer')
+    def test_save_project_uses_bulk_inserts(self, mock_analyzer):
+        mock_analyzer.return_value.perform_analysis.return_value = {
+            "bounds": [[50.5, 29.5], [49.5, 30.5]],
+            "area": 100,
+            "road_count": 250,
+            "road_types": {"Головні": 50, "Місцеві": 200},
+            "congestion": 40,
+            "ecology": 60,
+            "pedestrian_friendly": 50,
+            "public_transport": 30,
+            "hourly_congestion": list(range(24)),
+            "roads_data": [
+                {"id": i, "name": f"Road {i}", "type": "residential", "length": 0.1}
+                for i in range(250)
+            ],
+            "green_spaces_data": [{"id": 1, "name": "Park", "type": "park"}],
+            "water_features_data": []
+        }
+
+        request = self.factory.post(
+            '/api/save-project/',
+            data=json.dumps({"nw_coords": "50.5, 29.5", "se_coords": "49.5, 30.5"}),
+            content_type='application/json'
+        )
+        request.user = get_user_model().objects.create_user(username='planner', password='12345')
+
+        # savepoint + проєкт + статистика + погодинні + 3 пачки доріг + зелені зони + release
+        with self.assertNumQueries(9):
+            response = save_project(request)
+
+        self.assertEqual(response.status_code, 200)
+        project = AnalyzedArea.objects.get(id=json.loads(response.content)["project_id"])
+        self.assertEqual(Road.objects.filter(area=project).count(), 250)
+        self.assertEqual(HourlyCongestion.objects.filter(area=project).count(), 24)
+
+    @patch('backend.views.AreaAnalyzer')
+    def test_save_project_reuses_stored_result(self, mock_analyzer):
+        result = {
+            "bounds": [[50.5, 29.5], [49.5, 30.5]],
+            "area": 100,
+            "road_count": 1,
+            "road_types": {"Місцеві": 1},
+            "congestion": 40,
+            "ecology": 60,
+            "pedestrian_friendly": 50,
+            "public_transport": 30,
+            "hourly_congestion": list(range(24)),
+            "roads_data": [{"id": 1, "name": "Road", "type": "residential", "length": 0.1}],
+            "green_spaces_data": [],
+            "water_features_data": []
+        }
+        mock_analyzer.VERSION = '1'
+        token = self.result_store.put((50.5, 29.5, 49.5, 30.5), '1', result)
+
+        request = self.factory.post(
+            '/api/save-project/',
+            data=json.dumps({"nw_coords": "50.5, 29.5", "se_coords": "49.5, 30.5", "result_token": token}),
+            content_type='application/json'
+        )
+        request.user = get_user_model().objects.create_user(username='planner', password='12345')
+
+        response = save_project(request)
+
+        self.assertEqual(response.status_code, 200)
+        mock_analyzer.return_value.perform_analysis.assert_not_called()
+        project = AnalyzedArea.objects.get(id=json.loads(response.content)["project_id"])
+        self.assertEqual(project.road_count, 1)
+
+    @patch('backend.views.AreaAnalyzer')
+    def test_save_project_rejects_token_of_other_area(self, mock_analyzer):
+        mock_analyzer.VERSION = '1'
+        stale = {"bounds": [[10.0, 10.0], [9.0, 11.0]], "area": 1, "road_count": 99}
+        token = self.result_store.put((10.0, 10.0, 9.0, 11.0), '1', stale)
+        mock_analyzer.return_value.perform_analysis.return_value = {
+            "bounds": [[50.5, 29.5], [49.5, 30.5]], "area": 100, "road_count": 0, "road_types": {},
+            "congestion": 40, "ecology": 60, "pedestrian_friendly": 50, "public_transport": 30,
+            "hourly_congestion": list(range(24)), "roads_data": [], "green_spaces_data": [],
+            "water_features_data": []
+        }
+
+        request = self.factory.post(
+            '/api/save-project/',
+            data=json.dumps({"nw_coords": "50.5, 29.5", "se_coords": "49.5, 30.5", "result_token": token}),
+            content_type='application/json'
+        )
+        request.user = get_user_model().objects.create_user(username='planner', password='12345')
+
+        response = save_project(request)
+
+        self.assertEqual(response.status_code, 200)
+        mock_analyzer.return_value.perform_analysis.assert_called_once_with(50.5, 29.5, 49.5, 30.5)
+        project = AnalyzedArea.objects.get(id=json.loads(response.content)["project_id"])
+        self.assertEqual((project.north, project.road_count), (50.5, 0))
+
+    @patch('backend.views.AreaAnalyzer')
+    def test_save_project_reanalyzes_incomplete_result(self, mock_analyzer):
+        mock_analyzer.VERSION = '1'
+        complete = {
+            "bounds": [[50.5, 29.5], [49.5, 30.5]], "area": 100, "road_count": 7, "road_types": {},
+            "congestion": 40, "ecology": 60, "pedestrian_friendly": 50, "public_transport": 30,
+            "hourly_congestion": list(range(24)), "roads_data": [], "green_spaces_data": [],
+            "water_features_data": [], "incomplete": False, "warnings": []
+        }
+        partial = dict(complete, road_count=2, incomplete=True, warnings=["failed: timeout"])
+        token = self.result_store.put((50.5, 29.5, 49.5, 30.5), '1', partial)
+        mock_analyzer.return_value.perform_analysis.return_value = complete
+
+        for payload in ({"result_token": token}, {}):
+            request = self.factory.post('/api/save-project/', data=json.dumps(
+                {"nw_coords": "50.5, 29.5", "se_coords": "49.5, 30.5", **payload}
+            ), content_type='application/json')
+            request.user = get_user_model().objects.get_or_create(username='planner')[0]
+
+            response = save_project(request)
+
+            self.assertEqual(response.status_code, 200)
+            project = AnalyzedArea.objects.get(id=json.loads(response.content)["project_id"])
+            self.assertEqual(project.road_count, 7)
+        self.assertEqual(mock_analyzer.return_value.perform_analysis.call_count, 2)
+
+    @patch('backend.views.AreaAnalyzer')
+    def test_save_project_reuses_job_result_with_template_bounds(self, mock_analyzer):
+        mock_analyzer.VERSION = '1'
+        job_analyzer = MagicMock(VERSION='1')
+        job_analyzer.perform_analysis.side_effect = lambda north, west, south, east: {
+            "bounds": [[north, west], [south, east]], "area": 1, "road_count": 3, "road_types": {},
+            "congestion": 40, "ecology": 60, "pedestrian_friendly": 50, "public_transport": 30,
+            "hourly_congestion": list(range(24)), "roads_data": [], "green_spaces_data": [],
+            "water_features_data": []
+        }
+        manager = AnalysisJobManager(max_workers=1, analyzer_factory=lambda: job_analyzer,
+                                     result_store=self.result_store)
+
+        # Клік по мапі дає координати повної точності, на екрані - лише 4 знаки
+        data = {"nw_lat": 50.4512345678, "nw_lng": 30.5123456789, "se_lat": 50.4412345678, "se_lng": 30.5323456789}
+        with patch('backend.views.get_job_manager', return_value=manager):
+            job_id = json.loads(submit_analysis_job(self.factory.post(
+                '/api/analyze/jobs/', data=json.dumps(data), content_type='application/json'
+            )).content)["job_id"]
+            manager._executor.shutdown(wait=True)
+            job = json.loads(analysis_job_status(
+                self.factory.get('/api/analyze/jobs/', {'detail': 'summary'}), job_id
+            ).content)
+
+        # Шаблон надсилає межі із задачі у тому ж вигляді, що й JS-рядок `${lat}, ${lng}`
+        page = self.client.get('/city-changer/').content.decode()
+        self.assertIn('results.dataset.bounds', page)
+        bounds = job["bounds"]
+        request = self.factory.post('/api/save-project/', data=json.dumps({
+            "nw_coords": f"{bounds[0][0]}, {bounds[0][1]}",
+            "se_coords": f"{bounds[1][0]}, {bounds[1][1]}",
+            "result_token": job["result_token"]
+        }), content_type='application/json')
+        request.user = get_user_model().objects.create_user(username='planner', password='12345')
+
+        response = save_project(request)
+
+        self.assertEqual(response.status_code, 200)
+        mock_analyzer.return_value.perform_analysis.assert_not_called()
+        project = AnalyzedArea.objects.get(id=json.loads(response.content)["project_id"])
+        self.assertEqual((project.north, project.road_count), (50.45123, 3))
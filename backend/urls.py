@@ -13,6 +13,13 @@ urlpatterns = [
     path('signup/', views.signup_view, name='signup'),
     path('profile/', views.profile_view, name='profile'),
     path('api/analyze/', views.analyze_area, name='analyze_area'),
+    path('api/analyze/batch/', views.analyze_batch, name='analyze_batch'),
+    path('api/analyze/grid/', views.analyze_grid, name='analyze_grid'),
+    path('api/analyze/session/', views.analyze_session, name='analyze_session'),
+    path('api/analyze/jobs/', views.submit_analysis_job, name='submit_analysis_job'),
+    path('api/analyze/jobs/<str:job_id>/', views.analysis_job_status, name='analysis_job_status'),
+    path('api/analyze/results/<str:result_token>/<str:field>/', views.analysis_result_items,
+         name='analysis_result_items'),
     path('city-changer/', views.city_changer_view, name='city_changer'),
     path('myprojects/', views.my_projects, name='myprojects'),
     path('api/save-project/', views.save_project, name='save_project'),
@@ -3,15 +3,28 @@ from django.contrib.auth import login as auth_login, logout
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib import messages
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.serializers.json import DjangoJSONEncoder
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.conf import settings
+from contextlib import nullcontext
+from itertools import islice
 import json
+import logging
 from .models import AnalyzedArea, Road, RoadTypeStats, HourlyCongestion, GreenSpace, WaterFeature
 from .forms import CustomUserCreationForm
 from backend.services.analysis import AreaAnalyzer
+from backend.services.incremental import get_session_store
+from backend.services.jobs import get_job_manager, normalize_bbox
+from backend.services.profiling import StageTimer, profiler_from_header
+from backend.services.projection import DETAIL_FIELDS, DETAIL_LEVELS, paginate, parse_fields, project_results
+from backend.services.result_store import get_result_store
 from django.shortcuts import get_object_or_404
 
+logger = logging.getLogger(__name__)
+
 
 @login_required
 def my_projects(request):
@@ -57,12 +70,137 @@ def analyze_area(request):
         se_lat = float(data['se_lat'])
         se_lng = float(data['se_lng'])
 
-        results = analyzer.perform_analysis(nw_lat, nw_lng, se_lat, se_lng)
+        # fields=a,b,c або detail=summary - без великих списків у відповіді
+        fields = parse_fields(data.get('fields', request.GET.get('fields')))
+        detail = data.get('detail', request.GET.get('detail'))
+        if detail is not None and detail not in DETAIL_LEVELS:
+            return _unknown_detail_response(detail)
+
+        # Профілювання вмикається заголовком X-Analysis-Profile: cprofile | sampling | memory
+        profiler = profiler_from_header(request.headers.get('X-Analysis-Profile'),
+                                        getattr(settings, 'ANALYSIS_PROFILING_ENABLED', False))
+
+        with profiler or nullcontext():
+            # Пам'ять етапів рахується, лише якщо профайлер отримав tracemalloc
+            timer = StageTimer(trace_memory=profiler is not None and profiler.traces_memory)
+            results = analyzer.perform_analysis(nw_lat, nw_lng, se_lat, se_lng, timer=timer)
+        result_token = get_result_store().put(
+            normalize_bbox(nw_lat, nw_lng, se_lat, se_lng), analyzer.VERSION, results
+        )
+
+        response = {
+            'status': 'success',
+            'results': project_results(results, fields, detail),
+            'result_token': result_token
+        }
+        if data.get('timings') or request.GET.get('timings') == '1' or profiler:
+            response['timings'] = timer.to_dict()
+        if profiler:
+            response['timings']['profile'] = profiler.report()
+            logger.info(f"Analysis profile ({profiler.mode}): {response['timings']['profile']['top'][:10]}")
+
+        return JsonResponse(response)
+
+    except ValueError as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Invalid coordinate values: {str(e)}'
+        }, status=400)
+    except KeyError as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Missing required field: {str(e)}'
+        }, status=400)
+    except Exception as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Analysis failed: {str(e)}'
+        }, status=500)
+
 
+@csrf_exempt
+@require_http_methods(["POST"])
+def analyze_batch(request):
+    # Відповідь - NDJSON: рядок на кожну клітинку в порядку готовності, останній рядок - підсумок
+    try:
+        data = json.loads(request.body)
+        cells = [
+            (float(cell['nw_lat']), float(cell['nw_lng']), float(cell['se_lat']), float(cell['se_lng']))
+            for cell in data['cells']
+        ]
+        analyzer = AreaAnalyzer()
+        outcomes = analyzer.perform_batch_analysis(cells)
+    except (ValueError, TypeError) as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Invalid cells: {str(e)}'
+        }, status=400)
+    except KeyError as e:
         return JsonResponse({
+            'status': 'error',
+            'message': f'Missing required field: {str(e)}'
+        }, status=400)
+
+    result_store = get_result_store()
+
+    def stream():
+        failed = 0
+        try:
+            for outcome in outcomes:
+                if outcome['status'] == 'success':
+                    outcome['result_token'] = result_store.put(
+                        normalize_bbox(*outcome['bbox']), analyzer.VERSION, outcome['results']
+                    )
+                else:
+                    failed += 1
+                yield json.dumps(outcome, cls=DjangoJSONEncoder) + '\n'
+        except Exception as e:
+            logger.error(f"Batch analysis failed: {e}")
+            yield json.dumps({'status': 'error', 'message': f'Analysis failed: {str(e)}'}) + '\n'
+            return
+        yield json.dumps({'status': 'done', 'cells': len(cells), 'failed': failed}) + '\n'
+
+    return StreamingHttpResponse(stream(), content_type='application/x-ndjson')
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def analyze_session(request):
+    # Повторні запити з тим самим session_id довантажують лише нові смуги області
+    try:
+        data = json.loads(request.body)
+
+        nw_lat = float(data['nw_lat'])
+        nw_lng = float(data['nw_lng'])
+        se_lat = float(data['se_lat'])
+        se_lng = float(data['se_lng'])
+
+        fields = parse_fields(data.get('fields', request.GET.get('fields')))
+        detail = data.get('detail', request.GET.get('detail'))
+        if detail is not None and detail not in DETAIL_LEVELS:
+            return _unknown_detail_response(detail)
+
+        session_store = get_session_store()
+        session = session_store.get(data['session_id']) if data.get('session_id') else None
+        if session is None:
+            session = session_store.create(AreaAnalyzer())
+
+        timer = StageTimer()
+        with session.lock:
+            results = session.update(nw_lat, nw_lng, se_lat, se_lng, timer=timer)
+        bbox = normalize_bbox(nw_lat, nw_lng, se_lat, se_lng)
+        result_token = get_result_store().put(bbox, session.analyzer.VERSION, results)
+
+        response = {
             'status': 'success',
-            'results': results
-        })
+            'session_id': session.id,
+            'bounds': [[bbox[0], bbox[1]], [bbox[2], bbox[3]]],
+            'results': project_results(results, fields, detail),
+            'result_token': result_token
+        }
+        if data.get('timings') or request.GET.get('timings') == '1':
+            response['timings'] = timer.to_dict()
+        return JsonResponse(response)
 
     except ValueError as e:
         return JsonResponse({
@@ -81,6 +219,128 @@ def analyze_area(request):
         }, status=500)
 
 
+@csrf_exempt
+@require_http_methods(["POST"])
+def analyze_grid(request):
+    try:
+        data = json.loads(request.body)
+        analyzer = AreaAnalyzer()
+
+        nw_lat = float(data['nw_lat'])
+        nw_lng = float(data['nw_lng'])
+        se_lat = float(data['se_lat'])
+        se_lng = float(data['se_lng'])
+        cell_size_m = float(data['cell_size_m']) if data.get('cell_size_m') is not None else None
+
+        timer = StageTimer()
+        results = analyzer.perform_grid_analysis(nw_lat, nw_lng, se_lat, se_lng, cell_size_m, timer=timer)
+
+        response = {
+            'status': 'success',
+            'results': results
+        }
+        if data.get('timings') or request.GET.get('timings') == '1':
+            response['timings'] = timer.to_dict()
+        return JsonResponse(response)
+
+    except ValueError as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Invalid grid parameters: {str(e)}'
+        }, status=400)
+    except KeyError as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Missing required field: {str(e)}'
+        }, status=400)
+    except Exception as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Analysis failed: {str(e)}'
+        }, status=500)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def submit_analysis_job(request):
+    try:
+        data = json.loads(request.body)
+
+        nw_lat = float(data['nw_lat'])
+        nw_lng = float(data['nw_lng'])
+        se_lat = float(data['se_lat'])
+        se_lng = float(data['se_lng'])
+
+        job = get_job_manager().submit(nw_lat, nw_lng, se_lat, se_lng)
+
+        return JsonResponse({
+            'status': 'success',
+            **job.to_dict()
+        }, status=202)
+
+    except ValueError as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Invalid coordinate values: {str(e)}'
+        }, status=400)
+    except KeyError as e:
+        return JsonResponse({
+            'status': 'error',
+            'message': f'Missing required field: {str(e)}'
+        }, status=400)
+
+
+@require_http_methods(["GET"])
+def analysis_job_status(request, job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return JsonResponse({'status': 'error', 'message': 'Job not found'}, status=404)
+
+    detail = request.GET.get('detail')
+    if detail is not None and detail not in DETAIL_LEVELS:
+        return _unknown_detail_response(detail)
+
+    data = job.to_dict()
+    if 'results' in data:
+        data['results'] = project_results(data['results'], parse_fields(request.GET.get('fields')), detail)
+    return JsonResponse({
+        'status': 'success',
+        **data
+    })
+
+
+@require_http_methods(["GET"])
+def analysis_result_items(request, result_token, field):
+    # Сторінки великих списків результату, прибраних із відповіді через detail=summary
+    if field not in DETAIL_FIELDS:
+        return JsonResponse({'status': 'error', 'message': f'Unknown field: {field}'}, status=404)
+
+    results = get_result_store().get(result_token)
+    if results is None:
+        return JsonResponse({'status': 'error', 'message': 'Result not found or expired'}, status=404)
+
+    try:
+        offset = int(request.GET.get('offset', 0))
+        limit = min(int(request.GET.get('limit', getattr(settings, 'ANALYSIS_RESULT_PAGE_SIZE', 500))),
+                    getattr(settings, 'ANALYSIS_RESULT_PAGE_MAX', 5000))
+        page = paginate(results.get(field, []), offset, limit)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': f'Invalid page: {str(e)}'}, status=400)
+
+    return JsonResponse({
+        'status': 'success',
+        'field': field,
+        **page
+    })
+
+
+def _unknown_detail_response(detail) -> JsonResponse:
+    return JsonResponse({
+        'status': 'error',
+        'message': f'Unknown detail level: {detail}'
+    }, status=400)
+
+
 def signup_view(request):
     if request.method == 'POST':
         form = CustomUserCreationForm(request.POST)
@@ -149,69 +409,39 @@ def about_view(request):
 def save_project(request):
     try:
         data = json.loads(request.body)
-
-        analyzer = AreaAnalyzer()
-        nw_lat, nw_lng = map(float, data['nw_coords'].split(','))
-        se_lat, se_lng = map(float, data['se_coords'].split(','))
-
-        analysis_results = analyzer.perform_analysis(nw_lat, nw_lng, se_lat, se_lng)
-
-        project = AnalyzedArea.objects.create(
-            user=request.user,
-            north=analysis_results['bounds'][0][0],
-            south=analysis_results['bounds'][1][0],
-            east=analysis_results['bounds'][1][1],
-            west=analysis_results['bounds'][0][1],
-            area=analysis_results['area'],
-            road_count=analysis_results['road_count'],
-            congestion=analysis_results['congestion'],
-            ecology=analysis_results['ecology'],
-            pedestrian_friendly=analysis_results['pedestrian_friendly'],
-            public_transport=analysis_results['public_transport']
-        )
-
-        for road_type, count in analysis_results['road_types'].items():
-            RoadTypeStats.objects.create(
-                area=project,
-                road_type=road_type,
-                count=count
-            )
-
-        hourly_congestion_data = analysis_results.get('hourly_congestion', [])
-        print(f"Saving hourly congestion data: {hourly_congestion_data}")
-
-        for hour, level in enumerate(hourly_congestion_data):
-            HourlyCongestion.objects.create(
-                area=project,
-                hour=hour,
-                congestion_level=level
-            )
-            print(f"Created HourlyCongestion: hour={hour}, level={level}")
-
-        for road in analysis_results.get('roads_data', []):
-            Road.objects.create(
-                area=project,
-                osm_id=road['id'],
-                name=road['name'],
-                road_type=road['type'],
-                length=road['length']
-            )
-
-        for space in analysis_results.get('green_spaces_data', []):
-            GreenSpace.objects.create(
-                area=project,
-                osm_id=space['id'],
-                name=space['name'],
-                space_type=space['type']
-            )
-
-        for water in analysis_results.get('water_features_data', []):
-            WaterFeature.objects.create(
-                area=project,
-                osm_id=water['id'],
-                name=water['name'],
-                feature_type=water['type']
-            )
+        result_store = get_result_store()
+
+        bbox = None
+        if 'nw_coords' in data or 'se_coords' in data:
+            nw_lat, nw_lng = map(float, data['nw_coords'].split(','))
+            se_lat, se_lng = map(float, data['se_coords'].split(','))
+            bbox = normalize_bbox(nw_lat, nw_lng, se_lat, se_lng)
+
+        # Токен - хеш bbox і версії аналізатора: результат іншої області
+        # або старої версії не зберігається під координатами цього запиту
+        analysis_results = None
+        token = data.get('result_token')
+        if token and (bbox is None or token == result_store.make_token(bbox, AreaAnalyzer.VERSION)):
+            analysis_results = result_store.get(token)
+        elif token:
+            logger.warning(f"Result token {token} does not match the submitted area, analyzing it again")
+
+        if analysis_results is None and bbox is not None:
+            analysis_results = result_store.find(bbox, AreaAnalyzer.VERSION)
+
+        # Результат, порахований без частини даних Overpass, лишається у сховищі для
+        # сторінок списків, але у проєкт не зберігається - область аналізується заново
+        if analysis_results is not None and analysis_results.get('incomplete'):
+            logger.info("Stored result is incomplete, analyzing the area again before saving")
+            analysis_results = None
+
+        if analysis_results is None:
+            if bbox is None:
+                raise ValueError("nw_coords and se_coords are required")
+            analyzer = AreaAnalyzer()
+            analysis_results = analyzer.perform_analysis(nw_lat, nw_lng, se_lat, se_lng)
+
+        project = _save_analysis_results(request.user, analysis_results)
 
         return JsonResponse({
             'status': 'success',
@@ -226,6 +456,69 @@ def save_project(request):
         }, status=400)
 
 
+def _bulk_create(model, objects, batch_size: int):
+    # Рядки створюються генератором і вставляються пачками, тож у пам'яті
+    # одночасно тримається не більше batch_size об'єктів
+    objects = iter(objects)
+    while True:
+        batch = list(islice(objects, batch_size))
+        if not batch:
+            break
+        model.objects.bulk_create(batch, batch_size=batch_size)
+
+
+@transaction.atomic
+def _save_analysis_results(user, analysis_results: dict) -> AnalyzedArea:
+    batch_size = getattr(settings, 'ANALYSIS_SAVE_BATCH_SIZE', 1000)
+
+    project = AnalyzedArea.objects.create(
+        user=user,
+        north=analysis_results['bounds'][0][0],
+        south=analysis_results['bounds'][1][0],
+        east=analysis_results['bounds'][1][1],
+        west=analysis_results['bounds'][0][1],
+        area=analysis_results['area'],
+        road_count=analysis_results['road_count'],
+        congestion=analysis_results['congestion'],
+        ecology=analysis_results['ecology'],
+        pedestrian_friendly=analysis_results['pedestrian_friendly'],
+        public_transport=analysis_results['public_transport']
+    )
+
+    _bulk_create(RoadTypeStats, (
+        RoadTypeStats(area=project, road_type=road_type, count=count)
+        for road_type, count in analysis_results['road_types'].items()
+    ), batch_size)
+
+    _bulk_create(HourlyCongestion, (
+        HourlyCongestion(area=project, hour=hour, congestion_level=level)
+        for hour, level in enumerate(analysis_results.get('hourly_congestion', []))
+    ), batch_size)
+
+    _bulk_create(Road, (
+        Road(
+            area=project,
+            osm_id=road['id'],
+            name=road['name'],
+            road_type=road['type'],
+            length=road['length']
+        )
+        for road in analysis_results.get('roads_data', [])
+    ), batch_size)
+
+    _bulk_create(GreenSpace, (
+        GreenSpace(area=project, osm_id=space['id'], name=space['name'], space_type=space['type'])
+        for space in analysis_results.get('green_spaces_data', [])
+    ), batch_size)
+
+    _bulk_create(WaterFeature, (
+        WaterFeature(area=project, osm_id=water['id'], name=water['name'], feature_type=water['type'])
+        for water in analysis_results.get('water_features_data', [])
+    ), batch_size)
+
+    return project
+
+
 @login_required
 @require_http_methods(["DELETE"])
 def delete_project(request, project_id):
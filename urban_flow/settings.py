@@ -126,4 +126,79 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:8000",
-]
\ No newline at end of file
+]
+
+OSM_TILE_CACHE_DIR = os.environ.get('OSM_TILE_CACHE_DIR')
+OSM_TILE_SIZE = 0.01
+OSM_TILE_CACHE_TTL = 24 * 60 * 60
+OSM_TILE_CACHE_MAX_TILES = 20000
+# columnar - тайл як масиви ColumnarOSMData в одному .npz, json - список елементів
+OSM_TILE_CACHE_FORMAT = 'columnar'
+
+ANALYSIS_JOB_WORKERS = 4
+ANALYSIS_JOB_RETENTION = 10 * 60
+
+ANALYSIS_SAVE_BATCH_SIZE = 1000
+
+ANALYSIS_RESULT_STORE_SIZE = 256
+ANALYSIS_RESULT_TTL = 15 * 60
+
+# Дозволяє заголовок X-Analysis-Profile для /api/analyze/
+ANALYSIS_PROFILING_ENABLED = DEBUG
+
+# Потоковий розбір відповіді Overpass без повного списку елементів у пам'яті
+OSM_STREAMING = os.environ.get('OSM_STREAMING', '0') == '1'
+
+# Великі bbox діляться на підзапити до Overpass
+OSM_QUERY_TILE_DEGREES = 0.05
+OSM_FETCH_WORKERS = 4
+OSM_MAX_SPLIT_DEPTH = 2
+OSM_REQUESTS_PER_SECOND = 2.0
+
+# Сервери Overpass у порядку пріоритету; при збоях запит переходить до наступного
+OVERPASS_ENDPOINTS = [
+    'https://overpass-api.de/api/interpreter',
+    'https://overpass.kumi.systems/api/interpreter',
+    'https://overpass.private.coffee/api/interpreter',
+]
+OVERPASS_TIMEOUT = 30
+OVERPASS_MAX_RETRIES = 4
+OVERPASS_BACKOFF_BASE = 1.0
+OVERPASS_BACKOFF_MAX = 30.0
+OVERPASS_BREAKER_THRESHOLD = 5
+OVERPASS_BREAKER_RESET = 60.0
+
+# 'overpass' або 'local' - аналіз з витягу, імпортованого командою import_osm_extract
+OSM_DATA_SOURCE = os.environ.get('OSM_DATA_SOURCE', 'overpass')
+OSM_LOCAL_DB = os.environ.get('OSM_LOCAL_DB', os.path.join(BASE_DIR, 'osm_extract.sqlite3'))
+
+# Граф доріг: кількість джерел для вибіркової центральності і процеси для великих мереж
+ROAD_GRAPH_SAMPLES = 32
+ROAD_GRAPH_WORKERS = min(4, os.cpu_count() or 1)
+ROAD_GRAPH_PARALLEL_MIN_EDGES = 20000
+
+# Пакетний аналіз сітки клітинок (/api/analyze/batch/)
+ANALYSIS_BATCH_WORKERS = min(4, os.cpu_count() or 1)
+ANALYSIS_BATCH_MAX_CELLS = 500
+# Менші пакети аналізуються в самому процесі запиту, без пулу воркерів
+ANALYSIS_BATCH_PARALLEL_MIN_CELLS = 8
+
+# Теплова карта (/api/analyze/grid/): розмір клітинки в метрах і максимум клітинок
+ANALYSIS_GRID_CELL_M = 250
+ANALYSIS_GRID_MAX_CELLS = 10000
+
+# Інкрементні сесії аналізу (/api/analyze/session/) для пересування і зміни розміру області
+ANALYSIS_SESSION_MAX = 32
+ANALYSIS_SESSION_TTL = 15 * 60
+
+# Сторінки великих списків результату (/api/analyze/results/<token>/<field>/)
+ANALYSIS_RESULT_PAGE_SIZE = 500
+ANALYSIS_RESULT_PAGE_MAX = 5000
+
+# Форма запиту Overpass: geom - геометрія ліній у самих лініях і лише потрібні теги,
+# skel - окремий список вузлів (out body; >; out skel)
+OSM_QUERY_MODE = os.environ.get('OSM_QUERY_MODE', 'skel')
+
+# Растр для частки зелених зон і води: розмір клітинки (м) і межа кількості клітинок
+GREEN_COVERAGE_RESOLUTION_M = 10
+GREEN_COVERAGE_MAX_CELLS = 4000000